@@ -0,0 +1,139 @@
+from collections import deque
+from serialization import fragment_cache
+from config import WINDOW_CHECK_SECONDS, STREAM_HEARTBEAT_SECONDS, STREAM_HISTORY, STREAM_MAX_CONNECTIONS
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """SSE-svaret för en klient; close() (anropas av WSGI-servern) frigör platsen"""
+    
+    def __init__(self, stream, messages):
+        self._stream = stream
+        self._messages = messages
+        self._closed = False
+    
+    def __iter__(self):
+        return self._messages
+    
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._messages.close()
+        self._stream._release()
+
+
+class ArticleStream:
+    """
+    Fördelar nya artiklar till anslutna klienter (server-sent events).
+    En enda bevakningstråd följer fönstrets version; när inläsningen har sparat
+    nya artiklar läggs de som en händelse i en kort historik och alla väntande
+    klienter väcks. Klienterna delar historiken - ingen kö per anslutning.
+    Högst max_connections klienter åt gången (0 = obegränsat), eftersom varje
+    anslutning upptar en tråd i webbservern.
+    """
+    
+    def __init__(self, window, poll_seconds=WINDOW_CHECK_SECONDS,
+                 heartbeat_seconds=STREAM_HEARTBEAT_SECONDS, history=STREAM_HISTORY,
+                 max_connections=STREAM_MAX_CONNECTIONS):
+        self.window = window
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_connections = max_connections
+        self.connections = 0
+        
+        self._condition = threading.Condition()
+        # (händelse-id, JSON) - id är fönstrets version och ökar alltid
+        self._events = deque(maxlen=history)
+        self._thread = None
+        self._known_ids = None
+        self._version = None
+    
+    def _ensure_started(self):
+        """Starta bevakningstråden vid första anslutningen"""
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='article-stream', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Fel i artikelströmmen: {e}")
+            time.sleep(self.poll_seconds)
+    
+    def poll(self):
+        """Jämför fönstret med förra kontrollen och publicera artiklar som tillkommit"""
+        version = self.window.version
+        if version == self._version:
+            return
+        
+        articles = self.window.articles()
+        ids = {article['article_id'] for article in articles}
+        
+        if self._known_ids is not None:
+            new_articles = [a for a in articles if a['article_id'] not in self._known_ids]
+            if new_articles:
+                self.publish(version, new_articles)
+        
+        self._known_ids = ids
+        self._version = version
+    
+    def publish(self, event_id, articles):
+        """Lägg till en händelse och väck alla väntande klienter"""
+        payload = fragment_cache.articles_json(articles)
+        with self._condition:
+            self._events.append((event_id, payload))
+            self._condition.notify_all()
+    
+    def _pending(self, after):
+        return [event for event in self._events if event[0] > after]
+    
+    def open(self, last_event_id=None):
+        """Ny anslutning (Subscription), eller None om max_connections redan är anslutna"""
+        with self._condition:
+            if self.max_connections and self.connections >= self.max_connections:
+                return None
+            self.connections += 1
+        return Subscription(self, self.subscribe(last_event_id))
+    
+    def _release(self):
+        with self._condition:
+            self.connections -= 1
+    
+    def subscribe(self, last_event_id=None):
+        """
+        Generator med SSE-meddelanden för en klient.
+        Med last_event_id skickas först de händelser klienten missat (om de finns kvar).
+        """
+        self._ensure_started()
+        
+        with self._condition:
+            if last_event_id is not None:
+                cursor = last_event_id
+            else:
+                cursor = self._events[-1][0] if self._events else -1
+        
+        yield 'retry: 5000\n\n'
+        
+        while True:
+            with self._condition:
+                pending = self._pending(cursor)
+                if not pending:
+                    self._condition.wait(self.heartbeat_seconds)
+                    pending = self._pending(cursor)
+            
+            if not pending:
+                # Håller anslutningen vid liv genom proxyer
+                yield ': ping\n\n'
+                continue
+            
+            for event_id, payload in pending:
+                yield f"id: {event_id}\nevent: articles\ndata: {payload}\n\n"
+                cursor = event_id
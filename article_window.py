@@ -0,0 +1,214 @@
+from pagination import decode_cursor, sort_key
+from config import MAX_ARTICLES, WINDOW_CHECK_SECONDS
+import threading
+import time
+
+# Dokumentet i meta-collectionen som håller artiklarnas versionsräknare
+ARTICLES_VERSION_ID = 'articles'
+
+# Fält för andra artiklar i samma kluster när listan slås ihop
+RELATED_FIELDS = ('article_id', 'title', 'link', 'source', 'published_date')
+
+
+def bump_articles_version(meta_collection, updated_at):
+    """Öka versionsräknaren efter att nya artiklar sparats"""
+    meta_collection.update_one(
+        {'_id': ARTICLES_VERSION_ID},
+        {'$inc': {'version': 1}, '$set': {'updated_at': updated_at}},
+        upsert=True
+    )
+
+
+def count_by(articles, field):
+    """Räkna artiklar per värde på ett fält, störst först (samma form som $group)"""
+    counts = {}
+    for article in articles:
+        value = article.get(field)
+        counts[value] = counts.get(value, 0) + 1
+    return [{'_id': value, 'count': count}
+            for value, count in sorted(counts.items(), key=lambda item: -item[1])]
+
+
+def cluster_key(article):
+    return article.get('cluster_id') or article['article_id']
+
+
+def collapse_articles(articles, limit, skip_ids=()):
+    """
+    Slå ihop artiklar (nyaste först) till högst limit kluster: den nyaste artikeln
+    i varje kluster, med övriga under 'related'. Artiklar i skip_ids hoppas över.
+    """
+    groups = {}
+    for article in articles:
+        if article['article_id'] in skip_ids:
+            continue
+        cluster_id = cluster_key(article)
+        group = groups.get(cluster_id)
+        if group is None:
+            # Äldre syskon till redan valda kluster tas med även när listan är full
+            if len(groups) < limit:
+                groups[cluster_id] = [article]
+            continue
+        group.append(article)
+    
+    collapsed = []
+    for first, *siblings in groups.values():
+        if siblings:
+            # Kopia - artiklarna i fönstret delas och får inte ändras
+            first = dict(first, related=[
+                {field: sibling.get(field) for field in RELATED_FIELDS}
+                for sibling in siblings
+            ])
+        collapsed.append(first)
+    return collapsed
+
+
+class WindowSnapshot:
+    """Ett oföränderligt utsnitt av fönstret vid en viss version"""
+    
+    def __init__(self, version, articles, size):
+        self.version = version
+        self.size = size
+        # Samtliga artiklar i fönstret, nyaste först
+        self._articles = articles
+        # Antal per källa/kategori bland de N senaste
+        latest = articles[:size]
+        self._counts = {field: count_by(latest, field) for field in ('source', 'category')}
+        # Ihopslagna listor per (kategori, källa), byggs första gången de efterfrågas
+        self._collapsed = {}
+    
+    def counts(self, field):
+        """Antal artiklar per källa eller kategori bland de N senaste"""
+        return self._counts.get(field, [])
+    
+    def articles(self, category=None, source=None, collapse=False):
+        """
+        De N senaste artiklarna, eventuellt filtrerade på kategori och/eller källa.
+        Med collapse=True slås artiklar i samma kluster ihop (se collapsed).
+        """
+        if collapse:
+            key = (category, source)
+            collapsed = self._collapsed.get(key)
+            if collapsed is None:
+                collapsed = self._collapsed[key] = self.collapsed(category, source)
+            return collapsed
+        
+        if category is None and source is None:
+            return self._articles[:self.size]
+        
+        matching = []
+        for article in self._articles:
+            if category is not None and article.get('category') != category:
+                continue
+            if source is not None and article.get('source') != source:
+                continue
+            matching.append(article)
+            if len(matching) >= self.size:
+                break
+        return matching
+    
+    def collapsed(self, category=None, source=None):
+        """
+        De N senaste klustren: den nyaste artikeln i varje kluster, med övriga
+        artiklar i klustret (från fönstret) under 'related'.
+        """
+        matching = (
+            article for article in self._articles
+            if (category is None or article.get('category') == category)
+            and (source is None or article.get('source') == source)
+        )
+        return collapse_articles(matching, self.size)
+    
+    def shown_ids(self, cursor, category=None, source=None):
+        """
+        article_id för kluster på eller före cursorn i den ihopslagna listan, inklusive
+        syskonen under 'related' - de har redan visats. Kastar InvalidCursor.
+        """
+        heads = self.articles(category=category, source=source, collapse=True)
+        if not heads:
+            return set()
+        published_date, _id = decode_cursor(cursor, id_type=type(heads[0]['_id']))
+        position = sort_key({'published_date': published_date, '_id': _id})
+        shown = set()
+        for head in heads:
+            if sort_key(head) >= position:
+                shown.add(head['article_id'])
+                shown.update(related['article_id'] for related in head.get('related', []))
+        return shown
+
+
+class LatestWindow:
+    """
+    Fönster i minnet med de senaste artiklarna.
+    Innehåller de N senaste totalt samt de N senaste per kategori och källa,
+    så att listning och filtrering kan besvaras utan databasanrop.
+    Fönstret laddas om när lagringens versionsräknare ändras (se storage.py).
+    """
+    
+    def __init__(self, storage, size=MAX_ARTICLES, check_interval=WINDOW_CHECK_SECONDS):
+        self.storage = storage
+        self.size = size
+        self.check_interval = check_interval
+        
+        self._lock = threading.Lock()
+        self._checked_at = None
+        # Byts ut i sin helhet vid omladdning så att läsare alltid ser en hel version
+        self._snapshot = WindowSnapshot(None, [], size)
+    
+    def current_version(self):
+        """Läs versionsräknaren från databasen"""
+        return self.storage.version()
+    
+    def _load(self):
+        """Ladda de senaste artiklarna totalt, per kategori och per källa"""
+        merged = {}
+        
+        def add(**filters):
+            for article in self.storage.latest(self.size, **filters):
+                merged[article['article_id']] = article
+        
+        add()
+        for category in self.storage.distinct('category'):
+            add(category=category)
+        for source in self.storage.distinct('source'):
+            add(source=source)
+        
+        # Samma ordning som keyset-pagineringen så att sidnummer och cursor hänger ihop
+        return sorted(merged.values(), key=lambda a: (a['published_date'], a['_id']), reverse=True)
+    
+    def refresh(self, force=False):
+        """Ladda om fönstret om versionen har ändrats sedan senaste kontroll"""
+        if not force and not self._check_due():
+            return
+        
+        with self._lock:
+            # En annan tråd kan ha hunnit ladda om medan vi väntade på låset
+            if not force and not self._check_due():
+                return
+            
+            version = self.current_version()
+            if force or version != self._snapshot.version:
+                self._snapshot = WindowSnapshot(version, self._load(), self.size)
+            self._checked_at = time.monotonic()
+    
+    def _check_due(self):
+        return (self._checked_at is None
+                or time.monotonic() - self._checked_at >= self.check_interval)
+    
+    def snapshot(self):
+        """Aktuell version av fönstret (alla värden från samma omladdning)"""
+        self.refresh()
+        return self._snapshot
+    
+    @property
+    def version(self):
+        """Versionen som fönstret senast laddades för"""
+        return self.snapshot().version
+    
+    def counts(self, field):
+        """Antal artiklar per källa eller kategori bland de N senaste"""
+        return self.snapshot().counts(field)
+    
+    def articles(self, category=None, source=None, collapse=False):
+        """Hämta de N senaste artiklarna, eventuellt filtrerade på kategori och/eller källa"""
+        return self.snapshot().articles(category, source, collapse)
@@ -0,0 +1,165 @@
+"""
+Mäter API:ets latens: /api/articles, /api/search och /api/stats mot lokal MongoDB/SQLite.
+
+    python benchmarks/bench_api.py [--articles 1000] [--requests 300] [--html-heavy]
+                                   [--reuse] [--storage mongodb|sqlite] [--output fil.json]
+
+Databasen (--database, standard swedish_news_bench; med SQLite filen <database>.db)
+fylls med --articles syntetiska artiklar (1k-1M) via lagringens insert_articles. Med --reuse behålls en redan fylld databas med samma antal.
+Varje scenario körs utan svarscache (cachen töms före varje anrop) och med varm
+cache. Anropen görs via Flasks testklient, så det är hanteraren och databasen som
+mäts, inte HTTP-servern. Resultatet skrivs som JSON på sista raden.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import DEFAULT_DATABASE, OpCounter, emit, percentiles, remove_sqlite, run_info, use_database
+from corpus import QUERIES, SOURCES, make_articles
+
+SEED_BATCH_SIZE = 5000
+
+
+def reset(storage, config):
+    """Töm databasen"""
+    if config.STORAGE_BACKEND == 'sqlite':
+        storage.close()
+        remove_sqlite(config.SQLITE_PATH)
+        return
+    for name in (config.COLLECTION_NAME, config.ARCHIVE_COLLECTION_NAME, config.META_COLLECTION_NAME):
+        storage.db.drop_collection(name)
+
+
+def seed(storage, config, count, html_heavy):
+    """Töm och fyll databasen; index skapas och artiklar sparas som av fetchern"""
+    from datetime import datetime, timezone
+
+    reset(storage, config)
+    storage.ensure_indexes()
+
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    for start in range(0, count, SEED_BATCH_SIZE):
+        batch = make_articles(start, min(SEED_BATCH_SIZE, count - start), html_heavy, now)
+        storage.insert_articles(batch)
+        print(f"  {start + len(batch)}/{count} artiklar", file=sys.stderr)
+    return time.perf_counter() - started
+
+
+def scenarios(rng, client):
+    """(namn, funktion som ger nästa URL) för varje scenario"""
+    categories = sorted({category for _, category in SOURCES})
+    sources = [name for name, _ in SOURCES]
+    cursor = {'next': None}
+
+    def deep_page():
+        # Nyckelbaserad paginering bakåt i hela arkivet, börjar om när den når slutet
+        url = '/api/articles?cursor=' + (cursor['next'] or '')
+        response = client.get(url)
+        cursor['next'] = response.get_json().get('next_cursor')
+        return url
+
+    return [
+        ('articles_page', lambda: f"/api/articles?page={rng.randint(1, 5)}"),
+        ('articles_filtered', lambda: (f"/api/articles?category={rng.choice(categories)}"
+                                       f"&source={rng.choice(sources)}&page={rng.randint(1, 3)}")),
+        ('articles_collapsed', lambda: f"/api/articles?collapse=1&page={rng.randint(1, 3)}"),
+        ('articles_cursor', deep_page),
+        ('search', lambda: f"/api/search?q={rng.choice(QUERIES)}&page={rng.randint(1, 3)}"),
+        ('stats', lambda: f"/api/stats?days={rng.choice([1, 7, 30])}")
+    ]
+
+
+def measure(client, next_url, requests, ops, clear_cache=None):
+    """
+    Latens per anrop, fel, total tid och Mongo-anrop under själva anropen
+    (cursor-scenariot hämtar nästa cursor före mätningen - det räknas inte).
+    """
+    samples = []
+    errors = 0
+    by_command = {}
+    elapsed = 0.0
+    for _ in range(requests):
+        url = next_url()
+        if clear_cache:
+            clear_cache()
+        ops.reset()
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - started)
+        elapsed += samples[-1]
+        for command, count in ops.snapshot()['by_command'].items():
+            by_command[command] = by_command.get(command, 0) + count
+        if response.status_code != 200:
+            errors += 1
+    mongo_ops = {'total': sum(by_command.values()),
+                 'per_request': round(sum(by_command.values()) / max(requests, 1), 2),
+                 'by_command': dict(sorted(by_command.items()))}
+    return samples, errors, elapsed, mongo_ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--articles', type=int, default=1000, help='antal artiklar i databasen (1k-1M)')
+    parser.add_argument('--requests', type=int, default=300, help='anrop per scenario')
+    parser.add_argument('--html-heavy', action='store_true', help='långa beskrivningar med mycket HTML')
+    parser.add_argument('--reuse', action='store_true', help='fyll inte databasen om den redan har --articles artiklar')
+    parser.add_argument('--seed', type=int, default=1, help='slumpfrö för URL:erna')
+    parser.add_argument('--storage', choices=['mongodb', 'sqlite'], help='standard: STORAGE_BACKEND')
+    parser.add_argument('--mongodb-uri')
+    parser.add_argument('--database', default=DEFAULT_DATABASE)
+    parser.add_argument('--output', help='skriv även resultatet till fil')
+    args = parser.parse_args()
+
+    use_database(args.database, args.mongodb_uri, args.storage)
+    # Lyssnaren registreras innan server.py skapar sin klient, så att alla anrop räknas
+    from pymongo import monitoring
+    ops = OpCounter()
+    monitoring.register(ops)
+    import config
+    import server
+
+    storage = server.storage
+    seconds_seeding = None
+    if not (args.reuse and storage.stats(days=1)['total'] == args.articles):
+        seconds_seeding = seed(storage, config, args.articles, args.html_heavy)
+    server.latest_window.refresh(force=True)
+
+    results = {
+        'benchmark': 'api',
+        'run': run_info(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('mongodb_uri', 'output')},
+        'storage': config.STORAGE_BACKEND,
+        'seed_seconds': round(seconds_seeding, 2) if seconds_seeding is not None else None,
+        'scenarios': []
+    }
+
+    client = server.app.test_client()
+    rng = random.Random(args.seed)
+    for name, next_url in scenarios(rng, client):
+        for cache in ('uncached', 'cached'):
+            clear_cache = server.response_cache.clear if cache == 'uncached' else None
+            samples, errors, elapsed, mongo_ops = measure(client, next_url, args.requests, ops, clear_cache)
+            results['scenarios'].append({
+                'scenario': name,
+                'cache': cache,
+                'requests_per_s': round(len(samples) / elapsed, 1) if elapsed else None,
+                'latency': percentiles(samples),
+                'errors': errors,
+                'mongo_ops': mongo_ops
+            })
+
+    for scenario in results['scenarios']:
+        latency = scenario['latency']
+        print(f"{scenario['scenario']:<20} {scenario['cache']:<9} {scenario['requests_per_s']:9.1f} anrop/s  "
+              f"p50 {latency['p50_ms']:7.2f} ms  p95 {latency['p95_ms']:7.2f} ms  p99 {latency['p99_ms']:7.2f} ms  "
+              f"{scenario['mongo_ops']['per_request']:5.2f} Mongo-anrop/anrop")
+    emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Mäter inläsningen: RSSFetcher.fetch_all_feeds mot lokala flöden och lokal MongoDB/SQLite.
+
+    python benchmarks/bench_ingest.py [--feeds 8] [--entries 100] [--format rss|atom|mixed]
+                                      [--html-heavy] [--latency-ms 0] [--error-rate 0]
+                                      [--rounds 3] [--new-per-round 5] [--storage mongodb|sqlite]
+                                      [--output fil.json]
+
+Omgångarna är: cold (tom databas), unchanged (samma flöden - 304/hash) och
+incremental (--new-per-round nya poster överst i varje flöde, upprepas).
+Databasen (--database, standard swedish_news_bench; med SQLite filen <database>.db) töms först.
+Resultatet skrivs som JSON på sista raden.
+"""
+from contextlib import redirect_stdout
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import DEFAULT_DATABASE, OpCounter, emit, percentiles, remove_sqlite, run_info, use_database
+from corpus import SOURCES, make_feed
+from feed_server import FeedServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--feeds', type=int, default=8)
+    parser.add_argument('--entries', type=int, default=100, help='poster per flöde')
+    parser.add_argument('--format', choices=['rss', 'atom', 'mixed'], default='mixed')
+    parser.add_argument('--html-heavy', action='store_true', help='långa beskrivningar med mycket HTML')
+    parser.add_argument('--latency-ms', type=float, default=0, help='fördröjning per anrop i servern')
+    parser.add_argument('--error-rate', type=float, default=0, help='andel anrop som ger HTTP 500')
+    parser.add_argument('--rounds', type=int, default=3, help='antal omgångar (minst 1)')
+    parser.add_argument('--new-per-round', type=int, default=5, help='nya poster per flöde och omgång')
+    parser.add_argument('--storage', choices=['mongodb', 'sqlite'], help='standard: STORAGE_BACKEND')
+    parser.add_argument('--mongodb-uri')
+    parser.add_argument('--database', default=DEFAULT_DATABASE)
+    parser.add_argument('--output', help='skriv även resultatet till fil')
+    args = parser.parse_args()
+
+    use_database(args.database, args.mongodb_uri, args.storage)
+    from pymongo import MongoClient
+    from storage import MongoStorage
+    import config
+    import rss_fetcher
+
+    server = FeedServer(latency_ms=args.latency_ms, error_rate=args.error_rate).start()
+    formats = ['rss', 'atom'] if args.format == 'mixed' else [args.format]
+    feeds = []
+    for i in range(args.feeds):
+        name, category = SOURCES[i % len(SOURCES)]
+        feeds.append({'name': f"{name} {i}", 'url': server.url(f"/feeds/{i}.xml"),
+                      'category': category, 'format': formats[i % len(formats)]})
+
+    def publish(start):
+        for i, feed in enumerate(feeds):
+            server.set_feed(f"/feeds/{i}.xml",
+                            make_feed(i, args.entries, feed['format'], args.html_heavy, start=start))
+
+    ops = OpCounter()
+    if config.STORAGE_BACKEND == 'sqlite':
+        from sqlite_storage import SQLiteStorage
+        remove_sqlite(config.SQLITE_PATH)
+        storage = SQLiteStorage()
+    else:
+        client = MongoClient(config.MONGODB_URI, event_listeners=[ops])
+        db = client[config.DATABASE_NAME]
+        for name in (config.COLLECTION_NAME, config.ARCHIVE_COLLECTION_NAME,
+                     config.FEED_STATE_COLLECTION_NAME, config.META_COLLECTION_NAME):
+            db.drop_collection(name)
+        storage = MongoStorage(client)
+
+    # Fetchern hämtar de lokala flödena i stället för de konfigurerade
+    rss_fetcher.FEEDS = feeds
+    fetcher = rss_fetcher.RSSFetcher(storage)
+    fetcher.ensure_indexes()
+
+    feed_times = []
+    fetch_feed = fetcher.fetch_feed
+
+    def timed_fetch_feed(feed_info, raise_errors=False):
+        started = time.perf_counter()
+        try:
+            return fetch_feed(feed_info, raise_errors)
+        finally:
+            feed_times.append(time.perf_counter() - started)
+
+    fetcher.fetch_feed = timed_fetch_feed
+
+    results = {
+        'benchmark': 'ingest',
+        'run': run_info(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('mongodb_uri', 'output')},
+        'config': {'fetch_max_workers': config.FETCH_MAX_WORKERS, 'feed_parse_mode': config.FEED_PARSE_MODE,
+                   'storage': config.STORAGE_BACKEND},
+        'rounds': []
+    }
+
+    try:
+        start = 0
+        for round_number in range(max(args.rounds, 1)):
+            if round_number == 0:
+                scenario = 'cold'
+            elif round_number == 1:
+                scenario = 'unchanged'
+            else:
+                scenario = 'incremental'
+                start += args.new_per_round
+            if round_number != 1:
+                publish(start)
+
+            feed_times.clear()
+            ops.reset()
+            server.stats(reset=True)
+            # Fetcherns utskrifter per flöde hör inte till mätningen
+            log = io.StringIO()
+            started = time.perf_counter()
+            with redirect_stdout(log):
+                new = fetcher.fetch_all_feeds()
+            elapsed = time.perf_counter() - started
+
+            results['rounds'].append({
+                'scenario': scenario,
+                'seconds': round(elapsed, 4),
+                'new_articles': new,
+                'articles_per_s': round(new / elapsed, 1) if elapsed else None,
+                'feeds_per_s': round(len(feeds) / elapsed, 1) if elapsed else None,
+                'feed_latency': percentiles(feed_times),
+                'failed_feeds': log.getvalue().count('✗'),
+                'mongo_ops': ops.snapshot(),
+                'http': server.stats()
+            })
+    finally:
+        server.stop()
+        storage.close()
+
+    for round_result in results['rounds']:
+        latency = round_result['feed_latency']
+        print(f"{round_result['scenario']:<12} {round_result['seconds']:8.3f} s  "
+              f"{round_result['new_articles']:6d} nya  {round_result['articles_per_s'] or 0:9.1f} art/s  "
+              f"p50 {latency.get('p50_ms', 0):7.1f} ms  p99 {latency.get('p99_ms', 0):7.1f} ms  "
+              f"{round_result['mongo_ops']['total']:5d} Mongo-anrop")
+    emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Jämför serialiseringskostnaden per API-svar före och efter fragmentcachen.
+
+    python benchmarks/bench_serialization.py [--articles 20] [--requests 2000]
+
+Före: json_util.dumps -> json.loads -> jsonify (tre pass per svar).
+Efter: articles_response med per-artikel-fragment (kall och varm cache).
+Resultatet skrivs som JSON på sista raden.
+"""
+from bson import ObjectId, json_util
+from datetime import datetime, timedelta, timezone
+from flask import Flask, jsonify
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serialization import articles_response, fragment_cache
+
+
+def make_articles(count):
+    """Syntetiska artiklar med samma fält som rss_fetcher sparar"""
+    now = datetime.now(timezone.utc)
+    return [{
+        '_id': ObjectId(),
+        'article_id': f"{i:032x}",
+        'title': f"Regeringen presenterar ny budget för sjukvården, del {i}",
+        'link': f"https://example.se/nyheter/{i}",
+        'description': '<p>' + 'Långt stycke med <b>HTML</b> och åäö. ' * 20 + '</p>',
+        'published_date': now - timedelta(minutes=i),
+        'source': 'SVT Nyheter',
+        'category': 'allmänt',
+        'image_url': f"https://example.se/bilder/{i}.jpg",
+        'fetched_at': now
+    } for i in range(count)]
+
+
+def old_response(articles):
+    data = json.loads(json_util.dumps(articles, json_options=json_util.RELAXED_JSON_OPTIONS))
+    return jsonify({'articles': data, 'total': len(articles), 'page': 1}).get_data()
+
+
+def new_response(articles):
+    return articles_response(articles, total=len(articles), page=1).get_data()
+
+
+def measure(func, articles, requests, reset=None):
+    """CPU-tid per anrop i mikrosekunder"""
+    start = time.process_time()
+    for _ in range(requests):
+        if reset:
+            reset()
+        func(articles)
+    return (time.process_time() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--articles', type=int, default=20, help='artiklar per svar')
+    parser.add_argument('--requests', type=int, default=2000, help='antal svar att mäta')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    articles = make_articles(args.articles)
+
+    with app.app_context():
+        # Samma innehåll i båda vägarna
+        assert json.loads(old_response(articles)) == json.loads(new_response(articles))
+
+        results = {
+            'articles_per_response': args.articles,
+            'requests': args.requests,
+            'before_us': measure(old_response, articles, args.requests),
+            'after_cold_us': measure(
+                new_response, articles, args.requests,
+                reset=lambda: fragment_cache._fragments.clear()
+            ),
+            'after_warm_us': measure(new_response, articles, args.requests)
+        }
+
+    print(f"Före (3 pass):          {results['before_us']:8.1f} µs/svar")
+    print(f"Efter, kall cache:      {results['after_cold_us']:8.1f} µs/svar")
+    print(f"Efter, varm cache:      {results['after_warm_us']:8.1f} µs/svar")
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
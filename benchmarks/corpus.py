@@ -0,0 +1,163 @@
+"""
+Syntetiskt korpus för benchmarks: RSS/Atom-flöden och färdiga artikeldokument.
+
+Allt är deterministiskt (samma argument ger samma bytes), så att resultat från
+olika byggen går att jämföra. Rubrikerna byggs av ett litet antal ämnen så att
+sökning och klustring får realistiska träffar.
+"""
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+import hashlib
+import random
+
+SUBJECTS = [
+    'Regeringen', 'Riksbanken', 'Polisen', 'Region Stockholm', 'Försvarsmakten',
+    'SMHI', 'Skolverket', 'Trafikverket', 'Kommunen', 'Folkhälsomyndigheten'
+]
+EVENTS = [
+    'presenterar ny budget för sjukvården', 'höjer styrräntan igen',
+    'varnar för kraftigt snöfall i norra Sverige', 'utreder skottlossning i centrala Malmö',
+    'satsar miljarder på ny järnväg', 'inför nya regler för elsparkcyklar',
+    'kritiseras för långa vårdköer', 'larmar om brist på lärare',
+    'stänger flera vägar efter översvämningar', 'lanserar app för digital legitimation'
+]
+SOURCES = [
+    ('SVT Nyheter', 'allmänt'), ('Aftonbladet', 'allmänt'), ('Expressen', 'allmänt'),
+    ('Dagens Nyheter', 'allmänt'), ('Svenska Dagbladet', 'allmänt'), ('Omni', 'allmänt'),
+    ('Breakit', 'tech'), ('Computer Sweden', 'tech')
+]
+# Sökfrågor som matchar korpusets ord (sista ordet matchas som prefix)
+QUERIES = ['budget', 'styrräntan', 'snöfall', 'skottlossning malm', 'järnväg',
+           'elsparkcyklar', 'vårdköer', 'lärare', 'översvämn', 'legitimation']
+
+# Bildvarianter som extract_image känner igen, plus artiklar utan bild
+IMAGE_VARIANTS = ('media_content', 'media_thumbnail', 'enclosure', 'inline', 'none')
+
+PARAGRAPH = ('Enligt uppgifter till redaktionen pågår arbetet för fullt och fler besked '
+             'väntas under veckan. Kritiker menar att åtgärderna kommer för sent.')
+
+
+def _description(rng, html_heavy, image_url, inline_image):
+    """Beskrivning som ren text eller som tung HTML (tabeller, stilar, skript, entiteter)"""
+    if not html_heavy:
+        text = f"<p>{PARAGRAPH}</p>"
+    else:
+        paragraphs = ''.join(
+            f'<p class="ingress" style="margin:0 0 1em">{PARAGRAPH} &mdash; <b>del {n}</b> '
+            f'<a href="https://example.se/relaterat/{rng.randrange(10**6)}">Läs mer&nbsp;»</a></p>'
+            for n in range(rng.randint(4, 12))
+        )
+        text = (f'<div class="article"><script>track({rng.randrange(10**6)});</script>'
+                f'<style>.a{{color:red}}</style>{paragraphs}'
+                f'<table><tr><td>Källa</td><td>TT</td></tr></table>'
+                f'<ul><li>Punkt ett</li><li>Punkt två &amp; tre</li></ul></div>')
+    if inline_image:
+        text = f'<img src="{image_url}" alt="" />' + text
+    return text
+
+
+def make_entries(feed_index, count, start=0, html_heavy=False, now=None):
+    """
+    Poster för ett flöde, nyaste först. Post i (räknat från start) har samma
+    länk och innehåll varje gång, så start=k ger k nya poster överst.
+    """
+    now = now or datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    entries = []
+    for serial in reversed(range(start, start + count)):
+        rng = random.Random(f"{feed_index}:{serial}")
+        variant = IMAGE_VARIANTS[serial % len(IMAGE_VARIANTS)]
+        image_url = f"https://bilder.example.se/{feed_index}/{serial}.jpg"
+        entries.append({
+            'title': f"{rng.choice(SUBJECTS)} {rng.choice(EVENTS)}",
+            'link': f"https://nyheter.example.se/{feed_index}/artikel/{serial}",
+            'description': _description(rng, html_heavy, image_url, variant == 'inline'),
+            'published': now + timedelta(minutes=serial),
+            'image_variant': variant,
+            'image_url': image_url
+        })
+    return entries
+
+
+def _rss_item(entry):
+    media = {
+        'media_content': f'<media:content url="{entry["image_url"]}" medium="image" />',
+        'media_thumbnail': f'<media:thumbnail url="{entry["image_url"]}" />',
+        'enclosure': f'<enclosure url="{entry["image_url"]}" type="image/jpeg" length="0" />'
+    }.get(entry['image_variant'], '')
+    return (f"<item><title>{escape(entry['title'])}</title>"
+            f"<link>{entry['link']}</link><guid>{entry['link']}</guid>"
+            f"<pubDate>{format_datetime(entry['published'])}</pubDate>"
+            f"<description>{escape(entry['description'])}</description>{media}</item>")
+
+
+def _atom_entry(entry):
+    media = {
+        'media_content': f'<media:content url="{entry["image_url"]}" medium="image" />',
+        'media_thumbnail': f'<media:thumbnail url="{entry["image_url"]}" />',
+        'enclosure': f'<link rel="enclosure" href="{entry["image_url"]}" type="image/jpeg" />'
+    }.get(entry['image_variant'], '')
+    return (f"<entry><title>{escape(entry['title'])}</title>"
+            f'<link rel="alternate" href="{entry["link"]}" /><id>{entry["link"]}</id>'
+            f"<updated>{entry['published'].isoformat()}</updated>"
+            f'<summary type="html">{escape(entry["description"])}</summary>{media}</entry>')
+
+
+def render_feed(entries, title, fmt='rss'):
+    """Flödet som UTF-8-kodad XML (fmt='rss' eller 'atom')"""
+    if fmt == 'atom':
+        body = ''.join(_atom_entry(entry) for entry in entries)
+        xml = ('<?xml version="1.0" encoding="utf-8"?>'
+               '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:media="http://search.yahoo.com/mrss/">'
+               f'<title>{escape(title)}</title><id>urn:bench:{escape(title)}</id>{body}</feed>')
+    else:
+        body = ''.join(_rss_item(entry) for entry in entries)
+        xml = ('<?xml version="1.0" encoding="utf-8"?>'
+               '<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel>'
+               f'<title>{escape(title)}</title><link>https://nyheter.example.se/</link>'
+               f'{body}</channel></rss>')
+    return xml.encode('utf-8')
+
+
+def make_feed(feed_index, count, fmt='rss', html_heavy=False, start=0):
+    """Ett komplett flöde med count poster (se make_entries)"""
+    entries = make_entries(feed_index, count, start=start, html_heavy=html_heavy)
+    return render_feed(entries, f"Flöde {feed_index}", fmt)
+
+
+def make_articles(start, count, html_heavy=False, now=None):
+    """
+    Artikeldokument med samma fält som RSSFetcher.build_article sparar
+    (sökfält och klustersignatur inräknade), för att fylla databasen direkt.
+    """
+    from search import search_fields
+    from excerpt import make_excerpt
+    from cluster import signature_fields
+
+    now = now or datetime.now(timezone.utc)
+    articles = []
+    for i in range(start, start + count):
+        rng = random.Random(i)
+        source, category = SOURCES[i % len(SOURCES)]
+        title = f"{rng.choice(SUBJECTS)} {rng.choice(EVENTS)}"
+        link = f"https://nyheter.example.se/seed/{i}"
+        image_url = f"https://bilder.example.se/seed/{i}.jpg"
+        description = _description(rng, html_heavy, image_url, inline_image=False)
+        excerpt = make_excerpt(description)
+        articles.append({
+            'article_id': hashlib.md5(link.encode()).hexdigest(),
+            'title': title,
+            'link': link,
+            'description': description,
+            'excerpt': excerpt,
+            # Ungefär en artikel i minuten bakåt i tiden
+            'published_date': now - timedelta(minutes=i, seconds=rng.randrange(60)),
+            'source': source,
+            'category': category,
+            'image_url': image_url if i % len(IMAGE_VARIANTS) else None,
+            'fetched_at': now,
+            **search_fields(title, description),
+            **signature_fields(title, excerpt),
+            'cluster_id': hashlib.md5(title.encode()).hexdigest()
+        })
+    return articles
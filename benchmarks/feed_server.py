@@ -0,0 +1,138 @@
+"""
+Lokal HTTP-server som ersätter de riktiga nyhetssajterna i benchmarks.
+
+    python benchmarks/feed_server.py [--feeds 8] [--entries 50] [--port 8900]
+                                     [--latency-ms 0] [--error-rate 0]
+
+Flödena serveras med ETag (304 vid If-None-Match), gzip när klienten vill ha det
+och valfri fördröjning och andel fel (HTTP 500), så att både hämtning och
+felhantering kan mätas utan nätverk.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import gzip
+import hashlib
+import random
+import threading
+import time
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        if server.latency:
+            time.sleep(server.latency)
+
+        feed = server.feeds.get(self.path)
+        if feed is None:
+            server.count('not_found')
+            return self._send(404, b'')
+        if server.error_rate and server.random() < server.error_rate:
+            server.count('errors')
+            return self._send(500, b'')
+
+        body, etag, gzipped = feed
+        if self.headers.get('If-None-Match') == etag:
+            server.count('not_modified')
+            return self._send(304, b'', {'ETag': etag})
+
+        headers = {'ETag': etag, 'Content-Type': 'application/xml; charset=utf-8'}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzipped
+            headers['Content-Encoding'] = 'gzip'
+        server.count('bytes', len(body))
+        self._send(200, body, headers)
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FeedServer(ThreadingHTTPServer):
+    """
+    Serverar flöden från minnet. set_feed byter innehåll (och ETag) för en sökväg;
+    stats() ger antal anrop, 304:or, fel och skickade bytes.
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, error_rate=0.0, seed=0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.feeds = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._thread = None
+
+    def url(self, path):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def set_feed(self, path, body):
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.feeds[path] = (body, etag, gzip.compress(body, compresslevel=6))
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + amount
+
+    def stats(self, reset=False):
+        with self._lock:
+            stats = dict(self._stats)
+            if reset:
+                self._stats.clear()
+        return stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    import os
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from corpus import make_feed
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--feeds', type=int, default=8)
+    parser.add_argument('--entries', type=int, default=50, help='poster per flöde')
+    parser.add_argument('--format', choices=['rss', 'atom'], default='rss')
+    parser.add_argument('--html-heavy', action='store_true', help='långa beskrivningar med mycket HTML')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0, help='andel anrop som ger HTTP 500')
+    args = parser.parse_args()
+
+    server = FeedServer(port=args.port, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    for i in range(args.feeds):
+        server.set_feed(f"/feeds/{i}.xml", make_feed(i, args.entries, args.format, args.html_heavy))
+        print(server.url(f"/feeds/{i}.xml"))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
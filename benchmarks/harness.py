@@ -0,0 +1,122 @@
+"""
+Gemensamma delar för benchmarks: databasval, räkning av MongoDB-anrop,
+percentiler och JSON-resultat som går att jämföra mellan byggen.
+"""
+from pymongo import monitoring
+from datetime import datetime, timezone
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Benchmarks fyller och tömmer databasen - aldrig produktionsdatabasen som standard
+DEFAULT_DATABASE = 'swedish_news_bench'
+
+
+def use_database(name, mongodb_uri=None, storage=None):
+    """
+    Välj databas (och lagring) för benchmarken. Måste anropas innan projektets moduler
+    importeras, eftersom config.py läser miljövariablerna vid import.
+    Med SQLite används filen <name>.db.
+    """
+    os.environ['DATABASE_NAME'] = name
+    os.environ['SQLITE_PATH'] = f"{name}.db"
+    if mongodb_uri:
+        os.environ['MONGODB_URI'] = mongodb_uri
+    if storage:
+        os.environ['STORAGE_BACKEND'] = storage
+
+
+def remove_sqlite(path):
+    """Ta bort en SQLite-databas och dess WAL-filer"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+class OpCounter(monitoring.CommandListener):
+    """Räknar MongoDB-kommandon per namn (find, insert, aggregate ...)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._failed = 0
+
+    def started(self, event):
+        with self._lock:
+            self._counts[event.command_name] = self._counts.get(event.command_name, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        with self._lock:
+            self._failed += 1
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._failed = 0
+
+    def snapshot(self, reset=False):
+        """{'total': ..., 'failed': ..., 'by_command': {...}} (handskakningar räknas inte)"""
+        with self._lock:
+            counts = {name: count for name, count in self._counts.items()
+                      if name not in ('hello', 'ismaster', 'isMaster', 'ping', 'endSessions')}
+            result = {'total': sum(counts.values()), 'failed': self._failed,
+                      'by_command': dict(sorted(counts.items()))}
+            if reset:
+                self._counts.clear()
+                self._failed = 0
+        return result
+
+
+def percentiles(samples):
+    """Latens i millisekunder (samples i sekunder): p50/p95/p99, medel och max"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pick(p):
+        # Närmaste rang, samma definition som de flesta lasttestverktyg
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000
+
+    return {
+        'count': len(ordered),
+        'p50_ms': round(pick(50), 3),
+        'p95_ms': round(pick(95), 3),
+        'p99_ms': round(pick(99), 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+
+def run_info():
+    """Vad som mättes: commit, Python-version och maskin"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'started_at': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def emit(results, output=None):
+    """Skriv resultatet som JSON på sista raden (och till fil om output anges)"""
+    data = json.dumps(results, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(data + '\n')
+    print(data)
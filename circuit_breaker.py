@@ -0,0 +1,76 @@
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_MINUTES
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Flödet hoppas över eftersom det har misslyckats för många gånger i rad"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker för ett flöde.
+    Efter failure_threshold fel i rad är den öppen och allow() ger False tills
+    nedkylningstiden har gått. Därefter släpps ett försök igenom: lyckas det stängs
+    den, misslyckas det öppnas den igen med dubbel nedkylningstid.
+    """
+    
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown_minutes=CIRCUIT_COOLDOWN_MINUTES, max_cooldown_minutes=None):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown_minutes * 60
+        self.max_cooldown = (max_cooldown_minutes or cooldown_minutes * 16) * 60
+        
+        self.failures = 0
+        self.opened_at = None
+        self.current_cooldown = self.cooldown
+        self._trial_running = False
+        self._lock = threading.Lock()
+    
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+    
+    def retry_in(self, now=None):
+        """Sekunder kvar tills nästa försök släpps igenom (0 om stängd)"""
+        if self.opened_at is None:
+            return 0
+        now = now if now is not None else time.monotonic()
+        return max(0, self.opened_at + self.current_cooldown - now)
+    
+    def allow(self, now=None):
+        """Får flödet hämtas nu?"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # Bara ett provförsök åt gången när nedkylningstiden har gått
+            if self._trial_running or self.retry_in(now) > 0:
+                return False
+            self._trial_running = True
+            return True
+    
+    def release_trial(self):
+        """Avbryt ett provförsök utan resultat (t.ex. databasfel) så att ett nytt kan släppas igenom"""
+        with self._lock:
+            self._trial_running = False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.current_cooldown = self.cooldown
+            self._trial_running = False
+    
+    def record_failure(self, now=None):
+        """Registrera ett fel; returnerar True om kretsen (nu) är öppen"""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self.failures += 1
+            if self._trial_running:
+                # Provförsöket misslyckades - vänta längre nästa gång
+                self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+                self.opened_at = now
+            elif self.failures >= self.failure_threshold:
+                self.opened_at = now
+            self._trial_running = False
+            return self.opened_at is not None
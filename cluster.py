@@ -0,0 +1,163 @@
+from search import index_terms, SIGNATURE_FIELDS
+from config import CLUSTER_THRESHOLD, CLUSTER_WINDOW_HOURS
+from datetime import datetime, timedelta, timezone
+import hashlib
+import random
+
+# MinHash med LSH: signaturen delas i band; artiklar som delar minst ett band
+# är kandidater och jämförs sedan med hela signaturen.
+# 32 band x 2 rader fångar nästan alla par med likhet över ~0.35
+LSH_BANDS = 32
+LSH_ROWS = 2
+NUM_HASHES = LSH_BANDS * LSH_ROWS
+
+# Färre termer än så räcker inte för att säga något om likhet
+MIN_SHINGLES = 3
+
+_PRIME = (1 << 61) - 1
+# Fasta koefficienter så att signaturerna är jämförbara mellan processer och körningar
+_rng = random.Random(20240906)
+_COEFFICIENTS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def shingles(title, excerpt):
+    """
+    Termer som jämförs: ordstammar från rubrik och utdrag.
+    Rubrikens termer tas med två gånger (med prefix) så att rubriken väger tyngre.
+    """
+    title_terms = index_terms(title)
+    return title_terms | {f"t:{term}" for term in title_terms} | index_terms(excerpt)
+
+
+def minhash(terms):
+    """MinHash-signatur (NUM_HASHES heltal) för en mängd termer"""
+    hashes = [_hash64(term) for term in terms]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _COEFFICIENTS]
+
+
+def lsh_bands(signature):
+    """En nyckel per band (64-bitars heltal), indexeras i MongoDB"""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(f"{band}:{rows}".encode(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def similarity(a, b):
+    """Uppskattad Jaccard-likhet mellan två signaturer"""
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+def signature_fields(title, excerpt):
+    """Signaturfälten som sparas på en artikel vid inläsning (tomma om texten är för kort)"""
+    terms = shingles(title, excerpt)
+    if len(terms) < MIN_SHINGLES:
+        return {'minhash': [], 'lsh_bands': []}
+    signature = minhash(terms)
+    return {'minhash': signature, 'lsh_bands': lsh_bands(signature)}
+
+
+def candidate_query(bands, since):
+    """Fråga för artiklar som delar minst ett band och är publicerade efter since"""
+    return {'lsh_bands': {'$in': list(bands)}, 'published_date': {'$gte': since}}
+
+
+def cluster_articles(articles, candidates, threshold=CLUSTER_THRESHOLD):
+    """
+    Sätt cluster_id på nya artiklar utifrån kandidaterna (artiklar med article_id,
+    cluster_id, minhash och lsh_bands). Hittas ingen tillräckligt lik artikel blir
+    artikeln ett eget kluster.
+    """
+    bands = {band for article in articles for band in article.get('lsh_bands', [])}
+    by_band = {}
+    for candidate in candidates:
+        for band in candidate['lsh_bands']:
+            if band in bands:
+                by_band.setdefault(band, []).append(candidate)
+    
+    # Äldst först, så att en ny artikel också kan hamna i kluster med en annan ny
+    for article in sorted(articles, key=lambda a: a['published_date']):
+        best, best_score = None, threshold
+        checked = set()
+        for band in article.get('lsh_bands', []):
+            for candidate in by_band.get(band, []):
+                if candidate['article_id'] in checked:
+                    continue
+                checked.add(candidate['article_id'])
+                score = similarity(article['minhash'], candidate['minhash'])
+                if score >= best_score:
+                    best, best_score = candidate, score
+        
+        if best is not None:
+            article['cluster_id'] = best.get('cluster_id') or best['article_id']
+        else:
+            article['cluster_id'] = article['article_id']
+        
+        for band in article.get('lsh_bands', []):
+            by_band.setdefault(band, []).append(article)
+    return articles
+
+
+def assign_clusters(collection, articles, threshold=CLUSTER_THRESHOLD,
+                    window_hours=CLUSTER_WINDOW_HOURS, now=None):
+    """
+    Sätt cluster_id på nya artiklar.
+    Kandidater hämtas med ett anrop via indexet på lsh_bands (bara artiklar från de
+    senaste window_hours timmarna), så ingen artikel jämförs med alla andra.
+    """
+    bands = {band for article in articles for band in article.get('lsh_bands', [])}
+    candidates = []
+    
+    if bands:
+        now = now or datetime.now(timezone.utc)
+        candidates = collection.find(
+            candidate_query(bands, now - timedelta(hours=window_hours)),
+            {'_id': 0, 'article_id': 1, 'cluster_id': 1, 'minhash': 1, 'lsh_bands': 1}
+        )
+    return cluster_articles(articles, candidates, threshold)
+
+
+def backfill(collection, batch_size=500):
+    """Beräkna signaturer och kluster för artiklar som saknar dem (äldst först)"""
+    from pymongo import UpdateOne
+    
+    updated = 0
+    batch = []
+    
+    def flush():
+        assign_clusters(collection, batch, now=batch[-1]['published_date'])
+        collection.bulk_write([
+            UpdateOne({'_id': article['_id']},
+                      {'$set': {field: article[field] for field in SIGNATURE_FIELDS + ('cluster_id',)}})
+            for article in batch
+        ], ordered=False)
+        return len(batch)
+    
+    cursor = collection.find(
+        {'cluster_id': {'$exists': False}},
+        {'article_id': 1, 'title': 1, 'excerpt': 1, 'published_date': 1}
+    ).sort('published_date', 1)
+    for article in cursor:
+        article.update(signature_fields(article.get('title', ''), article.get('excerpt', '')))
+        batch.append(article)
+        if len(batch) >= batch_size:
+            updated += flush()
+            batch = []
+    if batch:
+        updated += flush()
+    return updated
+
+
+if __name__ == '__main__':
+    # Klustra befintliga artiklar: python cluster.py
+    from pymongo import MongoClient
+    from config import MONGODB_URI, DATABASE_NAME, COLLECTION_NAME
+    
+    collection = MongoClient(MONGODB_URI)[DATABASE_NAME][COLLECTION_NAME]
+    print(f"Klustrade {backfill(collection)} artiklar")
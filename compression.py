@@ -0,0 +1,68 @@
+import gzip
+
+# Brotli är valfritt - finns inte modulen används bara gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Mindre svar än så här lönar det sig inte att komprimera
+MIN_COMPRESS_SIZE = 500
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/css', 'application/javascript', 'text/javascript'}
+
+
+def choose_encoding(accept_encoding):
+    """Välj bästa komprimering som klienten accepterar (br före gzip)"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        accepted.add(name.strip().lower())
+    
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """Komprimera en svarskropp med vald metod"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def should_compress(response):
+    """Om ett (ej redan komprimerat) svar är värt att komprimera"""
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and 'Content-Encoding' not in response.headers
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+        and response.content_length is not None
+        and response.content_length >= MIN_COMPRESS_SIZE
+    )
+
+
+def compress_response(response, accept_encoding):
+    """Komprimera svaret på plats om klienten och innehållet tillåter det"""
+    response.vary.add('Accept-Encoding')
+    if not should_compress(response):
+        return response
+    
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    # En komprimerad representation har en egen stark ETag
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
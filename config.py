@@ -10,7 +10,9 @@ FEEDS = [
     {
         'name': 'Aftonbladet',
         'url': 'https://rss.aftonbladet.se/rss2/small/pages/sections/senastenytt/',
-        'category': 'allmänt'
+        'category': 'allmänt',
+        # Uppdateras ofta - tillåt tätare hämtning än standard
+        'min_interval_minutes': 1
     },
     {
         'name': 'Expressen',
@@ -40,22 +42,176 @@ FEEDS = [
     {
         'name': 'Computer Sweden',
         'url': 'https://www.idg.se/rss/csweden',
-        'category': 'tech'
+        'category': 'tech',
+        # Uppdateras några gånger per dag
+        'max_interval_minutes': 240
     }
 ]
 
+# Lagring av artiklar (se storage.py):
+#   'mongodb' - MongoDB-server (standard, krävs för flera noder och för arkivering)
+#   'sqlite'  - inbäddad SQLite-fil (WAL, FTS5-sökning) för installationer på en nod
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongodb')
+# Databasfil för SQLite (delas av alla processer på noden)
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'svenska_nyheter.db')
+# Sekunder att vänta på skrivlåset innan SQLite ger upp
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.environ.get('SQLITE_BUSY_TIMEOUT_SECONDS', 10))
+
 # MongoDB-konfiguration (använd miljövariabel i produktion)
 MONGODB_URI = os.environ.get('MONGODB_URI', 'mongodb://localhost:27017/')
 DATABASE_NAME = os.environ.get('DATABASE_NAME', 'swedish_news')
 COLLECTION_NAME = os.environ.get('COLLECTION_NAME', 'articles')
+# Anslutningspool per process (delas av webbtrådar, scheduler och worker)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+# ETag/Last-Modified och innehållshash per flöde (för villkorliga anrop)
+FEED_STATE_COLLECTION_NAME = os.environ.get('FEED_STATE_COLLECTION_NAME', 'feed_state')
+# Metadata, t.ex. versionsräknaren som ökas när nya artiklar sparas
+META_COLLECTION_NAME = os.environ.get('META_COLLECTION_NAME', 'meta')
+# Lås som ser till att bara en scheduler är aktiv åt gången
+LOCK_COLLECTION_NAME = os.environ.get('LOCK_COLLECTION_NAME', 'locks')
+
+# Lagring: äldre artiklar flyttas från articles till en arkivcollection (se retention.py),
+# med SQLite till tabellen articles_archive (se SQLiteStorage.compact)
+ARCHIVE_COLLECTION_NAME = os.environ.get('ARCHIVE_COLLECTION_NAME', 'articles_archive')
+# Artiklar publicerade för mer än så här många dagar sedan arkiveras (0 = ingen åldersgräns)
+RETENTION_DAYS = float(os.environ.get('RETENTION_DAYS', 30))
+# Max antal artiklar i articles; äldre än de N senaste arkiveras (0 = ingen gräns)
+RETENTION_MAX_ARTICLES = int(os.environ.get('RETENTION_MAX_ARTICLES', 0))
+# Hur ofta arkiveringen körs (av den scheduler som är ledare)
+RETENTION_INTERVAL_MINUTES = float(os.environ.get('RETENTION_INTERVAL_MINUTES', 60))
+# Katalog för komprimerade arkivfiler (python retention.py export/import)
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+
+# Max antal tecken i textutdraget som skapas av artikelns beskrivning
+EXCERPT_MAX_LENGTH = int(os.environ.get('EXCERPT_MAX_LENGTH', 280))
+
+# Klustring av artiklar om samma händelse (se cluster.py)
+# Minsta uppskattade likhet (0-1) mellan rubrik+utdrag för att hamna i samma kluster
+CLUSTER_THRESHOLD = float(os.environ.get('CLUSTER_THRESHOLD', 0.35))
+# Nya artiklar jämförs bara med artiklar publicerade de senaste så här många timmarna
+CLUSTER_WINDOW_HOURS = float(os.environ.get('CLUSTER_WINDOW_HOURS', 36))
+
+# Antal senaste artiklar som visas/söks i API:et
+MAX_ARTICLES = int(os.environ.get('MAX_ARTICLES', 100))
+# Största tillåtna per_page (större värden begränsas till detta)
+MAX_PER_PAGE = int(os.environ.get('MAX_PER_PAGE', 100))
+# Hur ofta (sekunder) webbservern kontrollerar om nya artiklar har sparats
+WINDOW_CHECK_SECONDS = float(os.environ.get('WINDOW_CHECK_SECONDS', 2))
+# Max antal cachade API-svar per process
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1000))
+# Max antal artiklar vars färdiga JSON hålls i minnet
+FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))
+
+# Sökning (/api/search, se search.py)
+# Kortare sista ord matchas exakt i stället för som prefix (ett prefix som "s" träffar nästan allt)
+SEARCH_MIN_PREFIX = int(os.environ.get('SEARCH_MIN_PREFIX', 3))
+# Max antal träffar (de nyaste) som rangordnas; total visar högst så många
+SEARCH_MAX_CANDIDATES = int(os.environ.get('SEARCH_MAX_CANDIDATES', 1000))
+
+# Server-sent events (/api/stream)
+# Sekunder mellan keep-alive-meddelanden till anslutna klienter
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', 15))
+# Antal senaste händelser som sparas så att klienter kan återansluta utan att missa något
+STREAM_HISTORY = int(os.environ.get('STREAM_HISTORY', 50))
+
+# Bildproxy (/img/<article_id>, se thumbnails.py)
+# Katalog och maxstorlek (bytes) för cachade bilder - äldst använda tas bort först
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', 'image_cache')
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+# Tillåtna bredder (pixlar); efterfrågad bredd avrundas uppåt till närmaste
+THUMBNAIL_WIDTHS = tuple(int(w) for w in os.environ.get('THUMBNAIL_WIDTHS', '320,640,960').split(','))
+THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', 80))
+# Max storlek på originalbilden och timeout för att hämta den
+IMAGE_MAX_SOURCE_BYTES = int(os.environ.get('IMAGE_MAX_SOURCE_BYTES', 10 * 1024 * 1024))
+IMAGE_FETCH_TIMEOUT_SECONDS = float(os.environ.get('IMAGE_FETCH_TIMEOUT_SECONDS', 10))
+# Skapa miniatyrer redan vid inläsning (kräver att webbservern delar IMAGE_CACHE_DIR)
+IMAGE_PREWARM = os.environ.get('IMAGE_PREWARM', '').lower() in ('1', 'true', 'yes')
 
 # Scheduler-konfiguration
-# Hämta nyheter var X:e minut
+# Hämta nyheter var X:e minut (startintervall för varje flöde)
 FETCH_INTERVAL_MINUTES = int(os.environ.get('FETCH_INTERVAL_MINUTES', 15))
 
+# Adaptivt intervall per flöde. Kan överskridas per flöde i FEEDS med
+# 'interval_minutes', 'min_interval_minutes' och 'max_interval_minutes'
+FEED_MIN_INTERVAL_MINUTES = float(os.environ.get('FEED_MIN_INTERVAL_MINUTES', 2))
+FEED_MAX_INTERVAL_MINUTES = float(os.environ.get('FEED_MAX_INTERVAL_MINUTES', 120))
+# Önskat antal nya artiklar per hämtning - styr hur tätt aktiva flöden hämtas
+FEED_TARGET_NEW_PER_FETCH = float(os.environ.get('FEED_TARGET_NEW_PER_FETCH', 2))
+# Längsta väntetid efter upprepade fel (exponentiell backoff)
+FEED_MAX_BACKOFF_MINUTES = float(os.environ.get('FEED_MAX_BACKOFF_MINUTES', 240))
+# Slumpmässig förskjutning så att flödena inte hämtas samtidigt
+FEED_JITTER_SECONDS = int(os.environ.get('FEED_JITTER_SECONDS', 30))
+
+# Var schedulern körs:
+#   'embedded' - webbservern startar en scheduler (standard, en process i taget är aktiv)
+#   'off'      - webbservern hämtar inga nyheter; kör worker.py separat
+SCHEDULER_MODE = os.environ.get('SCHEDULER_MODE', 'embedded')
+# Ledarlåsets lånetid och hur ofta det förnyas (sekunder)
+LEADER_LEASE_SECONDS = int(os.environ.get('LEADER_LEASE_SECONDS', 60))
+LEADER_RENEW_SECONDS = int(os.environ.get('LEADER_RENEW_SECONDS', 20))
+
+# Parallell hämtning av flöden
+# Max antal flöden som hämtas samtidigt (1 = ett i taget)
+FETCH_MAX_WORKERS = int(os.environ.get('FETCH_MAX_WORKERS', 8))
+# Max antal samtidiga anrop mot samma värd
+FETCH_MAX_PER_HOST = int(os.environ.get('FETCH_MAX_PER_HOST', 2))
+# Timeout i sekunder för att ansluta, för varje läsning och för hela flödesanropet
+FETCH_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('FETCH_CONNECT_TIMEOUT_SECONDS', 5))
+FETCH_READ_TIMEOUT_SECONDS = float(os.environ.get('FETCH_READ_TIMEOUT_SECONDS', 10))
+FETCH_TIMEOUT_SECONDS = float(os.environ.get('FETCH_TIMEOUT_SECONDS', 30))
+# Max storlek (bytes, uppackat) på ett flöde - större svar avbryts
+FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 5 * 1024 * 1024))
+# Circuit breaker: efter så många fel i rad hoppas flödet över i CIRCUIT_COOLDOWN_MINUTES
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 3))
+CIRCUIT_COOLDOWN_MINUTES = float(os.environ.get('CIRCUIT_COOLDOWN_MINUTES', 15))
+
+# Tolkning av flöden:
+#   'stream' - posterna tolkas en i taget och tolkningen avbryts vid redan sparade artiklar
+#   'full'   - hela flödet tolkas med feedparser
+FEED_PARSE_MODE = os.environ.get('FEED_PARSE_MODE', 'stream')
+# Antal redan kända artiklar i rad innan resten av flödet hoppas över
+FEED_KNOWN_RUN = int(os.environ.get('FEED_KNOWN_RUN', 3))
+# Antal senast lästa artikel-ID:n som sparas per flöde (i feed_state)
+FEED_SEEN_IDS = int(os.environ.get('FEED_SEEN_IDS', 300))
+
 # Flask-konfiguration
 FLASK_ENV = os.environ.get('FLASK_ENV', 'development')
 SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
 # Port (för deployment)
 PORT = int(os.environ.get('PORT', 5000))
+
+# Produktionsserver (gunicorn, se gunicorn.conf.py)
+# Antal processer och trådar per process. Med gthread upptar varje öppen
+# /api/stream-anslutning en tråd så länge den är ansluten, se STREAM_MAX_CONNECTIONS.
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.environ.get('WEB_CONCURRENCY', 2)))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+# 'gthread' som standard. En asynkron klass (t.ex. 'gevent') kräver att paketet
+# installeras separat - det finns inte i requirements.txt.
+WEB_WORKER_CLASS = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+# Max samtidiga /api/stream-anslutningar per worker; fler får 503 och klienten
+# uppdaterar med polling tills den försöker igen. Standard med gthread: hälften av
+# trådarna, så att resten alltid kan svara på /api/* och /. Totalt antal strömmar
+# = WEB_WORKERS * STREAM_MAX_CONNECTIONS; höj WEB_THREADS (trådarna är billiga
+# när de väntar) för fler, t.ex. WEB_THREADS=64 ger 32 strömmar per worker.
+STREAM_MAX_CONNECTIONS = int(os.environ.get(
+    'STREAM_MAX_CONNECTIONS', max(1, WEB_THREADS // 2) if WEB_WORKER_CLASS == 'gthread' else 1000
+))
+# Sekunder innan en klient som fått 503 försöker ansluta igen (Retry-After)
+STREAM_RETRY_SECONDS = int(os.environ.get('STREAM_RETRY_SECONDS', 60))
+# Sekunder innan en hängande worker startas om, och för att avsluta pågående anrop
+WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 30))
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+
+# Mätvärden i Prometheus-format på /metrics (se metrics.py). /metrics är öppen för
+# alla som når webbserverns port - spärra den i proxyn om porten är publik.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Katalog där gunicorn-workrarna delar sina mätvärden, så att /metrics visar summan
+# för alla workers oavsett vilken som svarar (tom = en temporär katalog per start)
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+# Hur ofta (sekunder) varje worker skriver sina värden till METRICS_DIR
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+# Port för /metrics i worker.py, som saknar webbserver (0 = av)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
@@ -0,0 +1,50 @@
+from pymongo import MongoClient
+from metrics import event_listeners
+from config import (
+    MONGODB_URI, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_SERVER_SELECTION_TIMEOUT_MS
+)
+import os
+import threading
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Processens delade MongoClient.
+    Skapas vid första användningen (inte vid import) och på nytt efter fork,
+    eftersom en MongoClient inte får delas mellan processer.
+    """
+    global _client, _client_pid
+    
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    
+    with _lock:
+        if _client is None or _client_pid != pid:
+            _client = MongoClient(
+                MONGODB_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                # Antal och tid per kommando till /metrics
+                event_listeners=event_listeners(),
+                # Anslut först när klienten används - säkert att skapa före fork
+                connect=False
+            )
+            _client_pid = pid
+    return _client
+
+
+def close_client():
+    """Stäng processens klient (vid avslut)"""
+    global _client, _client_pid
+    
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
@@ -0,0 +1,83 @@
+from html.parser import HTMLParser
+from config import EXCERPT_MAX_LENGTH
+import html
+import re
+
+WHITESPACE_RE = re.compile(r'\s+')
+# Innehållet i dessa taggar är aldrig läsbar text
+SKIP_TAGS = {'script', 'style', 'noscript', 'iframe'}
+
+
+class _TextExtractor(HTMLParser):
+    """Samlar textinnehållet i ett HTML-fragment"""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in ('br', 'p', 'div', 'li'):
+            self.parts.append(' ')
+    
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+    
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(value):
+    """Gör om HTML till ren text med normaliserade mellanslag"""
+    if not value:
+        return ''
+    parser = _TextExtractor()
+    try:
+        parser.feed(value)
+        parser.close()
+        text = ''.join(parser.parts)
+    except Exception:
+        # Trasig HTML - ta bort taggar grovt i stället
+        text = html.unescape(re.sub(r'<[^>]+>', ' ', value))
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
+def make_excerpt(value, max_length=EXCERPT_MAX_LENGTH):
+    """Kort utdrag i ren text, avkortat vid ett ordslut"""
+    text = html_to_text(value)
+    if len(text) <= max_length:
+        return text
+    cut = text[:max_length - 1]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut.rstrip(' ,.;:-') + '…'
+
+
+def backfill(collection, batch_size=500):
+    """Skapa utdrag för artiklar som saknar dem (t.ex. efter uppgradering)"""
+    from pymongo import UpdateOne
+    
+    updated = 0
+    batch = []
+    for article in collection.find({'excerpt': {'$exists': False}}, {'description': 1}):
+        excerpt = make_excerpt(article.get('description', ''))
+        batch.append(UpdateOne({'_id': article['_id']}, {'$set': {'excerpt': excerpt}}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+if __name__ == '__main__':
+    # Skapa utdrag för befintliga artiklar: python excerpt.py
+    from pymongo import MongoClient
+    from config import MONGODB_URI, DATABASE_NAME, COLLECTION_NAME
+    
+    collection = MongoClient(MONGODB_URI)[DATABASE_NAME][COLLECTION_NAME]
+    print(f"Skapade utdrag för {backfill(collection)} artiklar")
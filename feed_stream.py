@@ -0,0 +1,177 @@
+"""
+Strömmande tolkning av RSS- och Atom-flöden.
+Artiklarna läses en i taget med XMLPullParser, så att hämtningen kan sluta tolka
+när den når artiklar som redan är sparade (flöden listar nyaste först).
+Posterna har samma fält som feedparsers (title, link, summary, published_parsed,
+updated_parsed, media_content, media_thumbnail, enclosures ...), så parse_date
+och extract_image fungerar oförändrade.
+"""
+from xml.etree.ElementTree import XMLPullParser, ParseError
+from feedparser import FeedParserDict
+# feedparsers egna datumtolkning och HTML-tvätt, så att resultatet blir detsamma
+from feedparser.datetimes import _parse_date
+from feedparser.sanitizer import _sanitize_html
+
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+RSS1_NS = '{http://purl.org/rss/1.0/}'
+MEDIA_NS = '{http://search.yahoo.com/mrss/}'
+CONTENT_NS = '{http://purl.org/rss/1.0/modules/content/}'
+DC_NS = '{http://purl.org/dc/elements/1.1/}'
+
+# Element som innehåller en artikel
+ENTRY_TAGS = {'item', RSS1_NS + 'item', ATOM_NS + 'entry'}
+# Rotelement vi känner igen (annat tolkas av feedparser)
+FEED_TAGS = {'rss', '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}RDF', ATOM_NS + 'feed'}
+
+# Behållare vars innehåll hör till posten (media:group, media:thumbnail i media:content).
+# Övriga underelement läses inte - t.ex. Atoms <source> har egna title/id/updated.
+MEDIA_CONTAINERS = {MEDIA_NS + 'group', MEDIA_NS + 'content'}
+
+# Antal bytes som matas till tolken åt gången
+FEED_CHUNK_SIZE = 16 * 1024
+
+
+class UnsupportedFeed(ValueError):
+    """Dokumentet är inte RSS eller Atom (eller inte giltig XML)"""
+
+
+def _local(tag):
+    """Elementnamn utan namnrymd för RSS 2.0 och RSS 1.0"""
+    if tag.startswith(RSS1_NS):
+        return tag[len(RSS1_NS):]
+    return tag
+
+
+def _text(element):
+    return ''.join(element.itertext()).strip()
+
+
+def _html(value):
+    return _sanitize_html(value, 'utf-8', 'text/html') if value else value
+
+
+def _date(value):
+    return _parse_date(value) if value else None
+
+
+def _children(element):
+    """Postens egna underelement, plus innehållet i mediabehållarna"""
+    for child in element:
+        yield child
+        if child.tag in MEDIA_CONTAINERS:
+            yield from _children(child)
+
+
+def _entry(element):
+    """Bygg en feedparser-liknande post av ett <item>- eller <entry>-element"""
+    entry = FeedParserDict()
+    links = []
+    media_content = []
+    media_thumbnail = []
+    summary = None
+    content = None
+    guid = None
+    published = None
+    updated = None
+    
+    for child in _children(element):
+        tag = _local(child.tag)
+        
+        if tag in ('title', ATOM_NS + 'title'):
+            entry['title'] = _text(child)
+        elif tag == 'link':
+            # RSS: länken är elementets text
+            links.append({'rel': 'alternate', 'type': 'text/html', 'href': _text(child)})
+        elif tag == ATOM_NS + 'link':
+            link = dict(child.attrib)
+            link.setdefault('rel', 'alternate')
+            links.append(link)
+        elif tag in ('description', ATOM_NS + 'summary'):
+            summary = _text(child)
+        elif tag in (CONTENT_NS + 'encoded', ATOM_NS + 'content'):
+            content = _text(child)
+        elif tag in ('guid', ATOM_NS + 'id'):
+            guid = _text(child)
+            entry['id'] = guid
+            entry['guidislink'] = (tag == 'guid' and child.get('isPermaLink', 'true') != 'false'
+                                   and guid.startswith(('http://', 'https://')))
+        elif tag in ('pubDate', ATOM_NS + 'published', ATOM_NS + 'issued'):
+            published = _text(child)
+        elif tag in (DC_NS + 'date', ATOM_NS + 'updated', ATOM_NS + 'modified'):
+            updated = _text(child)
+        elif tag == 'enclosure':
+            links.append({'rel': 'enclosure', 'href': child.get('url', ''),
+                          'type': child.get('type', ''), 'length': child.get('length', '')})
+        elif tag == MEDIA_NS + 'content':
+            media_content.append(dict(child.attrib))
+        elif tag == MEDIA_NS + 'thumbnail':
+            media_thumbnail.append(dict(child.attrib))
+    
+    alternate = next((l['href'] for l in links if l.get('rel') == 'alternate' and l.get('href')), None)
+    if alternate is None and entry.get('guidislink'):
+        alternate = guid
+    if alternate:
+        entry['link'] = alternate
+    if links:
+        entry['links'] = links
+    
+    # Som feedparser: summary från description/summary, annars från innehållet
+    summary = summary if summary is not None else content
+    if summary is not None:
+        entry['summary'] = _html(summary)
+    if content is not None:
+        entry['content'] = [{'type': 'text/html', 'value': _html(content)}]
+    
+    if published:
+        entry['published'] = published
+        entry['published_parsed'] = _date(published)
+    if updated:
+        entry['updated'] = updated
+        entry['updated_parsed'] = _date(updated)
+    # feedparser använder updated som published när bara den ena finns (och tvärtom)
+    if not entry.get('published_parsed') and entry.get('updated_parsed'):
+        entry['published_parsed'] = entry['updated_parsed']
+    
+    if media_content:
+        entry['media_content'] = media_content
+    if media_thumbnail:
+        entry['media_thumbnail'] = media_thumbnail
+    return entry
+
+
+def iter_entries(content, chunk_size=FEED_CHUNK_SIZE):
+    """
+    Ge flödets poster en i taget, i dokumentets ordning.
+    Dokumentet matas till tolken i bitar och tolkningen avbryts när anroparen slutar
+    iterera. Kastar UnsupportedFeed om det inte går att tolka som RSS/Atom -
+    anroparen får då falla tillbaka på feedparser.
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    root = None
+    depth = 0
+    
+    try:
+        for offset in range(0, max(len(content), 1), chunk_size):
+            parser.feed(content[offset:offset + chunk_size])
+            for event, element in parser.read_events():
+                if root is None:
+                    root = element
+                    if root.tag not in FEED_TAGS:
+                        raise UnsupportedFeed(f"okänt rotelement {root.tag}")
+                
+                if element.tag not in ENTRY_TAGS:
+                    continue
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth:
+                    continue
+                
+                entry = _entry(element)
+                # Släpp det tolkade elementet så att minnet inte växer med flödet
+                element.clear()
+                yield entry
+        parser.close()
+    except ParseError as e:
+        raise UnsupportedFeed(str(e)) from e
@@ -0,0 +1,66 @@
+# Produktionsserver: gunicorn -c gunicorn.conf.py server:app
+# Inställningarna läses från config.py (och därmed från miljövariabler)
+from config import (
+    PORT, WEB_WORKERS, WEB_THREADS, WEB_WORKER_CLASS, WEB_TIMEOUT, WEB_GRACEFUL_TIMEOUT,
+    METRICS_ENABLED, METRICS_DIR
+)
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{PORT}"
+# Samtidiga anrop per worker = threads (gthread). Varje öppen /api/stream upptar
+# en tråd; högst STREAM_MAX_CONNECTIONS per worker (standard threads // 2), övriga
+# får 503 så att resten av trådarna alltid är lediga för /api/* och /.
+workers = WEB_WORKERS
+threads = WEB_THREADS
+worker_class = WEB_WORKER_CLASS
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+
+# Appen laddas i varje worker efter fork, så att varje process får egen
+# MongoClient, egna bakgrundstrådar och (ev.) egen scheduler
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+
+# Katalogen där workrarna delar mätvärden (sätts i on_starting, ärvs vid fork)
+metrics_dir = None
+
+
+def on_starting(server_):
+    """
+    Töm katalogen för delade mätvärden. /metrics på den gemensamma porten når en
+    slumpvis worker, så varje worker visar summan för alla (se metrics.Registry.share).
+    """
+    global metrics_dir
+    if not METRICS_ENABLED:
+        return
+    import metrics
+    metrics_dir = METRICS_DIR or tempfile.mkdtemp(prefix='svenska-nyheter-metrics-')
+    metrics.reset_shared(metrics_dir)
+
+
+def post_worker_init(worker):
+    """Värm upp (databas och artikelfönster) innan workern tar emot anrop"""
+    import metrics
+    import server
+    if metrics_dir:
+        metrics.registry.share(metrics_dir)
+    server.warm_up()
+    server.start_background_services()
+
+
+def worker_exit(server_, worker):
+    """Stoppa scheduler och stäng databasanslutningen när workern avslutas"""
+    import metrics
+    import server
+    server.shutdown()
+    # Workerns slutliga värden räknas med även efter att den avslutats
+    metrics.registry.flush()
+
+
+def on_exit(server_):
+    """Ta bort den temporära katalogen för mätvärden"""
+    if metrics_dir and not METRICS_DIR:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
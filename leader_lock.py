@@ -0,0 +1,63 @@
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta, timezone
+from config import LEADER_LEASE_SECONDS
+import os
+import socket
+import uuid
+
+
+class LeaderLock:
+    """
+    Lås med tidsbegränsat lån (lease) i MongoDB.
+    Endast den process som håller lånet är ledare. Ledaren förnyar lånet
+    regelbundet; dör processen går lånet ut och en annan kan ta över.
+    """
+    
+    def __init__(self, collection, name, lease_seconds=LEADER_LEASE_SECONDS, owner=None):
+        self.collection = collection
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    
+    def acquire(self):
+        """
+        Ta eller förnya lånet. Returnerar True om vi är ledare.
+        Lyckas bara om lånet är ledigt, har gått ut eller redan är vårt.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            doc = self.collection.find_one_and_update(
+                {
+                    '_id': self.name,
+                    '$or': [
+                        {'expires_at': {'$lt': now}},
+                        {'owner': self.owner}
+                    ]
+                },
+                {'$set': {
+                    'owner': self.owner,
+                    'expires_at': now + timedelta(seconds=self.lease_seconds),
+                    'renewed_at': now
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Dokumentet finns och hålls av någon annan - upsert krockar med _id
+            return False
+        return doc is not None and doc.get('owner') == self.owner
+    
+    def release(self):
+        """Släpp lånet så att en annan process kan ta över direkt"""
+        self.collection.delete_one({'_id': self.name, 'owner': self.owner})
+    
+    def holder(self):
+        """Vem som håller lånet just nu (None om ingen)"""
+        doc = self.collection.find_one({'_id': self.name})
+        if doc is None:
+            return None
+        expires_at = doc['expires_at']
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return doc['owner'] if expires_at > datetime.now(timezone.utc) else None
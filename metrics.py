@@ -0,0 +1,368 @@
+from pymongo import monitoring
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bisect import bisect_left
+from contextlib import contextmanager
+from config import METRICS_ENABLED, METRICS_FLUSH_SECONDS
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Textformatet som Prometheus läser
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Hinkgränser i sekunder
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+FEED_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+JOB_BUCKETS = (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Gemensamt för räknare och histogram: värden per kombination av etiketter"""
+    kind = None
+    
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+    
+    def dump(self):
+        """Värdena som [[etiketter, värde], ...] (för filen i den delade katalogen)"""
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+    
+    def render(self, values=None):
+        """Textformatet för processens värden, eller för values (t.ex. summan av alla workers)"""
+        with self._lock:
+            items = sorted((values if values is not None else self._values).items())
+            lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+            lines.extend(self._render_items(items))
+        return lines
+
+
+class Counter(_Metric):
+    """Räknare som bara ökar"""
+    kind = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+    
+    def _copy(self, value):
+        return value
+    
+    def merge(self, total, value):
+        return value if total is None else total + value
+    
+    def _render_items(self, items):
+        for key, value in items:
+            yield f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    """Fördelning (t.ex. svarstider) i fasta hinkar, plus summa och antal"""
+    kind = 'histogram'
+    
+    def __init__(self, name, help, labels=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [antal per hink (sista = över alla gränser), summa, antal]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        """Mät tiden för ett block (registreras även om blocket kastar ett fel)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+    
+    def _copy(self, state):
+        return [list(state[0]), state[1], state[2]]
+    
+    def merge(self, total, state):
+        if total is None:
+            return self._copy(state)
+        return [[a + b for a, b in zip(total[0], state[0])], total[1] + state[1], total[2] + state[2]]
+    
+    def _render_items(self, items):
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # Delad katalog med en fil per worker (se share), None = bara den egna processen
+        self.shared_dir = None
+        self._shared_path = None
+        self._flush_lock = threading.Lock()
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+    
+    def histogram(self, name, help, labels=(), buckets=HTTP_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+    
+    def share(self, directory, interval=METRICS_FLUSH_SECONDS):
+        """
+        Dela värdena med övriga workers genom en fil i directory, så att /metrics i
+        vilken worker som helst visar summan för alla (som multiprocess-läget i
+        prometheus_client). Filen skrivs var interval:e sekund, vid varje render och
+        när workern avslutas. Filer från avslutade workers ligger kvar så att
+        räknarna aldrig minskar; katalogen töms när gunicorn startar (gunicorn.conf.py).
+        """
+        self.shared_dir = directory
+        self._shared_path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+        self.flush()
+        
+        def flush_periodically():
+            while True:
+                time.sleep(interval)
+                self.flush()
+        
+        threading.Thread(target=flush_periodically, name='metrics-flush', daemon=True).start()
+    
+    def flush(self):
+        """Skriv processens värden till dess fil i den delade katalogen"""
+        if self._shared_path is None:
+            return
+        values = {metric.name: metric.dump() for metric in self._metrics}
+        # Skrivs till en temporär fil och byts in, så att läsare aldrig ser en halv fil
+        temporary = self._shared_path + '.tmp'
+        try:
+            with self._flush_lock:
+                with open(temporary, 'w') as f:
+                    json.dump(values, f)
+                os.replace(temporary, self._shared_path)
+        except OSError as e:
+            logger.error(f"Kunde inte spara mätvärden i {self.shared_dir}: {e}")
+    
+    def _shared_values(self):
+        """Summan av alla workers värden: {namn: {etiketter: värde}}"""
+        metrics = {metric.name: metric for metric in self._metrics}
+        totals = {name: {} for name in metrics}
+        for path in glob.glob(os.path.join(self.shared_dir, '*.json')):
+            try:
+                with open(path) as f:
+                    values = json.load(f)
+            except (OSError, ValueError):
+                # Filen kan ha tagits bort eller vara från en äldre version
+                continue
+            for name, items in values.items():
+                metric = metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in items:
+                    key = tuple(key)
+                    totals[name][key] = metric.merge(totals[name].get(key), value)
+        return totals
+    
+    def render(self):
+        """Alla mätvärden i Prometheus textformat (summerade över workers om de delas)"""
+        totals = None
+        if self.shared_dir is not None:
+            self.flush()
+            totals = self._shared_values()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(totals[metric.name] if totals is not None else None))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def reset_shared(directory):
+    """Skapa den delade katalogen och ta bort värden från en tidigare körning"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+# Inläsning (rss_fetcher.py)
+FEED_PHASE_SECONDS = registry.histogram(
+    'news_feed_phase_seconds', 'Tid per steg i hämtningen av ett flöde (download, parse, store)',
+    ('feed', 'phase'), FEED_BUCKETS)
+FEED_FETCHES = registry.counter(
+    'news_feed_fetches_total', 'Hämtningar per flöde och utfall', ('feed', 'result'))
+FEED_ENTRIES = registry.counter(
+    'news_feed_entries_total', 'Artiklar per flöde: nya, redan sparade och fel', ('feed', 'result'))
+
+# Schedulern (scheduler.py)
+JOB_SECONDS = registry.histogram(
+    'news_scheduler_job_seconds', 'Körtid per schemalagt jobb', ('job',), JOB_BUCKETS)
+JOB_OVERRUNS = registry.counter(
+    'news_scheduler_job_overruns_total',
+    'Körningar som hoppades över eftersom föregående körning inte var klar', ('job',))
+JOB_MISSED = registry.counter(
+    'news_scheduler_job_missed_total', 'Körningar som missades (startade för sent)', ('job',))
+JOB_ERRORS = registry.counter(
+    'news_scheduler_job_errors_total', 'Jobb som avslutades med ett fel', ('job',))
+
+# Webbservern (server.py)
+HTTP_SECONDS = registry.histogram(
+    'news_http_request_seconds', 'Svarstid per route', ('route', 'method', 'status'), HTTP_BUCKETS)
+HTTP_MONGO_COMMANDS = registry.counter(
+    'news_http_mongo_commands_total', 'MongoDB-anrop som gjorts under anrop till en route', ('route',))
+
+# MongoDB (alla processer)
+MONGO_SECONDS = registry.histogram(
+    'news_mongo_command_seconds', 'Tid per MongoDB-kommando', ('command', 'outcome'), MONGO_BUCKETS)
+
+# Anslutningens handskakningar och övervakning räknas inte
+IGNORED_COMMANDS = {'hello', 'ismaster', 'isMaster', 'ping', 'endSessions', 'saslStart', 'saslContinue'}
+
+# Routen som tråden just nu hanterar, så att MongoDB-anrop kan knytas till den
+_current = threading.local()
+
+
+def job_name(job_id):
+    """Jobbnamn utan flödets URL (fetch_feed:https://... -> fetch_feed)"""
+    return job_id.split(':', 1)[0]
+
+
+def set_route(route):
+    _current.route = route
+
+
+def clear_route():
+    _current.route = None
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Räknar och tidsmäter MongoDB-kommandon (anropas i den tråd som gör anropet)"""
+    
+    def started(self, event):
+        route = getattr(_current, 'route', None)
+        if route is not None and event.command_name not in IGNORED_COMMANDS:
+            HTTP_MONGO_COMMANDS.inc(route=route)
+    
+    def succeeded(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome='ok')
+    
+    def failed(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome='error')
+
+
+def event_listeners():
+    """Lyssnare att ge MongoClient (inga om mätning är avstängd)"""
+    return [MongoCommandListener()] if METRICS_ENABLED else []
+
+
+def init_app(app):
+    """
+    Mät svarstider per route och exponera /metrics i en Flask-app.
+    /metrics är öppen för alla som når webbserverns port (routes, svarstider och
+    flödesnamn, inga artiklar eller hemligheter) - spärra den i proxyn om porten
+    är publik, eller stäng av mätningen med METRICS_ENABLED=false.
+    """
+    from flask import Response, g, request
+    
+    if not METRICS_ENABLED:
+        return
+    
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        set_route(request.url_rule.rule if request.url_rule is not None else 'unmatched')
+    
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_SECONDS.observe(time.perf_counter() - started, route=route,
+                                 method=request.method, status=response.status_code)
+        return response
+    
+    @app.teardown_request
+    def forget_route(exc):
+        clear_route()
+    
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='0.0.0.0'):
+    """/metrics för processer utan webbserver (worker.py), i en bakgrundstråd"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
@@ -0,0 +1,76 @@
+from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+import base64
+import json
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Sorteringen som keyset-pagineringen bygger på (måste matcha indexen)
+KEYSET_SORT = [('published_date', -1), ('_id', -1)]
+
+
+class InvalidCursor(ValueError):
+    """Cursorn kunde inte avkodas"""
+
+
+def _to_millis(dt):
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+def sort_key(article):
+    """Artikelns position i KEYSET_SORT-ordningen (större = nyare)"""
+    return _to_millis(article['published_date']), article['_id']
+
+
+def encode_cursor(article, shown=()):
+    """
+    Skapa en opak cursor som pekar på positionen efter artikeln.
+    shown: article_id som redan visats men ligger efter positionen (t.ex. under 'related').
+    """
+    payload = {
+        'd': _to_millis(article['published_date']),
+        'i': str(article['_id'])
+    }
+    if shown:
+        payload['s'] = sorted(shown)
+    payload = json.dumps(payload, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_payload(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def decode_cursor(cursor, id_type=ObjectId):
+    """Avkoda en cursor till (published_date, _id); id_type är lagringens typ för _id"""
+    try:
+        payload = _decode_payload(cursor)
+        return (EPOCH + timedelta(milliseconds=int(payload['d'])),
+                id_type(payload['i']))
+    except Exception as e:
+        raise InvalidCursor(f"Ogiltig cursor: {cursor}") from e
+
+
+def cursor_shown_ids(cursor):
+    """article_id som cursorn säger redan har visats (se encode_cursor)"""
+    try:
+        return {str(article_id) for article_id in _decode_payload(cursor).get('s', [])}
+    except Exception as e:
+        raise InvalidCursor(f"Ogiltig cursor: {cursor}") from e
+
+
+def keyset_query(query, cursor):
+    """Lägg till villkoret 'äldre än cursorn' på en fråga"""
+    if not cursor:
+        return query
+    published_date, article_id = decode_cursor(cursor)
+    return {
+        **query,
+        '$or': [
+            {'published_date': {'$lt': published_date}},
+            {'published_date': published_date, '_id': {'$lt': article_id}}
+        ]
+    }
@@ -0,0 +1,89 @@
+from flask import request, current_app
+from collections import OrderedDict
+from functools import wraps
+from config import RESPONSE_CACHE_SIZE
+from compression import MIN_COMPRESS_SIZE, choose_encoding, compress
+import hashlib
+import threading
+
+
+class ResponseCache:
+    """
+    LRU-cache för färdiga JSON-svar.
+    Nyckeln innehåller datans version, så gamla svar blir aldrig träffar
+    efter att nya artiklar sparats - de trillar bara ur cachen.
+    """
+    
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+    
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_response(cache, get_version):
+    """
+    Dekorator som cachar lyckade svar per route, query-parametrar och dataversion.
+    Svaren får en stark ETag och If-None-Match besvaras med 304.
+    Komprimerade varianter (gzip/br) cachas också, så varje version
+    komprimeras bara en gång per kodning.
+    get_version returnerar None om ingen version finns (då cachas inget).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = get_version()
+            if version is None:
+                return view(*args, **kwargs)
+            
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), version)
+            entry = cache.get(key)
+            
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'bodies': {None: body}
+                }
+                cache.set(key, entry)
+            
+            encoding = None
+            if len(entry['bodies'][None]) >= MIN_COMPRESS_SIZE:
+                encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+            body = entry['bodies'].get(encoding)
+            if body is None:
+                body = entry['bodies'][encoding] = compress(entry['bodies'][None], encoding)
+            
+            response = current_app.response_class(body, mimetype=entry['mimetype'])
+            response.vary.add('Accept-Encoding')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+                response.set_etag(f"{entry['etag']}-{encoding}")
+            else:
+                response.set_etag(entry['etag'])
+            # Klienten får använda sin kopia men måste fråga om den fortfarande gäller
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
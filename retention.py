@@ -0,0 +1,228 @@
+from pymongo.errors import BulkWriteError
+from bson import json_util
+from bson.json_util import JSONOptions, JSONMode
+from datetime import datetime, timedelta, timezone
+from article_window import bump_articles_version
+from pagination import KEYSET_SORT
+from config import RETENTION_DAYS, RETENTION_MAX_ARTICLES, ARCHIVE_DIR
+import gzip
+import glob
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# MongoDB-felkod för dubblett av unikt index
+DUPLICATE_KEY_ERROR = 11000
+
+# Datum och ObjectId sparas som {"$date": ...}/{"$oid": ...} så att de kan läsas in igen
+ARCHIVE_JSON_OPTIONS = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=True, tzinfo=timezone.utc)
+
+
+def ensure_archive_indexes(archive_collection):
+    """Index för arkivet: samma nycklar som sökning och cursor-paginering använder"""
+    archive_collection.create_index('article_id', unique=True)
+    archive_collection.create_index([('published_date', -1), ('_id', -1)])
+    archive_collection.create_index('search_terms')
+
+
+def insert_ignoring_duplicates(collection, articles):
+    """Spara artiklar; redan sparade hoppas över. Returnerar antal nya."""
+    if not articles:
+        return 0
+    try:
+        return len(collection.insert_many(articles, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        other = [error for error in errors if error.get('code') != DUPLICATE_KEY_ERROR]
+        if other:
+            raise
+        return e.details.get('nInserted', len(articles) - len(errors))
+
+
+def _older_than(article):
+    """Fråga för artiklar som sorteras efter (eller är) artikeln i KEYSET_SORT-ordning"""
+    return {'$or': [
+        {'published_date': {'$lt': article['published_date']}},
+        {'published_date': article['published_date'], '_id': {'$lte': article['_id']}}
+    ]}
+
+
+def retention_query(collection, days=RETENTION_DAYS, max_articles=RETENTION_MAX_ARTICLES, now=None):
+    """
+    Fråga för artiklar som ska arkiveras: äldre än days dagar och/eller utöver
+    de max_articles senaste. Returnerar None om ingen gräns är satt (eller nådd).
+    """
+    conditions = []
+    if days:
+        now = now or datetime.now(timezone.utc)
+        conditions.append({'published_date': {'$lt': now - timedelta(days=days)}})
+    if max_articles:
+        # Den första artikeln som inte längre ryms bland de N senaste
+        boundary = next(collection.find({}, {'published_date': 1})
+                        .sort(KEYSET_SORT).skip(max_articles).limit(1), None)
+        if boundary is not None:
+            conditions.append(_older_than(boundary))
+    
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$or': conditions}
+
+
+def compact(collection, archive_collection, meta_collection=None, batch_size=500, **limits):
+    """
+    Flytta gamla artiklar från collection till archive_collection i omgångar.
+    En omgång sparas i arkivet innan den tas bort, så ett avbrott förlorar inget
+    (nästa körning hoppar över de som redan finns i arkivet).
+    Returnerar antal flyttade artiklar.
+    """
+    query = retention_query(collection, **limits)
+    if query is None:
+        return 0
+    
+    moved = 0
+    while True:
+        batch = list(collection.find(query).sort('published_date', 1).limit(batch_size))
+        if not batch:
+            break
+        insert_ignoring_duplicates(archive_collection, batch)
+        collection.delete_many({'_id': {'$in': [article['_id'] for article in batch]}})
+        moved += len(batch)
+    
+    if moved and meta_collection is not None:
+        # Fönstret och cachade svar ska inte längre visa de flyttade artiklarna
+        bump_articles_version(meta_collection, datetime.now(timezone.utc))
+    return moved
+
+
+def archive_path(directory, day):
+    """Arkivfil för ett dygn: <katalog>/ÅÅÅÅ/MM/articles-ÅÅÅÅ-MM-DD.jsonl.gz"""
+    return os.path.join(directory, day.strftime('%Y'), day.strftime('%m'),
+                        f"articles-{day.strftime('%Y-%m-%d')}.jsonl.gz")
+
+
+def export_archive(collection, directory=ARCHIVE_DIR, before=None, delete=False):
+    """
+    Skriv artiklar till komprimerade JSON Lines-filer, en fil per publiceringsdygn.
+    Läses och skrivs strömmande (en artikel i taget). Finns filen för ett dygn redan
+    slås de ihop (artiklar som redan finns i filen skrivs inte igen).
+    Med delete=True tas exporterade artiklar bort ur collection.
+    Returnerar antal exporterade artiklar.
+    """
+    query = {'published_date': {'$lt': before}} if before else {}
+    exported = 0
+    current = {'path': None, 'output': None, 'existing': set(), 'ids': []}
+    
+    def open_day(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        output = gzip.open(path + '.tmp', 'wt', encoding='utf-8')
+        existing = set()
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        existing.add(json_util.loads(line)['article_id'])
+                        output.write(line)
+        current.update(path=path, output=output, existing=existing, ids=[])
+    
+    def finish_day():
+        # Filen byter namn först när den är komplett
+        current['output'].close()
+        os.replace(current['path'] + '.tmp', current['path'])
+        if delete and current['ids']:
+            collection.delete_many({'_id': {'$in': current['ids']}})
+        current['output'] = None
+    
+    try:
+        for article in collection.find(query).sort([('published_date', 1), ('_id', 1)]):
+            path = archive_path(directory, article['published_date'])
+            if path != current['path']:
+                if current['output'] is not None:
+                    finish_day()
+                open_day(path)
+            
+            if article['article_id'] not in current['existing']:
+                current['output'].write(json_util.dumps(article, json_options=ARCHIVE_JSON_OPTIONS) + '\n')
+            current['ids'].append(article['_id'])
+            exported += 1
+        
+        if current['output'] is not None:
+            finish_day()
+    finally:
+        if current['output'] is not None:
+            current['output'].close()
+    return exported
+
+
+def archive_files(paths):
+    """Alla arkivfiler i de angivna filerna/katalogerna, äldst först"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '**', '*.jsonl.gz'), recursive=True))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def read_archive(path):
+    """Läs artiklarna i en arkivfil en i taget"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json_util.loads(line, json_options=ARCHIVE_JSON_OPTIONS)
+
+
+def import_archive(collection, paths, batch_size=500):
+    """Läs in arkivfiler strömmande; redan sparade artiklar hoppas över. Returnerar antal nya."""
+    imported = 0
+    for path in archive_files(paths):
+        batch = []
+        for article in read_archive(path):
+            batch.append(article)
+            if len(batch) >= batch_size:
+                imported += insert_ignoring_duplicates(collection, batch)
+                batch = []
+        imported += insert_ignoring_duplicates(collection, batch)
+        logger.info(f"Läste in {path}")
+    return imported
+
+
+if __name__ == '__main__':
+    # python retention.py compact                       - flytta gamla artiklar till arkivcollectionen
+    # python retention.py export [--before ÅÅÅÅ-MM-DD]   - skriv arkivcollectionen till filer
+    # python retention.py import FIL/KATALOG ... [--hot] - läs in arkivfiler igen
+    import argparse
+    from pymongo import MongoClient
+    from config import (
+        MONGODB_URI, DATABASE_NAME, COLLECTION_NAME, ARCHIVE_COLLECTION_NAME, META_COLLECTION_NAME
+    )
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    parser = argparse.ArgumentParser(description='Arkivering av äldre artiklar')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('compact', help='flytta gamla artiklar till arkivcollectionen')
+    export_parser = commands.add_parser('export', help='skriv arkivcollectionen till .jsonl.gz-filer')
+    export_parser.add_argument('--dir', default=ARCHIVE_DIR)
+    export_parser.add_argument('--before', help='bara artiklar publicerade före detta datum (ÅÅÅÅ-MM-DD)')
+    export_parser.add_argument('--delete', action='store_true', help='ta bort exporterade artiklar ur arkivcollectionen')
+    import_parser = commands.add_parser('import', help='läs in .jsonl.gz-filer')
+    import_parser.add_argument('paths', nargs='+')
+    import_parser.add_argument('--hot', action='store_true', help='läs in till articles i stället för arkivet')
+    args = parser.parse_args()
+    
+    db = MongoClient(MONGODB_URI)[DATABASE_NAME]
+    collection = db[COLLECTION_NAME]
+    archive = db[ARCHIVE_COLLECTION_NAME]
+    
+    if args.command == 'compact':
+        ensure_archive_indexes(archive)
+        print(f"Flyttade {compact(collection, archive, db[META_COLLECTION_NAME])} artiklar till arkivet")
+    elif args.command == 'export':
+        before = (datetime.strptime(args.before, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+                  if args.before else None)
+        print(f"Exporterade {export_archive(archive, args.dir, before, args.delete)} artiklar till {args.dir}")
+    else:
+        target = collection if args.hot else archive
+        print(f"Läste in {import_archive(target, args.paths)} artiklar")
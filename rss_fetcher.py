@@ -1,20 +1,165 @@
 import feedparser
-from pymongo import MongoClient
+import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import hashlib
-from config import FEEDS, MONGODB_URI, DATABASE_NAME, COLLECTION_NAME
+import threading
+import time
+from search import search_fields
+from excerpt import make_excerpt
+from storage import get_storage, STORAGE_ERRORS
+from compression import brotli
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from feed_stream import iter_entries, UnsupportedFeed
+from cluster import signature_fields
+from thumbnails import thumbnailer
+from metrics import FEED_PHASE_SECONDS, FEED_FETCHES, FEED_ENTRIES
+from config import (
+    FEEDS, FETCH_MAX_WORKERS, FETCH_MAX_PER_HOST,
+    FETCH_CONNECT_TIMEOUT_SECONDS, FETCH_READ_TIMEOUT_SECONDS, FETCH_TIMEOUT_SECONDS, FETCH_MAX_BYTES,
+    FEED_PARSE_MODE, FEED_KNOWN_RUN, FEED_SEEN_IDS, IMAGE_PREWARM
+)
+
+USER_AGENT = 'SvenskaNyheter/1.0 (+https://github.com/semaln/svenska-nyheter)'
+
+# urllib3 packar bara upp brotli om modulen finns
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+
+FEED_ACCEPT = 'application/rss+xml, application/atom+xml, application/xml;q=0.9, text/xml;q=0.9, */*;q=0.1'
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class FeedTooLargeError(Exception):
+    """Flödet är större än FETCH_MAX_BYTES"""
+
+
+def create_session():
+    """HTTP-session med anslutningspool som återanvänds mellan hämtningar"""
+    session = requests.Session()
+    # Inga automatiska omförsök - ett fel räknas av circuit breakern/schedulern i stället
+    adapter = HTTPAdapter(
+        pool_connections=max(FETCH_MAX_WORKERS, 1),
+        pool_maxsize=max(FETCH_MAX_PER_HOST, 1),
+        max_retries=0
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': FEED_ACCEPT,
+        'Accept-Encoding': ACCEPT_ENCODING
+    })
+    return session
+
+
+def iter_body(response):
+    """
+    Läs ett strömmat svar i den takt data kommer in (uppackat).
+    urllib3 2 har read1 som returnerar efter en läsning; äldre versioner fyller hela bitar.
+    """
+    read1 = getattr(response.raw, 'read1', None)
+    if read1 is None:
+        yield from response.iter_content(READ_CHUNK_SIZE)
+        return
+    while True:
+        chunk = read1(READ_CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
 
 class RSSFetcher:
-    def __init__(self):
-        self.client = MongoClient(MONGODB_URI)
-        self.db = self.client[DATABASE_NAME]
-        self.collection = self.db[COLLECTION_NAME]
+    def __init__(self, storage=None):
+        # Som standard används processens delade lagring (se storage.py)
+        self.storage = storage if storage is not None else get_storage()
+        
+        # En semafor per värd så att vi inte öppnar för många anrop mot samma server
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
         
-        # Skapa index för snabbare sökningar
-        self.collection.create_index('article_id', unique=True)
-        self.collection.create_index('published_date')
-        self.collection.create_index('source')
-        self.collection.create_index('category')
+        # Anslutningar återanvänds mellan flöden och hämtningsomgångar
+        self.session = create_session()
+        # En circuit breaker per flöde, nyckel = flödets URL
+        self._circuits = {}
+    
+    def ensure_indexes(self):
+        """Skapa index (görs en gång av den process som hämtar nyheter)"""
+        self.storage.ensure_indexes()
+    
+    def _host_semaphore(self, url):
+        """Hämta (eller skapa) semaforen som begränsar anrop mot URL:ens värd"""
+        host = urlparse(url).netloc.lower()
+        with self._host_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(max(1, FETCH_MAX_PER_HOST))
+                self._host_semaphores[host] = semaphore
+        return semaphore
+    
+    def circuit(self, url):
+        """Hämta (eller skapa) circuit breakern för ett flöde"""
+        with self._host_lock:
+            circuit = self._circuits.get(url)
+            if circuit is None:
+                circuit = self._circuits[url] = CircuitBreaker()
+        return circuit
+    
+    def load_feed_state(self, url):
+        """Hämta sparat tillstånd (ETag, Last-Modified, hash) för ett flöde"""
+        return self.storage.load_feed_state(url)
+    
+    def save_feed_state(self, url, **fields):
+        """Spara tillstånd för ett flöde"""
+        fields['checked_at'] = datetime.now(timezone.utc)
+        self.storage.save_feed_state(url, fields)
+    
+    def download_feed(self, url, state):
+        """
+        Hämta flödet med villkorligt anrop.
+        Returnerar (svar, innehåll); status 304 betyder att flödet inte har ändrats
+        (innehållet är då None). Kastar FeedTooLargeError om flödet är för stort
+        och requests.Timeout om hela anropet tar längre än FETCH_TIMEOUT_SECONDS.
+        """
+        headers = {}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+        
+        # Endast nätverksanropet begränsas per värd - tolkning och lagring körs utanför
+        with self._host_semaphore(url):
+            started = time.monotonic()
+            with self.session.get(
+                url,
+                headers=headers,
+                timeout=(FETCH_CONNECT_TIMEOUT_SECONDS, FETCH_READ_TIMEOUT_SECONDS),
+                stream=True
+            ) as response:
+                if response.status_code == 304:
+                    return response, None
+                response.raise_for_status()
+                
+                length = response.headers.get('Content-Length')
+                if length and length.isdigit() and int(length) > FETCH_MAX_BYTES:
+                    raise FeedTooLargeError(f"{length} bytes (max {FETCH_MAX_BYTES})")
+                
+                # Lästimeouten gäller per läsning; den totala tidsgränsen kontrolleras
+                # mellan läsningarna så att en server som droppar ut data stoppas
+                deadline = started + FETCH_TIMEOUT_SECONDS
+                chunks = []
+                size = 0
+                for chunk in iter_body(response):
+                    # Storleken räknas uppackad (skyddar även mot gzip-bomber)
+                    size += len(chunk)
+                    if size > FETCH_MAX_BYTES:
+                        raise FeedTooLargeError(f"mer än {FETCH_MAX_BYTES} bytes")
+                    if time.monotonic() > deadline:
+                        raise requests.Timeout(f"ingen komplett respons inom {FETCH_TIMEOUT_SECONDS:g} s")
+                    chunks.append(chunk)
+        return response, b''.join(chunks)
     
     def generate_article_id(self, link):
         """Generera unikt ID baserat på artikel-URL"""
@@ -64,43 +209,178 @@ class RSSFetcher:
         
         return None
     
-    def fetch_feed(self, feed_info):
-        """Hämta och bearbeta ett RSS-flöde"""
+    def read_entries(self, feed_info, content, content_type, known_ids):
+        """
+        Tolka flödet och returnera ([(article_id, post), ...] för nya poster, lästa article_id).
+        Flöden listar nyaste först, så tolkningen avbryts efter FEED_KNOWN_RUN redan
+        kända artiklar i rad. Med FEED_PARSE_MODE='stream' tolkas posterna en i taget;
+        går dokumentet inte att tolka så används feedparser för hela flödet.
+        """
+        if FEED_PARSE_MODE == 'stream':
+            try:
+                return self._select_entries(iter_entries(content), known_ids)
+            except UnsupportedFeed as e:
+                print(f"⚠️  {feed_info['name']}: tolkas med feedparser ({e})")
+        
+        # feedparser får bara de hämtade byten - den gör inga egna nätverksanrop
+        feed = feedparser.parse(content, response_headers={'content-type': content_type})
+        
+        if feed.bozo:
+            if not feed.entries:
+                raise ValueError(f"kunde inte tolka flödet ({feed.bozo_exception})")
+            print(f"⚠️  Varning: Problem med {feed_info['name']}")
+        
+        return self._select_entries(feed.entries, known_ids)
+    
+    def _select_entries(self, entries, known_ids):
+        """Välj ut nya poster; sluta läsa efter FEED_KNOWN_RUN kända i rad"""
+        new_entries = []
+        seen_ids = []
+        known_run = 0
+        for entry in entries:
+            article_id = self.generate_article_id(entry.link)
+            seen_ids.append(article_id)
+            if article_id not in known_ids:
+                known_run = 0
+                new_entries.append((article_id, entry))
+                continue
+            known_run += 1
+            if known_run >= FEED_KNOWN_RUN:
+                break
+        return new_entries, seen_ids
+    
+    def build_article(self, article_id, entry, feed_info):
+        """Bygg artikeldokumentet av en post i flödet"""
+        title = entry.get('title', 'Ingen titel')
+        description = entry.get('summary', entry.get('description', ''))
+        excerpt = make_excerpt(description)
+        return {
+            'article_id': article_id,
+            'title': title,
+            'link': entry.link,
+            'description': description,
+            # Kort ren text för listvyer (slipper skicka och tvätta HTML i klienten)
+            'excerpt': excerpt,
+            'published_date': self.parse_date(entry),
+            'source': feed_info['name'],
+            'category': feed_info['category'],
+            'image_url': self.extract_image(entry),
+            'fetched_at': datetime.now(timezone.utc),
+            **search_fields(title, description),
+            # MinHash-signatur för att hitta samma nyhet från andra källor
+            **signature_fields(title, excerpt)
+        }
+    
+    def store_articles(self, articles):
+        """
+        Spara en omgång artiklar med ett enda skrivanrop.
+        Redan kända artiklar (även arkiverade) hoppas över av lagringen.
+        Returnerar antal nya, dubbletter och fel.
+        """
+        result = {'new': 0, 'duplicates': 0, 'errors': 0}
+        
+        # Samma artikel kan förekomma flera gånger i ett flöde
+        unique = {}
+        for article in articles:
+            unique.setdefault(article['article_id'], article)
+        result['duplicates'] = len(articles) - len(unique)
+        
+        if not unique:
+            return result
+        
+        counts, inserted = self.storage.insert_articles(list(unique.values()))
+        for key, count in counts.items():
+            result[key] += count
+        
+        if inserted and IMAGE_PREWARM:
+            # Miniatyrerna skapas i bakgrunden och fördröjer inte hämtningen
+            thumbnailer.prewarm(inserted)
+        
+        return result
+    
+    def fetch_feed(self, feed_info, raise_errors=False):
+        """
+        Hämta och bearbeta ett RSS-flöde.
+        Returnerar antal nya artiklar. Med raise_errors=True kastas fel vidare
+        i stället för att ge 0 (används av schedulern för backoff).
+        Flöden vars circuit breaker är öppen hoppas över (CircuitOpenError).
+        """
+        url = feed_info['url']
+        name = feed_info['name']
+        circuit = self.circuit(url)
+        
+        if not circuit.allow():
+            FEED_FETCHES.inc(feed=name, result='circuit_open')
+            print(f"⏸ {feed_info['name']}: hoppas över efter {circuit.failures} fel i rad "
+                  f"(nytt försök om {circuit.retry_in() / 60:.0f} min)")
+            if raise_errors:
+                raise CircuitOpenError(feed_info['name'])
+            return 0
+        
         print(f"Hämtar: {feed_info['name']}...")
         
         try:
-            feed = feedparser.parse(feed_info['url'])
+            state = self.load_feed_state(url)
+            with FEED_PHASE_SECONDS.time(feed=name, phase='download'):
+                response, content = self.download_feed(url, state)
             
-            if feed.bozo:
-                print(f"⚠️  Varning: Problem med {feed_info['name']}")
+            if response.status_code == 304:
+                FEED_FETCHES.inc(feed=name, result='not_modified')
+                circuit.record_success()
+                self.save_feed_state(url)
+                print(f"✓ {feed_info['name']}: oförändrat (304)")
+                return 0
             
-            new_articles = 0
+            validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
             
-            for entry in feed.entries:
-                article = {
-                    'article_id': self.generate_article_id(entry.link),
-                    'title': entry.get('title', 'Ingen titel'),
-                    'link': entry.link,
-                    'description': entry.get('summary', entry.get('description', '')),
-                    'published_date': self.parse_date(entry),
-                    'source': feed_info['name'],
-                    'category': feed_info['category'],
-                    'image_url': self.extract_image(entry),
-                    'fetched_at': datetime.now(timezone.utc)
-                }
-                
-                try:
-                    self.collection.insert_one(article)
-                    new_articles += 1
-                except Exception as e:
-                    # Artikel finns redan (duplicate key error)
-                    pass
+            # Servrar utan ETag/Last-Modified skickar ofta exakt samma innehåll igen
+            content_hash = hashlib.sha256(content).hexdigest()
+            if content_hash == state.get('content_hash'):
+                FEED_FETCHES.inc(feed=name, result='unchanged')
+                circuit.record_success()
+                self.save_feed_state(url, **validators)
+                print(f"✓ {feed_info['name']}: oförändrat innehåll")
+                return 0
+            
+            known_ids = set(state.get('seen_ids') or [])
+            with FEED_PHASE_SECONDS.time(feed=name, phase='parse'):
+                entries, seen_ids = self.read_entries(
+                    feed_info, content, response.headers.get('Content-Type', ''), known_ids
+                )
+                articles = [self.build_article(article_id, entry, feed_info) for article_id, entry in entries]
+            
+            circuit.record_success()
+            with FEED_PHASE_SECONDS.time(feed=name, phase='store'):
+                counts = self.store_articles(articles)
+            FEED_FETCHES.inc(feed=name, result='ok')
+            for result, key in (('new', 'new'), ('duplicate', 'duplicates'), ('error', 'errors')):
+                if counts[key]:
+                    FEED_ENTRIES.inc(counts[key], feed=name, result=result)
             
-            print(f"✓ {feed_info['name']}: {new_articles} nya artiklar")
-            return new_articles
+            # Spara tillståndet först när artiklarna är sparade, annars försöker vi igen nästa gång
+            if counts['errors'] == 0:
+                seen = set(seen_ids)
+                seen_ids += [i for i in state.get('seen_ids') or [] if i not in seen]
+                self.save_feed_state(url, content_hash=content_hash,
+                                     seen_ids=seen_ids[:FEED_SEEN_IDS], **validators)
             
+            print(f"✓ {feed_info['name']}: {counts['new']} nya artiklar "
+                  f"({counts['duplicates']} redan sparade, {counts['errors']} fel)")
+            return counts['new']
+        
         except Exception as e:
+            FEED_FETCHES.inc(feed=name, result='error')
             print(f"✗ Fel vid hämtning av {feed_info['name']}: {str(e)}")
+            # Databasfel beror inte på flödet och ska inte pausa det
+            if isinstance(e, STORAGE_ERRORS):
+                circuit.release_trial()
+            elif circuit.record_failure():
+                print(f"⏸ {feed_info['name']}: pausas i {circuit.retry_in() / 60:.0f} min")
+            if raise_errors:
+                raise
             return 0
     
     def fetch_all_feeds(self):
@@ -109,9 +389,14 @@ class RSSFetcher:
         print(f"Börjar hämta nyheter - {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S %Z')}")
         print(f"{'='*50}\n")
         
-        total_new = 0
-        for feed in FEEDS:
-            total_new += self.fetch_feed(feed)
+        workers = min(FETCH_MAX_WORKERS, len(FEEDS))
+        if workers <= 1:
+            total_new = sum(self.fetch_feed(feed) for feed in FEEDS)
+        else:
+            # Flödena hämtas parallellt; medan ett väntar på nätverket
+            # kan ett annat tolkas och sparas
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='feed') as executor:
+                total_new = sum(executor.map(self.fetch_feed, FEEDS))
         
         print(f"\n{'='*50}")
         print(f"Klart! Totalt {total_new} nya artiklar")
@@ -121,22 +406,18 @@ class RSSFetcher:
     
     def get_recent_articles(self, limit=50, category=None):
         """Hämta senaste artiklarna från databasen"""
-        query = {}
-        if category:
-            query['category'] = category
-        
-        articles = self.collection.find(query).sort('published_date', -1).limit(limit)
-        return list(articles)
+        return self.storage.latest(limit, category=category)
     
     def get_categories(self):
         """Hämta alla unika kategorier"""
-        return self.collection.distinct('category')
+        return self.storage.distinct('category')
     
     def get_sources(self):
         """Hämta alla unika källor"""
-        return self.collection.distinct('source')
+        return self.storage.distinct('source')
 
 if __name__ == '__main__':
     # Testa att hämta nyheter
     fetcher = RSSFetcher()
+    fetcher.ensure_indexes()
     fetcher.fetch_all_feeds()
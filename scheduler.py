@@ -1,7 +1,19 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 from rss_fetcher import RSSFetcher
-from config import FETCH_INTERVAL_MINUTES
+from circuit_breaker import CircuitOpenError
+from metrics import JOB_SECONDS, JOB_OVERRUNS, JOB_MISSED, JOB_ERRORS, job_name
+from config import (
+    FEEDS, FETCH_INTERVAL_MINUTES,
+    FEED_MIN_INTERVAL_MINUTES, FEED_MAX_INTERVAL_MINUTES, FEED_TARGET_NEW_PER_FETCH,
+    FEED_MAX_BACKOFF_MINUTES, FEED_JITTER_SECONDS, LEADER_RENEW_SECONDS,
+    RETENTION_INTERVAL_MINUTES
+)
+from datetime import datetime, timedelta, timezone
 import logging
+import random
+import threading
+import time
 
 # Sätt upp logging
 logging.basicConfig(
@@ -11,40 +23,244 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Vikt för senaste observationen i det glidande medelvärdet av publiceringstakten
+RATE_SMOOTHING = 0.5
+
+
+class FeedSchedule:
+    """Adaptivt hämtintervall för ett flöde, baserat på hur ofta det publicerar"""
+    
+    def __init__(self, feed_info):
+        self.feed_info = feed_info
+        self.min_interval = feed_info.get('min_interval_minutes', FEED_MIN_INTERVAL_MINUTES)
+        self.max_interval = feed_info.get('max_interval_minutes', FEED_MAX_INTERVAL_MINUTES)
+        self.interval = self._clamp(feed_info.get('interval_minutes', FETCH_INTERVAL_MINUTES))
+        
+        # Uppskattade nya artiklar per minut (None tills vi har en observation)
+        self.rate = None
+        self.failures = 0
+        self.last_fetch = None
+    
+    @property
+    def job_id(self):
+        return f"fetch_feed:{self.feed_info['url']}"
+    
+    def _clamp(self, minutes):
+        return min(max(minutes, self.min_interval), self.max_interval)
+    
+    def record_success(self, new_articles, now=None):
+        """Uppdatera publiceringstakten och räkna fram nästa intervall"""
+        now = now if now is not None else time.monotonic()
+        self.failures = 0
+        
+        if self.last_fetch is not None:
+            elapsed = max((now - self.last_fetch) / 60, 1e-3)
+            observed = new_articles / elapsed
+            self.rate = observed if self.rate is None else (
+                RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) * self.rate
+            )
+        self.last_fetch = now
+        
+        if self.rate:
+            # Hämta ungefär när FEED_TARGET_NEW_PER_FETCH nya artiklar bör ha kommit
+            self.interval = self._clamp(FEED_TARGET_NEW_PER_FETCH / self.rate)
+        elif self.rate is not None:
+            # Inget nytt på länge - glesa ut hämtningarna
+            self.interval = self._clamp(self.interval * 1.5)
+        return self.interval
+    
+    def record_failure(self):
+        """Exponentiell backoff vid upprepade fel"""
+        self.failures += 1
+        backoff = self.interval * (2 ** self.failures)
+        return min(backoff, max(FEED_MAX_BACKOFF_MINUTES, self.max_interval))
+
+
 class NewsScheduler:
-    def __init__(self):
+    def __init__(self, storage=None, leader_lock=None):
+        """
+        storage: lagringen (annars används processens delade, se storage.py).
+        leader_lock: lås från storage.leader_lock() - om satt hämtar schedulern bara
+        när den är ledare, så att flera processer kan köra den utan att flöden hämtas flera gånger.
+        """
         self.scheduler = BackgroundScheduler()
-        self.fetcher = RSSFetcher()
+        self.scheduler.add_listener(self._job_event, EVENT_JOB_ERROR | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+        self.fetcher = RSSFetcher(storage)
+        self.fetcher.ensure_indexes()
+        self.schedules = {feed['url']: FeedSchedule(feed) for feed in FEEDS}
+        self.leader_lock = leader_lock
+        self.is_leader = False
+        
+        # Jobb som ändrar i schedulern gör det under detta lås och bara om vi inte håller på
+        # att stoppa - shutdown() väntar på pågående jobb och skulle annars låsa sig
+        self._control_lock = threading.Lock()
+        self._stopping = False
+    
+    def _job_event(self, event):
+        """Räkna körningar som hoppats över, missats eller kastat fel (se metrics.py)"""
+        job = job_name(event.job_id)
+        if event.code == EVENT_JOB_MAX_INSTANCES:
+            # Föregående körning pågår fortfarande - jobbet tar längre tid än sitt intervall
+            JOB_OVERRUNS.inc(job=job)
+        elif event.code == EVENT_JOB_MISSED:
+            JOB_MISSED.inc(job=job)
+        else:
+            JOB_ERRORS.inc(job=job)
     
     def fetch_news_job(self):
         """Job som hämtar nyheter"""
         try:
             logger.info("Startar automatisk nyhetshämtning...")
-            new_articles = self.fetcher.fetch_all_feeds()
+            with JOB_SECONDS.time(job='fetch_news'):
+                new_articles = self.fetcher.fetch_all_feeds()
             logger.info(f"Nyhetshämtning klar: {new_articles} nya artiklar")
         except Exception as e:
+            JOB_ERRORS.inc(job='fetch_news')
             logger.error(f"Fel vid nyhetshämtning: {str(e)}")
     
-    def start(self):
-        """Starta schedulern"""
-        # Kör jobbet direkt vid start
-        self.fetch_news_job()
+    def compact_job(self):
+        """Job som flyttar gamla artiklar till arkivet"""
+        try:
+            with JOB_SECONDS.time(job='compact_articles'):
+                moved = self.fetcher.storage.compact()
+            if moved:
+                logger.info(f"Arkiverade {moved} artiklar")
+        except Exception as e:
+            JOB_ERRORS.inc(job='compact_articles')
+            logger.error(f"Fel vid arkivering: {str(e)}")
+    
+    def fetch_feed_job(self, url):
+        """Job som hämtar ett flöde och anpassar när det ska hämtas nästa gång"""
+        schedule = self.schedules[url]
+        name = schedule.feed_info['name']
+        
+        if not self.is_leader:
+            return
         
-        # Schemalägg att köra jobbet var X:e minut
+        try:
+            with JOB_SECONDS.time(job='fetch_feed'):
+                new_articles = self.fetcher.fetch_feed(schedule.feed_info, raise_errors=True)
+            minutes = schedule.record_success(new_articles)
+            logger.info(f"{name}: {new_articles} nya artiklar, nästa hämtning om {minutes:.1f} min")
+        except CircuitOpenError:
+            # Flödet är pausat - försök igen när circuit breakern släpper igenom ett försök
+            retry_in = self.fetcher.circuit(schedule.feed_info['url']).retry_in() / 60
+            minutes = max(schedule.interval, retry_in)
+        except Exception as e:
+            minutes = schedule.record_failure()
+            logger.warning(f"{name}: fel nr {schedule.failures} ({e}), försöker igen om {minutes:.1f} min")
+        
+        # Nästa körning räknas från nu med det nya intervallet
+        with self._control_lock:
+            if self._stopping:
+                return
+            self.scheduler.reschedule_job(
+                schedule.job_id,
+                trigger='interval',
+                seconds=max(int(minutes * 60), 1),
+                jitter=FEED_JITTER_SECONDS
+            )
+    
+    def _schedule_feed(self, schedule, start_date):
+        """Schemalägg ett flöde som eget jobb"""
         self.scheduler.add_job(
-            self.fetch_news_job,
+            self.fetch_feed_job,
             'interval',
-            minutes=FETCH_INTERVAL_MINUTES,
-            id='fetch_news',
+            args=[schedule.feed_info['url']],
+            seconds=max(int(schedule.interval * 60), 1),
+            jitter=FEED_JITTER_SECONDS,
+            start_date=start_date,
+            id=schedule.job_id,
+            coalesce=True,
+            max_instances=1,
             replace_existing=True
         )
+    
+    def start_fetching(self):
+        """Börja hämta: en hämtning av alla flöden direkt, sedan ett jobb per flöde"""
+        self.is_leader = True
+        now = time.monotonic()
+        
+        # Körs som eget jobb så att uppstarten (och låsförnyelsen) inte blockeras
+        self.scheduler.add_job(self.fetch_news_job, id='fetch_news', replace_existing=True)
+        
+        # Varje flöde får ett eget jobb; första körningen sprids ut över intervallet
+        for schedule in self.schedules.values():
+            schedule.last_fetch = now
+            offset = random.uniform(0, schedule.interval * 60)
+            start_date = datetime.now(timezone.utc) + timedelta(seconds=offset)
+            self._schedule_feed(schedule, start_date)
+        
+        # Arkiveringen körs bara av ledaren, första gången efter ett intervall
+        self.scheduler.add_job(
+            self.compact_job,
+            'interval',
+            minutes=RETENTION_INTERVAL_MINUTES,
+            id='compact_articles',
+            coalesce=True,
+            max_instances=1,
+            replace_existing=True
+        )
+        
+        logger.info(f"Hämtar {len(self.schedules)} flöden med adaptivt intervall "
+                    f"({FEED_MIN_INTERVAL_MINUTES}-{FEED_MAX_INTERVAL_MINUTES} min)")
+    
+    def stop_fetching(self):
+        """Sluta hämta (t.ex. när en annan process har tagit över ledarskapet)"""
+        self.is_leader = False
+        job_ids = ['fetch_news', 'compact_articles'] + [schedule.job_id for schedule in self.schedules.values()]
+        for job_id in job_ids:
+            if self.scheduler.get_job(job_id):
+                self.scheduler.remove_job(job_id)
+    
+    def leader_job(self):
+        """Job som tar eller förnyar ledarlåset och startar/stoppar hämtningen"""
+        try:
+            leader = self.leader_lock.acquire()
+        except Exception as e:
+            # Kan vi inte nå databasen kan vi inte veta om vi fortfarande är ledare
+            logger.error(f"Kunde inte förnya ledarlåset: {e}")
+            leader = False
+        
+        with self._control_lock:
+            if self._stopping:
+                return
+            if leader and not self.is_leader:
+                logger.info(f"Blev ledare ({self.leader_lock.owner}) - startar hämtning")
+                self.start_fetching()
+            elif not leader and self.is_leader:
+                logger.warning("Förlorade ledarlåset - stoppar hämtning")
+                self.stop_fetching()
+    
+    def start(self):
+        """Starta schedulern"""
+        if self.leader_lock is None:
+            self.start_fetching()
+        else:
+            # Försök bli ledare direkt och sedan regelbundet (övertar om ledaren dör)
+            self.scheduler.add_job(
+                self.leader_job,
+                'interval',
+                seconds=LEADER_RENEW_SECONDS,
+                next_run_time=datetime.now(timezone.utc),
+                id='leader_lease',
+                coalesce=True,
+                max_instances=1,
+                replace_existing=True
+            )
         
         self.scheduler.start()
-        logger.info(f"Scheduler startad - hämtar nyheter var {FETCH_INTERVAL_MINUTES}:e minut")
+        logger.info("Scheduler startad")
     
     def stop(self):
-        """Stoppa schedulern"""
+        """Stoppa schedulern, vänta in pågående hämtningar och släpp ledarlåset"""
+        with self._control_lock:
+            self._stopping = True
         self.scheduler.shutdown()
+        if self.leader_lock is not None:
+            # Tar bara bort låset om det är vårt
+            self.leader_lock.release()
+        self.is_leader = False
         logger.info("Scheduler stoppad")
 
 if __name__ == '__main__':
@@ -54,7 +270,6 @@ if __name__ == '__main__':
     
     try:
         # Håll programmet igång
-        import time
         while True:
             time.sleep(1)
     except (KeyboardInterrupt, SystemExit):
@@ -0,0 +1,234 @@
+from config import SEARCH_MIN_PREFIX, SEARCH_MAX_CANDIDATES
+import html
+import re
+import unicodedata
+
+# Fält som sparas på varje artikel för sökningen (visas inte i API:et)
+SEARCH_FIELDS = ('search_terms', 'title_terms')
+# Likhetssignaturer för klustring (se cluster.py), visas inte heller
+SIGNATURE_FIELDS = ('minhash', 'lsh_bands')
+HIDE_SEARCH_FIELDS = {field: 0 for field in SEARCH_FIELDS + SIGNATURE_FIELDS}
+
+# Vanliga svenska ord som inte indexeras
+STOPWORDS = {
+    'och', 'att', 'det', 'som', 'en', 'på', 'är', 'av', 'för', 'med', 'till',
+    'den', 'har', 'de', 'inte', 'om', 'ett', 'han', 'men', 'var', 'jag', 'sig',
+    'från', 'vi', 'så', 'kan', 'man', 'när', 'år', 'säger', 'hon', 'under',
+    'också', 'efter', 'eller', 'nu', 'sin', 'där', 'vid', 'mot', 'ska', 'skulle',
+    'kommer', 'ut', 'får', 'finns', 'vara', 'hade', 'alla', 'andra', 'mycket',
+    'än', 'här', 'då', 'sedan', 'över', 'bara', 'in', 'blir', 'upp', 'även',
+    'vad', 'få', 'två', 'vill', 'ha', 'många', 'hur', 'mer', 'går', 'sverige',
+    'the', 'of', 'and', 'to', 'in', 'a', 'i'
+}
+
+VOWELS = 'aeiouyäåö'
+
+# Snowball-stemmerns ändelser (svenska), längsta först
+STEP1_SUFFIXES = sorted([
+    'a', 'arna', 'erna', 'heterna', 'orna', 'ad', 'e', 'ade', 'ande', 'arne',
+    'are', 'aste', 'en', 'anden', 'aren', 'heten', 'ern', 'ar', 'er', 'heter',
+    'or', 'as', 'arnas', 'ernas', 'ornas', 'es', 'ades', 'andes', 'ens', 'arens',
+    'hetens', 'erns', 'at', 'andet', 'het', 'ast'
+], key=len, reverse=True)
+S_ENDINGS = 'bcdfghjklmnoprtvy'
+STEP2_ENDINGS = ('dd', 'gd', 'nn', 'dt', 'gt', 'kt', 'tt')
+
+# Sammansatta ord delas upp enkelt: ord med minst så här många tecken
+# indexeras även på sina slutled (t.ex. "sjukvård" -> "vård")
+COMPOUND_MIN_LENGTH = 8
+COMPOUND_MIN_PART = 4
+
+TAG_RE = re.compile(r'<[^>]+>')
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    """Ta bort HTML, avkoda entiteter och gör om till gemener"""
+    if not text:
+        return ''
+    text = html.unescape(TAG_RE.sub(' ', text))
+    return unicodedata.normalize('NFC', text).lower()
+
+
+def tokenize(text):
+    """Dela upp text i ord"""
+    return TOKEN_RE.findall(normalize(text))
+
+
+def _r1(word):
+    """Startposition för R1 enligt Snowball (minst 3 tecken in i ordet)"""
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return max(i + 1, 3)
+    return len(word)
+
+
+def stem(word):
+    """Svensk stemming enligt Snowball-algoritmen"""
+    if len(word) < 3:
+        return word
+    r1 = _r1(word)
+    
+    # Steg 1: ta bort böjningsändelser
+    for suffix in STEP1_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r1:
+            word = word[:-len(suffix)]
+            break
+    else:
+        if (word.endswith('s') and len(word) - 1 >= r1
+                and len(word) >= 2 and word[-2] in S_ENDINGS):
+            word = word[:-1]
+    
+    # Steg 2: dubbelteckning i slutet
+    if word[r1:].endswith(STEP2_ENDINGS):
+        word = word[:-1]
+    
+    # Steg 3: avledningsändelser
+    if word[r1:].endswith('fullt'):
+        word = word[:-1]
+    elif word[r1:].endswith('löst'):
+        word = word[:-1]
+    else:
+        for suffix in ('lig', 'els', 'ig'):
+            if word[r1:].endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+    
+    return word
+
+
+def index_terms(text):
+    """Termer att indexera för en text: ordstammar samt slutled i sammansatta ord"""
+    terms = set()
+    for token in tokenize(text):
+        if token in STOPWORDS:
+            continue
+        stemmed = stem(token)
+        terms.add(stemmed)
+        if len(stemmed) >= COMPOUND_MIN_LENGTH:
+            for i in range(COMPOUND_MIN_PART, len(stemmed) - COMPOUND_MIN_PART + 1):
+                terms.add(stemmed[i:])
+    return terms
+
+
+def search_fields(title, description):
+    """Sökfälten som sparas på en artikel vid inläsning"""
+    title_terms = index_terms(title)
+    return {
+        'title_terms': sorted(title_terms),
+        'search_terms': sorted(title_terms | index_terms(description))
+    }
+
+
+def parse_query(query_text):
+    """
+    Dela upp en sökfråga i exakta termer och en prefixterm.
+    Det sista ordet matchas som prefix så att man kan söka medan man skriver,
+    utom när frågan slutar med mellanslag eller ordet är kortare än SEARCH_MIN_PREFIX.
+    """
+    tokens = tokenize(query_text)
+    words = [token for token in tokens if token not in STOPWORDS] or tokens
+    if not words:
+        return [], None
+    
+    prefix = None
+    if not query_text.endswith(' ') and len(words[-1]) >= SEARCH_MIN_PREFIX:
+        prefix = stem(words.pop())
+    return sorted({stem(word) for word in words}), prefix
+
+
+def _count_terms(field, condition):
+    """Antal termer i field (en lista utan dubbletter) som uppfyller condition ($$term)"""
+    return {'$size': {'$filter': {'input': field, 'as': 'term', 'cond': condition}}}
+
+
+def build_search_pipeline(query_text, skip, limit, match=None, projection=None, union_with=None,
+                          max_candidates=SEARCH_MAX_CANDIDATES):
+    """
+    Bygg en aggregering som hittar, rangordnar och paginerar artiklar.
+    Matchningen använder indexet på search_terms; träffar i rubriken väger tyngre.
+    projection väljer vilka fält som returneras (standard: allt utom sökfälten).
+    union_with: namn på en collection (t.ex. arkivet) som också söks, med samma villkor.
+    Bara de max_candidates nyaste träffarna rangordnas (sortering med $limit direkt
+    efter håller bara så många dokument i minnet), så total är högst max_candidates.
+    Returnerar None om frågan saknar sökbara ord.
+    """
+    terms, prefix = parse_query(query_text)
+    if not terms and not prefix:
+        return None
+    
+    conditions = [{'search_terms': term} for term in terms]
+    score = [
+        {'$multiply': [3, _count_terms('$title_terms', {'$in': ['$$term', terms]})]},
+        _count_terms('$search_terms', {'$in': ['$$term', terms]})
+    ]
+    
+    if prefix:
+        # Ankrat prefix utan specialtecken kan använda indexet
+        pattern = '^' + re.escape(prefix)
+        conditions.append({'search_terms': {'$regex': pattern}})
+        score.append({'$cond': [
+            {'$gt': [_count_terms('$title_terms', {'$regexMatch': {'input': '$$term', 'regex': pattern}}), 0]},
+            3, 1
+        ]})
+    
+    if match:
+        conditions.append(match)
+    
+    candidates = [
+        {'$match': {'$and': conditions}},
+        {'$sort': {'published_date': -1}},
+        {'$limit': max_candidates}
+    ]
+    pipeline = list(candidates)
+    if union_with:
+        # Kräver MongoDB 4.4+; arkivet har samma sökindex
+        pipeline += [
+            {'$unionWith': {'coll': union_with, 'pipeline': candidates}},
+            {'$sort': {'published_date': -1}},
+            {'$limit': max_candidates}
+        ]
+    
+    return pipeline + [
+        {'$addFields': {'_score': {'$add': score}}},
+        {'$sort': {'_score': -1, 'published_date': -1}},
+        {'$facet': {
+            'total': [{'$count': 'count'}],
+            'articles': [
+                {'$skip': skip},
+                {'$limit': limit},
+                {'$project': projection or dict(HIDE_SEARCH_FIELDS, _score=0)}
+            ]
+        }}
+    ]
+
+
+def reindex(collection, batch_size=500):
+    """Beräkna sökfälten för artiklar som saknar dem (t.ex. efter uppgradering)"""
+    from pymongo import UpdateOne
+    
+    updated = 0
+    batch = []
+    cursor = collection.find(
+        {'search_terms': {'$exists': False}},
+        {'title': 1, 'description': 1}
+    )
+    for article in cursor:
+        fields = search_fields(article.get('title', ''), article.get('description', ''))
+        batch.append(UpdateOne({'_id': article['_id']}, {'$set': fields}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+if __name__ == '__main__':
+    # Indexera befintliga artiklar: python search.py
+    from pymongo import MongoClient
+    from config import MONGODB_URI, DATABASE_NAME, COLLECTION_NAME
+    
+    collection = MongoClient(MONGODB_URI)[DATABASE_NAME][COLLECTION_NAME]
+    collection.create_index('search_terms')
+    print(f"Indexerade {reindex(collection)} artiklar")
@@ -0,0 +1,131 @@
+from bson import ObjectId
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import current_app
+from config import FRAGMENT_CACHE_SIZE
+import json
+import threading
+
+
+def _encode_datetime(dt):
+    """Samma format som bson.json_util (relaxed): {"$date": "2024-01-01T12:00:00.123Z"}"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    dt = dt.astimezone(timezone.utc)
+    millis = dt.microsecond // 1000
+    fraction = f".{millis:03d}" if millis else ''
+    return {'$date': f"{dt.strftime('%Y-%m-%dT%H:%M:%S')}{fraction}Z"}
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    if isinstance(value, datetime):
+        return _encode_datetime(value)
+    raise TypeError(f"Kan inte serialisera {type(value).__name__}")
+
+
+# Fält som kan väljas med fields= (article_id kommer alltid med)
+PUBLIC_FIELDS = (
+    '_id', 'article_id', 'title', 'link', 'description', 'excerpt',
+    'published_date', 'source', 'category', 'image_url', 'fetched_at',
+    'cluster_id', 'related'
+)
+
+
+def parse_fields(value):
+    """
+    Tolka fields=-parametern till en sorterad tuple av fältnamn.
+    Returnerar None om inget urval gjorts; okända fält ger ValueError.
+    """
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - set(PUBLIC_FIELDS)
+    if unknown:
+        raise ValueError(f"Okända fält: {', '.join(sorted(unknown))}")
+    fields.add('article_id')
+    return tuple(sorted(fields))
+
+
+def mongo_projection(fields, default=None):
+    """Projektion för MongoDB som bara läser de valda fälten"""
+    if fields is None:
+        # Kopia - standardprojektionen delas och får inte ändras av drivrutinen
+        return dict(default) if default is not None else None
+    projection = {field: 1 for field in fields}
+    if '_id' not in fields:
+        projection['_id'] = 0
+    return projection
+
+
+def dumps(value):
+    """JSON i ett enda pass, i samma format som API:et alltid har haft"""
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+class FragmentCache:
+    """
+    Färdig JSON per artikel.
+    Artiklar ändras aldrig efter att de sparats, så en artikel behöver bara
+    serialiseras en gång; listor byggs sedan genom att foga ihop fragmenten.
+    """
+    
+    def __init__(self, max_entries=FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def fragment(self, article, fields=None):
+        """JSON för en artikel, eventuellt bara med de valda fälten"""
+        if fields is not None:
+            article = {field: article[field] for field in fields if field in article}
+        
+        if article.get('article_id') is None:
+            return dumps(article)
+        key = (article['article_id'], fields)
+        if article.get('related'):
+            # Ihopslagna kluster får fler syskon med tiden
+            key += tuple(related['article_id'] for related in article['related'])
+        
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                return fragment
+        
+        fragment = dumps(article)
+        with self._lock:
+            self._fragments[key] = fragment
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return fragment
+    
+    def articles_json(self, articles, fields=None):
+        """JSON-lista med artiklar, byggd av cachade fragment"""
+        return '[' + ','.join(self.fragment(article, fields) for article in articles) + ']'
+
+
+fragment_cache = FragmentCache()
+
+
+def articles_payload(articles, fields=None, **extra):
+    """
+    JSON-objekt (som sträng) med 'articles' plus övriga fält.
+    Artiklarna fogas in som färdiga fragment i stället för att serialiseras om.
+    fields begränsar vilka artikelfält som tas med.
+    """
+    body = dumps(extra)
+    articles_json = fragment_cache.articles_json(articles, fields)
+    separator = ',' if extra else ''
+    return f'{{"articles":{articles_json}{separator}{body[1:]}'
+
+
+def json_response(body):
+    """Svar med färdig JSON-sträng"""
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def articles_response(articles, fields=None, **extra):
+    """JSON-svar med artiklar, se articles_payload"""
+    return json_response(articles_payload(articles, fields, **extra))
@@ -1,10 +1,20 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, redirect, request, send_file, send_from_directory
 from flask_cors import CORS
-from pymongo import MongoClient
-from bson import json_util
-import json
 from datetime import datetime, timezone
-from scheduler import NewsScheduler
+from worker import create_scheduler
+from storage import get_storage, close_storage
+from article_window import LatestWindow, RELATED_FIELDS, collapse_articles
+from article_stream import ArticleStream
+from response_cache import ResponseCache, cached_response
+from serialization import (
+    articles_payload, articles_response, dumps, json_response, parse_fields
+)
+from compression import compress_response
+from static_assets import StaticAssets, IMMUTABLE_MAX_AGE
+from thumbnails import thumbnailer, choose_width, choose_format, ImageError, ARTICLE_ID_RE
+from pagination import InvalidCursor, cursor_shown_ids, encode_cursor, sort_key
+from config import MAX_ARTICLES, MAX_PER_PAGE, SCHEDULER_MODE, STORAGE_BACKEND, STREAM_RETRY_SECONDS
+import metrics
 import os
 import logging
 
@@ -15,102 +25,226 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Hämta konfiguration från miljövariabler eller config.py
-MONGODB_URI = os.environ.get('MONGODB_URI', 'mongodb://localhost:27017/')
-DATABASE_NAME = os.environ.get('DATABASE_NAME', 'swedish_news')
-COLLECTION_NAME = os.environ.get('COLLECTION_NAME', 'articles')
-
-app = Flask(__name__, static_folder='static', static_url_path='/static')
+# Statiska filer serveras av serve_static nedan (med innehållshashade namn)
+app = Flask(__name__, static_folder=None)
 CORS(app)
+# Svarstider per route och MongoDB-anrop på /metrics (summerade över gunicorn-workers, se gunicorn.conf.py)
+metrics.init_app(app)
 
-# MongoDB connection
+static_assets = StaticAssets(os.path.join(app.root_path, 'static'))
+
+# Lagringen (STORAGE_BACKEND) delas inom processen och ansluter först när den används
 try:
-    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
-    client.admin.command('ping')
-    logger.info("✅ MongoDB-anslutning lyckades!")
+    storage = get_storage()
     
-    db = client[DATABASE_NAME]
-    collection = db[COLLECTION_NAME]
+    # De senaste artiklarna hålls i minnet och laddas om när nya artiklar sparats
+    latest_window = LatestWindow(storage)
     
+    # Nya artiklar skickas ut till anslutna klienter via /api/stream
+    article_stream = ArticleStream(latest_window)
+
 except Exception as e:
-    logger.error(f"❌ MongoDB-anslutningsfel: {e}")
-    collection = None
+    logger.error(f"❌ Databaskonfigurationsfel: {e}")
+    storage = None
+    latest_window = None
+    article_stream = None
 
-# Starta scheduler i bakgrunden
-if not os.environ.get('TESTING'):
+scheduler = None
+
+def start_background_services():
+    """
+    Starta scheduler i bakgrunden (med SCHEDULER_MODE=off sköts hämtningen av worker.py).
+    Ledarlåset gör att bara en process åt gången hämtar, även med flera webbprocesser.
+    """
+    global scheduler
+    if SCHEDULER_MODE != 'embedded' or os.environ.get('TESTING') or scheduler is not None:
+        return
     try:
-        scheduler = NewsScheduler()
+        scheduler = create_scheduler(storage)
         scheduler.start()
         logger.info("✅ Scheduler startad!")
     except Exception as e:
         logger.error(f"⚠️  Scheduler kunde inte startas: {e}")
 
-def parse_json(data):
-    """Konvertera MongoDB ObjectId till JSON"""
-    return json.loads(json_util.dumps(data, json_options=json_util.RELAXED_JSON_OPTIONS))
+def warm_up():
+    """Anslut till databasen och ladda fönstret innan processen tar emot trafik"""
+    if latest_window is None:
+        return
+    try:
+        storage.ping()
+        latest_window.refresh(force=True)
+        logger.info(f"✅ Databasanslutning lyckades ({STORAGE_BACKEND})! "
+                    f"{len(latest_window.articles())} artiklar i fönstret")
+    except Exception as e:
+        logger.error(f"❌ Databasanslutningsfel: {e}")
+
+def shutdown():
+    """Stoppa schedulern (släpper ledarlåset) och stäng databasanslutningen"""
+    global scheduler
+    if scheduler is not None:
+        try:
+            scheduler.stop()
+        except Exception as e:
+            logger.error(f"Fel vid stopp av scheduler: {e}")
+        scheduler = None
+    close_storage()
+
+# Cachade API-svar, ogiltiga så fort fönstrets version ändras
+response_cache = ResponseCache()
+
+def data_version():
+    """Aktuell dataversion (None om den inte kan läsas - då cachas inget)"""
+    if latest_window is None:
+        return None
+    try:
+        return latest_window.version
+    except Exception as e:
+        logger.error(f"Kunde inte läsa dataversion: {e}")
+        return None
+
+def stats_version():
+    """
+    Dataversion plus aktuell UTC-timme för svar med statistik.
+    per_hour/per_day räknas från "nu", så hinkarna måste rulla vidare
+    vid varje timskifte även om inga nya artiklar sparats.
+    """
+    version = data_version()
+    if version is None:
+        return None
+    return (version, datetime.now(timezone.utc).strftime('%Y-%m-%dT%H'))
+
+@app.after_request
+def compress_api_response(response):
+    """Komprimera svar med gzip/brotli (cachade svar är redan komprimerade)"""
+    return compress_response(response, request.headers.get('Accept-Encoding'))
 
 @app.route('/')
 def index():
-    """Servera frontend"""
-    return send_from_directory('static', 'index.html')
+    """Servera frontend (pekar på de innehållshashade filnamnen)"""
+    response = Response(static_assets.index_html, mimetype='text/html')
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    """Servera statiska filer"""
-    return send_from_directory('static', filename)
+    """Servera statiska filer; hashade namn cachas i ett år"""
+    filename, immutable = static_assets.resolve(filename)
+    if not immutable:
+        return send_from_directory('static', filename, max_age=0)
+    
+    response = send_from_directory('static', filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def parse_per_page():
+    """
+    per_page begränsat till 1..MAX_PER_PAGE, så att en sida alltid har en övre
+    kostnad och cursor-sidor aldrig blir tomma. ValueError om det inte är ett heltal.
+    """
+    value = request.args.get('per_page', 20)
+    try:
+        per_page = int(value)
+    except ValueError as e:
+        raise ValueError(f"Ogiltigt per_page: {value}") from e
+    return min(max(per_page, 1), MAX_PER_PAGE)
+
+def parse_filters():
+    """Gemensamma filterparametrar för artikellistor: (kategori, källa, per_page, fält)"""
+    category = request.args.get('category')
+    source = request.args.get('source')
+    per_page = parse_per_page()
+    
+    if not category or category == 'alla':
+        category = None
+    
+    # Listvyer kan välja bara de fält de behöver, t.ex. fields=title,excerpt,link
+    fields = parse_fields(request.args.get('fields'))
+    return category, source or None, per_page, fields
+
+def parse_collapse():
+    """collapse=1 slår ihop artiklar om samma händelse till ett kort (med 'related')"""
+    return request.args.get('collapse', '').lower() in ('1', 'true', 'yes')
+
+def page_payload(snapshot, category, source, page, per_page, fields, collapse=False):
+    """En sida ur fönstret som JSON (sidnummer inom de MAX_ARTICLES senaste)"""
+    latest_articles = snapshot.articles(category=category, source=source, collapse=collapse)
+    total = len(latest_articles)
+    
+    skip = (page - 1) * per_page
+    articles = latest_articles[skip:skip + per_page] if skip >= 0 else []
+    
+    # Äldre artiklar kan finnas i arkivet om fönstret är fullt. Med collapse räknar
+    # total kluster, så fullt avgörs av de underliggande artiklarna.
+    window_full = len(snapshot.articles(category=category, source=source)) >= snapshot.size
+    has_more = skip + per_page < total or window_full
+    
+    return articles_payload(
+        articles,
+        fields,
+        total=total,
+        page=page,
+        per_page=per_page,
+        total_pages=(total + per_page - 1) // per_page,
+        # Gör det möjligt att fortsätta bakåt i arkivet efter sista sidan
+        next_cursor=encode_cursor(articles[-1]) if articles and has_more else None
+    )
+
+def build_stats(snapshot, days=7):
+    """Statistik: fönstrets antal per källa/kategori plus förberäknade totaler"""
+    summary = storage.stats(days=days)
+    last_update = summary['last_update']
+    
+    return {
+        'total_articles': len(snapshot.articles()),
+        'sources': snapshot.counts('source'),
+        'categories': snapshot.counts('category'),
+        'last_update': last_update.isoformat() if last_update else None,
+        'all_time': {
+            'total_articles': summary['total'],
+            'sources': summary['sources'],
+            'categories': summary['categories']
+        },
+        'per_day': summary['per_day'],
+        'per_hour': summary['per_hour']
+    }
 
 @app.route('/api/articles', methods=['GET'])
+@cached_response(response_cache, data_version)
 def get_articles():
-    """Hämta artiklar med filtrering och paginering (max 100 senaste artiklar)"""
+    """
+    Hämta artiklar med filtrering och paginering.
+    Sidnummer (page) pagineras inom de MAX_ARTICLES senaste artiklarna.
+    Med cursor pagineras hela arkivet, nyckelbaserat på (published_date, _id).
+    collapse=1 visar en artikel per kluster med övriga källor under 'related' (även med cursor).
+    """
     try:
-        if collection is None:
+        if storage is None:
             return jsonify({
                 'error': 'Database not connected',
-                'message': 'MongoDB är inte ansluten'
+                'message': 'Databasen är inte ansluten'
             }), 500
         
-        category = request.args.get('category')
-        source = request.args.get('source')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        
-        query = {}
-        if category and category != 'alla':
-            query['category'] = category
-        if source:
-            query['source'] = source
-        
-        # Begränsa till max 100 senaste artiklar
-        MAX_ARTICLES = 100
-        
-        # Hämta de 100 senaste artikel-ID:na först
-        latest_articles = list(collection.find(query, {'_id': 1})
-                              .sort('published_date', -1)
-                              .limit(MAX_ARTICLES))
-        
-        latest_ids = [article['_id'] for article in latest_articles]
-        total = min(len(latest_ids), MAX_ARTICLES)
-        
-        # Hämta artiklar för aktuell sida från de 100 senaste
-        skip = (page - 1) * per_page
+        try:
+            category, source, per_page, fields = parse_filters()
+        except ValueError as e:
+            return jsonify({
+                'error': str(e),
+                'message': 'Ogiltig fields- eller per_page-parameter'
+            }), 400
         
-        if skip >= total:
-            articles = []
-        else:
-            query_with_ids = query.copy()
-            query_with_ids['_id'] = {'$in': latest_ids}
-            
-            articles = collection.find(query_with_ids).sort('published_date', -1).skip(skip).limit(per_page)
-            articles = list(articles)
+        if 'cursor' in request.args:
+            if parse_collapse():
+                return get_collapsed_after_cursor(request.args['cursor'], category, source, per_page, fields)
+            return get_articles_after_cursor(request.args['cursor'], category, source, per_page, fields)
         
-        return jsonify({
-            'articles': parse_json(articles),
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        })
+        page = int(request.args.get('page', 1))
         
+        # De senaste artiklarna (max MAX_ARTICLES) hämtas från fönstret i minnet
+        return json_response(page_payload(latest_window.snapshot(), category, source,
+                                          page, per_page, fields, parse_collapse()))
+    
     except Exception as e:
         logger.error(f"Fel i /api/articles: {e}")
         return jsonify({
@@ -118,19 +252,93 @@ def get_articles():
             'message': 'Ett fel uppstod vid hämtning av artiklar'
         }), 500
 
+def get_articles_after_cursor(cursor, category, source, per_page, fields=None):
+    """Nyckelbaserad paginering - konstant kostnad per sida oavsett djup"""
+    try:
+        # En extra artikel avslöjar om det finns fler sidor; sidan fortsätter i arkivet
+        articles = storage.latest(per_page + 1, category=category, source=source,
+                                  cursor=cursor, fields=fields, archive=True)
+    except InvalidCursor as e:
+        return jsonify({
+            'error': str(e),
+            'message': 'Ogiltig cursor'
+        }), 400
+    
+    has_more = len(articles) > per_page
+    articles = articles[:per_page]
+    
+    return articles_response(
+        articles,
+        fields,
+        per_page=per_page,
+        cursor=cursor or None,
+        next_cursor=encode_cursor(articles[-1]) if has_more else None
+    )
+
+def get_collapsed_after_cursor(cursor, category, source, per_page, fields=None):
+    """
+    Cursor-paginering med collapse=1: fortsätter efter sidans sista kluster och hoppar
+    över artiklar som redan visats (även under 'related') på sidorna i fönstret och
+    på tidigare cursor-sidor.
+    """
+    try:
+        shown = latest_window.snapshot().shown_ids(cursor, category, source) if cursor else set()
+        # Syskon som visats under 'related' men är äldre än cursorn följer med i den
+        pending = cursor_shown_ids(cursor) if cursor else set()
+    except InvalidCursor as e:
+        return jsonify({
+            'error': str(e),
+            'message': 'Ogiltig cursor'
+        }), 400
+    
+    # Klustren och 'related' behöver sina fält även om de inte skickas till klienten
+    read_fields = fields and tuple(set(fields) | {'cluster_id'} | set(RELATED_FIELDS))
+    batch_size = (per_page + 1) * 2
+    fetched = []
+    position = cursor
+    while True:
+        batch = storage.latest(batch_size, category=category, source=source,
+                               cursor=position, fields=read_fields, archive=True)
+        fetched += batch
+        # Ett kluster extra avslöjar om det finns fler sidor
+        clusters = collapse_articles(fetched, per_page + 1, shown | pending)
+        if len(clusters) > per_page or len(batch) < batch_size:
+            break
+        position = encode_cursor(batch[-1])
+    
+    has_more = len(clusters) > per_page
+    articles = clusters[:per_page]
+    next_cursor = None
+    if has_more:
+        # Syskon äldre än sidans sista kluster skulle annars komma tillbaka som egna kort.
+        # Allt på eller före sidans slut har redan lästs och behöver inte följa med.
+        boundary = sort_key(articles[-1])
+        pending |= {related['article_id'] for article in articles for related in article.get('related', [])}
+        pending -= {article['article_id'] for article in fetched if sort_key(article) >= boundary}
+        next_cursor = encode_cursor(articles[-1], shown=pending)
+    
+    return articles_response(
+        articles,
+        fields,
+        per_page=per_page,
+        cursor=cursor or None,
+        next_cursor=next_cursor
+    )
+
 @app.route('/api/categories', methods=['GET'])
+@cached_response(response_cache, data_version)
 def get_categories():
     """Hämta alla tillgängliga kategorier"""
     try:
-        if collection is None:
+        if storage is None:
             return jsonify({
                 'error': 'Database not connected',
-                'message': 'MongoDB är inte ansluten'
+                'message': 'Databasen är inte ansluten'
             }), 500
-            
-        categories = collection.distinct('category')
-        return jsonify({'categories': categories})
         
+        categories = storage.distinct('category')
+        return jsonify({'categories': categories})
+    
     except Exception as e:
         logger.error(f"Fel i /api/categories: {e}")
         return jsonify({
@@ -139,18 +347,19 @@ def get_categories():
         }), 500
 
 @app.route('/api/sources', methods=['GET'])
+@cached_response(response_cache, data_version)
 def get_sources():
     """Hämta alla tillgängliga källor"""
     try:
-        if collection is None:
+        if storage is None:
             return jsonify({
                 'error': 'Database not connected',
-                'message': 'MongoDB är inte ansluten'
+                'message': 'Databasen är inte ansluten'
             }), 500
-            
-        sources = collection.distinct('source')
-        return jsonify({'sources': sources})
         
+        sources = storage.distinct('source')
+        return jsonify({'sources': sources})
+    
     except Exception as e:
         logger.error(f"Fel i /api/sources: {e}")
         return jsonify({
@@ -159,55 +368,23 @@ def get_sources():
         }), 500
 
 @app.route('/api/stats', methods=['GET'])
+@cached_response(response_cache, stats_version)
 def get_stats():
-    """Hämta statistik om innehållet (baserat på max 100 senaste artiklar)"""
+    """
+    Hämta statistik om innehållet.
+    Antal per källa/kategori gäller de MAX_ARTICLES senaste artiklarna (från fönstret);
+    totaler och antal per dygn/timme räknas upp vid inläsning och läses i ett anrop.
+    """
     try:
-        if collection is None:
+        if storage is None:
             return jsonify({
                 'error': 'Database not connected',
-                'message': 'MongoDB är inte ansluten'
+                'message': 'Databasen är inte ansluten'
             }), 500
         
-        # Begränsa statistik till de 100 senaste artiklarna
-        MAX_ARTICLES = 100
-        
-        # Hämta de 100 senaste artikel-ID:na
-        latest_articles = list(collection.find({}, {'_id': 1})
-                              .sort('published_date', -1)
-                              .limit(MAX_ARTICLES))
-        
-        latest_ids = [article['_id'] for article in latest_articles]
-        total_articles = len(latest_ids)
-        
-        # Statistik per källa
-        pipeline = [
-            {'$match': {'_id': {'$in': latest_ids}}},
-            {'$group': {'_id': '$source', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}}
-        ]
-        sources_stats = list(collection.aggregate(pipeline))
-        
-        # Statistik per kategori
-        pipeline = [
-            {'$match': {'_id': {'$in': latest_ids}}},
-            {'$group': {'_id': '$category', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}}
-        ]
-        category_stats = list(collection.aggregate(pipeline))
-        
-        latest = collection.find_one(sort=[('fetched_at', -1)])
-        last_update = latest['fetched_at'] if latest else None
-
-        if last_update and last_update.tzinfo is None:
-            last_update = last_update.replace(tzinfo=timezone.utc)
-        
-        return jsonify({
-            'total_articles': total_articles,
-            'sources': parse_json(sources_stats),
-            'categories': parse_json(category_stats),
-            'last_update': last_update.isoformat() if last_update else None
-        })
-        
+        days = min(max(int(request.args.get('days', 7)), 1), 90)
+        return jsonify(build_stats(latest_window.snapshot(), days))
+    
     except Exception as e:
         logger.error(f"Fel i /api/stats: {e}")
         return jsonify({
@@ -216,92 +393,220 @@ def get_stats():
         }), 500
 
 @app.route('/api/search', methods=['GET'])
+@cached_response(response_cache, data_version)
 def search_articles():
-    """Sök bland artiklar (max 100 senaste)"""
+    """Sök bland alla artiklar, rangordnade efter relevans"""
     try:
-        if collection is None:
+        if storage is None:
             return jsonify({
                 'error': 'Database not connected',
-                'message': 'MongoDB är inte ansluten'
+                'message': 'Databasen är inte ansluten'
             }), 500
-            
+        
         query_text = request.args.get('q', '')
         page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
         
-        if not query_text:
-            return jsonify({'articles': [], 'total': 0})
+        try:
+            per_page = parse_per_page()
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({
+                'error': str(e),
+                'message': 'Ogiltig fields- eller per_page-parameter'
+            }), 400
         
-        # Begränsa sökning till de 100 senaste artiklarna
-        MAX_ARTICLES = 100
+        skip = max(page - 1, 0) * per_page
+        # Ordstammar och prefix matchas mot lagringens sökindex (inget $regex på fritext)
+        result = storage.search(query_text, skip, per_page, fields=fields)
         
-        latest_articles = list(collection.find({}, {'_id': 1})
-                              .sort('published_date', -1)
-                              .limit(MAX_ARTICLES))
+        if result is None:
+            return jsonify({'articles': [], 'total': 0})
+        total, articles = result
         
-        latest_ids = [article['_id'] for article in latest_articles]
+        return articles_response(
+            articles,
+            fields,
+            total=total,
+            page=page,
+            per_page=per_page,
+            total_pages=(total + per_page - 1) // per_page,
+            query=query_text
+        )
+    
+    except Exception as e:
+        logger.error(f"Fel i /api/search: {e}")
+        return jsonify({
+            'error': str(e),
+            'message': 'Ett fel uppstod vid sökning'
+        }), 500
+
+@app.route('/api/bootstrap', methods=['GET'])
+@cached_response(response_cache, stats_version)
+def bootstrap():
+    """
+    Allt som behövs vid sidladdning i ett anrop: filter, statistik och första sidan.
+    Allt kommer från samma version av fönstret. Tar samma parametrar som /api/articles.
+    """
+    try:
+        if storage is None:
+            return jsonify({
+                'error': 'Database not connected',
+                'message': 'Databasen är inte ansluten'
+            }), 500
         
-        query = {
-            '_id': {'$in': latest_ids},
-            '$or': [
-                {'title': {'$regex': query_text, '$options': 'i'}},
-                {'description': {'$regex': query_text, '$options': 'i'}}
-            ]
-        }
+        try:
+            category, source, per_page, fields = parse_filters()
+        except ValueError as e:
+            return jsonify({
+                'error': str(e),
+                'message': 'Ogiltig fields- eller per_page-parameter'
+            }), 400
         
-        total = collection.count_documents(query)
-        skip = (page - 1) * per_page
-        articles = collection.find(query).sort('published_date', -1).skip(skip).limit(per_page)
+        snapshot = latest_window.snapshot()
+        stats_payload = build_stats(snapshot)
         
-        return jsonify({
-            'articles': parse_json(list(articles)),
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'query': query_text
-        })
+        # Filtren tas från de förberäknade totalerna i stället för distinct
+        categories = sorted(item['_id'] for item in stats_payload['all_time']['categories'])
+        sources = sorted(item['_id'] for item in stats_payload['all_time']['sources'])
+        if not categories:
+            categories = storage.distinct('category')
+            sources = storage.distinct('source')
         
+        body = dumps({
+            'version': snapshot.version,
+            'categories': categories,
+            'sources': sources,
+            'stats': stats_payload
+        })
+        first_page = page_payload(snapshot, category, source, 1, per_page, fields, parse_collapse())
+        return json_response(f'{body[:-1]},"first_page":{first_page}}}')
+    
     except Exception as e:
-        logger.error(f"Fel i /api/search: {e}")
+        logger.error(f"Fel i /api/bootstrap: {e}")
         return jsonify({
             'error': str(e),
-            'message': 'Ett fel uppstod vid sökning'
+            'message': 'Ett fel uppstod vid hämtning av startdata'
         }), 500
 
+@app.route('/api/stream', methods=['GET'])
+def stream_articles():
+    """Server-sent events med nya artiklar så fort de sparats"""
+    if article_stream is None:
+        return jsonify({
+            'error': 'Database not connected',
+            'message': 'Databasen är inte ansluten'
+        }), 500
+    
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    subscription = article_stream.open(last_event_id)
+    if subscription is None:
+        # Alla platser upptagna - klienten uppdaterar med polling och försöker senare
+        response = jsonify({
+            'error': 'Too many streams',
+            'message': 'För många anslutna klienter, försök igen senare'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAM_RETRY_SECONDS)
+        return response
+    
+    return Response(
+        subscription,
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stäng av buffring i t.ex. nginx så att händelserna kommer fram direkt
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def find_image_url(article_id):
+    """Bildadressen för en artikel (även arkiverad), eller None"""
+    article = storage.find_article(article_id, ('image_url',))
+    return article.get('image_url') if article is not None else None
+
+@app.route('/img/<article_id>')
+def article_image(article_id):
+    """
+    Miniatyr av artikelns bild: ?w= avrundas till en av THUMBNAIL_WIDTHS,
+    WebP om webbläsaren klarar det, annars JPEG. Cachas på disk och i webbläsaren.
+    """
+    if not ARTICLE_ID_RE.match(article_id):
+        return jsonify({'error': 'Not found', 'message': 'Bilden finns inte'}), 404
+    try:
+        width = choose_width(int(request.args.get('w', 0)))
+    except ValueError:
+        return jsonify({'error': 'Invalid width', 'message': 'Ogiltig bredd'}), 400
+    fmt = choose_format(request.headers.get('Accept'))
+    
+    # Redan skapade miniatyrer serveras utan databasanrop
+    found = thumbnailer.cached(article_id, width, fmt)
+    if found is None:
+        if storage is None:
+            return jsonify({
+                'error': 'Database not connected',
+                'message': 'Databasen är inte ansluten'
+            }), 500
+        
+        image_url = find_image_url(article_id)
+        if not image_url:
+            return jsonify({'error': 'Not found', 'message': 'Artikeln saknar bild'}), 404
+        try:
+            found = thumbnailer.thumbnail(article_id, image_url, width, fmt)
+        except ImageError as e:
+            # Låt webbläsaren försöka med originalet i stället för att visa en trasig bild
+            logger.info(f"Kunde inte skapa miniatyr för {article_id}: {e}")
+            response = redirect(image_url)
+            response.cache_control.max_age = 300
+            return response
+    
+    path, mimetype = found
+    response = send_file(path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    # Webbläsaren ska aldrig tolka bilden som något annat än den angivna typen
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = "default-src 'none'; sandbox"
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Kontrollera att API:et fungerar"""
     try:
-        if collection is None:
+        if storage is None:
             return jsonify({
                 'status': 'error',
-                'message': 'MongoDB är inte ansluten',
-                'mongodb': 'disconnected'
+                'message': 'Databasen är inte ansluten',
+                'database': 'disconnected',
+                'storage': STORAGE_BACKEND
             }), 500
-            
-        client.admin.command('ping')
         
-        # Räkna artiklar (från de 100 senaste)
-        MAX_ARTICLES = 100
-        latest_articles = list(collection.find({}, {'_id': 1})
-                              .sort('published_date', -1)
-                              .limit(MAX_ARTICLES))
-        article_count = len(latest_articles)
+        storage.ping()
+        
+        # Räkna artiklar (från de senaste i fönstret)
+        article_count = len(latest_window.articles())
         
         return jsonify({
             'status': 'ok',
             'timestamp': datetime.now(timezone.utc).isoformat(),
-            'mongodb': 'connected',
+            'database': 'connected',
+            'storage': STORAGE_BACKEND,
             'articles': article_count,
             'max_articles_shown': MAX_ARTICLES
         })
-        
+    
     except Exception as e:
         logger.error(f"Health check misslyckades: {e}")
         return jsonify({
             'status': 'error',
             'message': str(e),
-            'mongodb': 'disconnected'
+            'database': 'disconnected',
+            'storage': STORAGE_BACKEND
         }), 500
 
 if __name__ == '__main__':
@@ -313,15 +618,19 @@ if __name__ == '__main__':
     ║     Svenska Nyheter - Flipboard Clone            ║
     ║                                                  ║
     ║  Server körs på: http://0.0.0.0:{port:<4}        ║
-    ║  Max artiklar: 100 senaste                       ║
+    ║  Max artiklar: {MAX_ARTICLES:<4} senaste                      ║
     ║                                                  ║
     ║  Tryck Ctrl+C för att stoppa                     ║
     ╚══════════════════════════════════════════════════╝
     """)
     
+    warm_up()
+    start_background_services()
+    
     try:
+        # Utvecklingsserver - i produktion: gunicorn -c gunicorn.conf.py server:app
         app.run(debug=debug, host='0.0.0.0', port=port)
     except KeyboardInterrupt:
-        if 'scheduler' in locals():
-            scheduler.stop()
         logger.info("\n✋ Server stoppad")
+    finally:
+        shutdown()
@@ -0,0 +1,539 @@
+"""
+Inbäddad lagring i en SQLite-fil, för installationer på en nod.
+
+Läsningar görs i processen utan nätverk. Filen körs i WAL-läge så att läsare
+aldrig blockeras av skrivningar och flera processer (gunicorn-workers, worker.py)
+kan dela den. Sökningen använder FTS5 över samma ordstammar som MongoDB-indexet
+(search_terms/title_terms), och statistiken räknas upp vid inläsning som i meta.
+"""
+from datetime import datetime, timedelta, timezone
+from contextlib import contextmanager
+from storage import Storage
+from search import parse_query
+from cluster import cluster_articles, lsh_bands
+from pagination import decode_cursor
+from stats import DAY_PREFIX, stats_day_ids, summarize
+from config import (
+    SQLITE_PATH, SQLITE_BUSY_TIMEOUT_SECONDS, CLUSTER_WINDOW_HOURS, LEADER_LEASE_SECONDS,
+    SEARCH_MAX_CANDIDATES, RETENTION_DAYS, RETENTION_MAX_ARTICLES
+)
+import json
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    article_id TEXT NOT NULL UNIQUE,
+    published_date INTEGER NOT NULL,
+    source TEXT,
+    category TEXT,
+    cluster_id TEXT,
+    fetched_at INTEGER,
+    minhash TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_latest ON articles (published_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS articles_category ON articles (category, published_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS articles_source ON articles (source, published_date DESC, id DESC);
+
+-- Äldre artiklar som flyttats ut ur articles (se compact). Behåller sitt id, så att
+-- sökindexet och cursorer fortsätter att gälla (AUTOINCREMENT: id återanvänds aldrig).
+CREATE TABLE IF NOT EXISTS articles_archive (
+    id INTEGER PRIMARY KEY,
+    article_id TEXT NOT NULL UNIQUE,
+    published_date INTEGER NOT NULL,
+    source TEXT,
+    category TEXT,
+    cluster_id TEXT,
+    fetched_at INTEGER,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_archive_latest ON articles_archive (published_date DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS article_bands (
+    band INTEGER NOT NULL,
+    published_date INTEGER NOT NULL,
+    article INTEGER NOT NULL,
+    PRIMARY KEY (band, published_date, article)
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title_terms, search_terms, content='', tokenize='unicode61 remove_diacritics 0'
+);
+
+CREATE TABLE IF NOT EXISTS stats_counts (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stats_hours (
+    hour TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS feed_state (url TEXT PRIMARY KEY, state TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS locks (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Kolumner som läses för en artikel (doc innehåller övriga publika fält)
+ARTICLE_COLUMNS = 'id, article_id, published_date, source, category, cluster_id, fetched_at, doc'
+# Publika fält som sparas i doc
+DOC_FIELDS = ('title', 'link', 'description', 'excerpt', 'image_url')
+# Rubrikträffar väger tre gånger så mycket som träffar i beskrivningen (som i MongoDB)
+SEARCH_WEIGHTS = (3.0, 1.0)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _millis(dt):
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+def _datetime(millis):
+    return EPOCH + timedelta(milliseconds=millis) if millis is not None else None
+
+
+def _stored_bands(minhash):
+    """LSH-banden för en sparad signatur (inga om artikeln saknar signatur)"""
+    signature = json.loads(minhash or '[]')
+    return lsh_bands(signature) if signature else []
+
+
+def _article(row, fields=None):
+    """Bygg artikeln av en rad (samma fält som i MongoDB, utan sök- och signaturfälten)"""
+    _id, article_id, published_date, source, category, cluster_id, fetched_at, doc = row
+    article = {
+        '_id': _id,
+        'article_id': article_id,
+        'published_date': _datetime(published_date),
+        'source': source,
+        'category': category,
+        'cluster_id': cluster_id,
+        'fetched_at': _datetime(fetched_at),
+        **json.loads(doc)
+    }
+    if fields is not None:
+        # Sorteringsnycklarna behövs alltid för nästa cursor
+        keep = set(fields) | {'published_date', '_id'}
+        article = {field: value for field, value in article.items() if field in keep}
+    return article
+
+
+class SQLiteStorage(Storage):
+    """Artiklar, statistik, flödestillstånd och ledarlås i en SQLite-fil"""
+    
+    def __init__(self, path=SQLITE_PATH, busy_timeout=SQLITE_BUSY_TIMEOUT_SECONDS):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        # En anslutning per tråd (sqlite3-anslutningar får inte delas mellan trådar)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._schema_ready = False
+    
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # isolation_level=None: inga dolda transaktioner, skrivningar använder BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Säkert i WAL-läge: en krasch kan förlora de senaste transaktionerna men aldrig filen
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-32000')
+        with self._lock:
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+            self._connections.append(conn)
+        self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def _write(self):
+        """Skrivtransaktion; tar skrivlåset direkt så att läsningar i den är konsekventa"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    
+    def ensure_indexes(self):
+        # Tabellerna och indexen skapas med den första anslutningen
+        self._connection()
+    
+    def ping(self):
+        self._connection().execute('SELECT 1').fetchone()
+    
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+            self._schema_ready = False
+        self._local = threading.local()
+    
+    def version(self):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+    
+    def _candidates(self, conn, bands, since):
+        """Artiklar som delar minst ett band och är publicerade efter since (som cluster.candidate_query)"""
+        candidates = {}
+        rows = conn.execute(
+            """SELECT b.band, a.article_id, a.cluster_id, a.minhash
+               FROM article_bands b JOIN articles a ON a.id = b.article
+               WHERE b.band IN (SELECT value FROM json_each(?)) AND b.published_date >= ?""",
+            (json.dumps(sorted(bands)), _millis(since))
+        )
+        for band, article_id, cluster_id, minhash in rows:
+            candidate = candidates.get(article_id)
+            if candidate is None:
+                candidate = candidates[article_id] = {
+                    'article_id': article_id, 'cluster_id': cluster_id,
+                    'minhash': json.loads(minhash), 'lsh_bands': []
+                }
+            candidate['lsh_bands'].append(band)
+        return list(candidates.values())
+    
+    def insert_articles(self, articles):
+        result = {'new': 0, 'duplicates': 0, 'errors': 0}
+        if not articles:
+            return result, []
+        
+        # En transaktion: uppslagning, klustring och skrivning ser samma data
+        with self._write() as conn:
+            # Artiklar som fortfarande finns i flödet kan redan ha arkiverats
+            article_ids = json.dumps([article['article_id'] for article in articles])
+            known = {row[0] for row in conn.execute(
+                'SELECT article_id FROM articles WHERE article_id IN (SELECT value FROM json_each(?)) '
+                'UNION SELECT article_id FROM articles_archive WHERE article_id IN (SELECT value FROM json_each(?))',
+                (article_ids, article_ids)
+            )}
+            result['duplicates'] = len(known)
+            inserted = [article for article in articles if article['article_id'] not in known]
+            if not inserted:
+                return result, []
+            
+            # Nya artiklar om samma händelse som en nyligen sparad får dess cluster_id
+            unclustered = [article for article in inserted if not article.get('cluster_id')]
+            bands = {band for article in unclustered for band in article.get('lsh_bands', [])}
+            since = datetime.now(timezone.utc) - timedelta(hours=CLUSTER_WINDOW_HOURS)
+            cluster_articles(unclustered, self._candidates(conn, bands, since) if bands else [])
+            
+            for article in inserted:
+                published = _millis(article['published_date'])
+                cursor = conn.execute(
+                    'INSERT INTO articles (article_id, published_date, source, category, cluster_id, '
+                    'fetched_at, minhash, doc) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (article['article_id'], published, article.get('source'), article.get('category'),
+                     article.get('cluster_id'), _millis(article.get('fetched_at')),
+                     json.dumps(article.get('minhash', [])),
+                     json.dumps({field: article.get(field) for field in DOC_FIELDS}, ensure_ascii=False))
+                )
+                # Som insert_many i MongoDB: artikeln får sitt _id
+                article['_id'] = cursor.lastrowid
+                conn.executemany(
+                    'INSERT OR IGNORE INTO article_bands (band, published_date, article) VALUES (?, ?, ?)',
+                    [(band, published, article['_id']) for band in article.get('lsh_bands', [])]
+                )
+                conn.execute(
+                    'INSERT INTO articles_fts (rowid, title_terms, search_terms) VALUES (?, ?, ?)',
+                    (article['_id'], ' '.join(article.get('title_terms', [])),
+                     ' '.join(article.get('search_terms', [])))
+                )
+            
+            self._record_stats(conn, inserted)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('version', 1) "
+                         "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+        result['new'] = len(inserted)
+        return result, inserted
+    
+    def _record_stats(self, conn, articles):
+        """Räkna upp totaler per källa/kategori och antal per timme (som stats.record_articles)"""
+        counts = {('total', ''): len(articles)}
+        hours = {}
+        last_update = None
+        for article in articles:
+            for kind in ('source', 'category'):
+                key = (kind, str(article.get(kind)))
+                counts[key] = counts.get(key, 0) + 1
+            published = article['published_date']
+            if published.tzinfo is None:
+                published = published.replace(tzinfo=timezone.utc)
+            hour = published.astimezone(timezone.utc).strftime('%Y-%m-%dT%H')
+            hours[hour] = hours.get(hour, 0) + 1
+            fetched_at = _millis(article.get('fetched_at'))
+            if fetched_at is not None and (last_update is None or fetched_at > last_update):
+                last_update = fetched_at
+        
+        conn.executemany(
+            'INSERT INTO stats_counts (kind, name, count) VALUES (?, ?, ?) '
+            'ON CONFLICT (kind, name) DO UPDATE SET count = count + excluded.count',
+            [(kind, name, count) for (kind, name), count in counts.items()]
+        )
+        conn.executemany(
+            'INSERT INTO stats_hours (hour, count) VALUES (?, ?) '
+            'ON CONFLICT (hour) DO UPDATE SET count = count + excluded.count',
+            list(hours.items())
+        )
+        if last_update is not None:
+            conn.execute("INSERT INTO meta (key, value) VALUES ('last_update', ?) "
+                         "ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value)",
+                         (last_update,))
+    
+    def latest(self, limit, category=None, source=None, cursor=None, fields=None, archive=False):
+        conditions = []
+        params = []
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+        if source:
+            conditions.append('source = ?')
+            params.append(source)
+        if cursor:
+            published_date, _id = decode_cursor(cursor, id_type=int)
+            conditions.append('(published_date, id) < (?, ?)')
+            params += [_millis(published_date), _id]
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self._connection()
+        articles = []
+        # Arkivet innehåller äldre artiklar, så listan fortsätter där
+        for table in ('articles', 'articles_archive') if archive else ('articles',):
+            rows = conn.execute(
+                f'SELECT {ARTICLE_COLUMNS} FROM {table} {where} '
+                'ORDER BY published_date DESC, id DESC LIMIT ?',
+                params + [limit - len(articles)]
+            )
+            articles += [_article(row, fields) for row in rows]
+            if len(articles) >= limit:
+                break
+        return articles
+    
+    def distinct(self, field):
+        if field not in ('source', 'category'):
+            raise ValueError(f"Okänt fält: {field}")
+        # Läses ur indexet (articles_source/articles_category) utan att röra tabellen
+        rows = self._connection().execute(
+            f'SELECT DISTINCT {field} FROM articles WHERE {field} IS NOT NULL ORDER BY {field}'
+        )
+        return [row[0] for row in rows]
+    
+    def find_article(self, article_id, fields=None):
+        conn = self._connection()
+        for table in ('articles', 'articles_archive'):
+            row = conn.execute(
+                f'SELECT {ARTICLE_COLUMNS} FROM {table} WHERE article_id = ?', (article_id,)
+            ).fetchone()
+            if row is not None:
+                return _article(row, fields)
+        return None
+    
+    def stats(self, days=7):
+        now = datetime.now(timezone.utc)
+        conn = self._connection()
+        
+        summary = {'sources': {}, 'categories': {}}
+        for kind, name, count in conn.execute('SELECT kind, name, count FROM stats_counts'):
+            if kind == 'total':
+                summary['total'] = count
+            else:
+                summary['sources' if kind == 'source' else 'categories'][name] = count
+        row = conn.execute("SELECT value FROM meta WHERE key = 'last_update'").fetchone()
+        summary['last_update'] = _datetime(row[0]) if row else None
+        
+        # Samma dygnsdokument som i meta-collectionen: {'total', 'hours': {'HH': antal}}
+        day_ids = stats_day_ids(days, now)
+        first_day = day_ids[-1][len(DAY_PREFIX):]
+        day_docs = {}
+        for hour, count in conn.execute('SELECT hour, count FROM stats_hours WHERE hour >= ?', (first_day,)):
+            doc = day_docs.setdefault(DAY_PREFIX + hour[:10], {'total': 0, 'hours': {}})
+            doc['total'] += count
+            doc['hours'][hour[11:13]] = count
+        return summarize(summary, day_docs, days, now)
+    
+    def search(self, query_text, skip, limit, fields=None):
+        terms, prefix = parse_query(query_text)
+        if not terms and not prefix:
+            return None
+        
+        # Samma ordstammar som search_terms; sista ordet matchas som prefix.
+        # Termerna består bara av bokstäver och siffror (se search.tokenize).
+        match = ' AND '.join([f'"{term}"' for term in terms] + ([f'"{prefix}"*'] if prefix else []))
+        conn = self._connection()
+        # Bara de SEARCH_MAX_CANDIDATES nyaste träffarna rangordnas, som i MongoDB
+        # (sortering med LIMIT håller bara så många rader i minnet)
+        total = conn.execute(
+            'SELECT count(*) FROM (SELECT 1 FROM articles_fts WHERE articles_fts MATCH ? LIMIT ?)',
+            (match, SEARCH_MAX_CANDIDATES)
+        ).fetchone()[0]
+        # Sökindexet täcker både articles och arkivet (arkiverade artiklar behåller sitt id)
+        ids = [row[0] for row in conn.execute(
+            """WITH candidates AS (
+                   SELECT id, published_date FROM (
+                       SELECT a.id, a.published_date FROM articles_fts f JOIN articles a ON a.id = f.rowid
+                       WHERE articles_fts MATCH ?
+                       UNION ALL
+                       SELECT a.id, a.published_date FROM articles_fts f JOIN articles_archive a ON a.id = f.rowid
+                       WHERE articles_fts MATCH ?
+                   )
+                   ORDER BY published_date DESC LIMIT ?
+               )
+               SELECT c.id FROM articles_fts f JOIN candidates c ON c.id = f.rowid
+               WHERE articles_fts MATCH ?
+               ORDER BY bm25(articles_fts, ?, ?), c.published_date DESC
+               LIMIT ? OFFSET ?""",
+            (match, match, SEARCH_MAX_CANDIDATES, match, *SEARCH_WEIGHTS, limit, skip)
+        )]
+        return total, self._articles_by_id(conn, ids, fields)
+    
+    def _articles_by_id(self, conn, ids, fields=None):
+        """Artiklar (även arkiverade) i samma ordning som ids"""
+        found = {}
+        for table in ('articles', 'articles_archive'):
+            rows = conn.execute(
+                f'SELECT {ARTICLE_COLUMNS} FROM {table} WHERE id IN (SELECT value FROM json_each(?))',
+                (json.dumps(ids),)
+            )
+            found.update((row[0], row) for row in rows)
+        return [_article(found[_id], fields) for _id in ids if _id in found]
+    
+    def load_feed_state(self, url):
+        row = self._connection().execute('SELECT state FROM feed_state WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return {}
+        state = json.loads(row[0])
+        if state.get('checked_at') is not None:
+            state['checked_at'] = _datetime(state['checked_at'])
+        return state
+    
+    def save_feed_state(self, url, fields):
+        with self._write() as conn:
+            row = conn.execute('SELECT state FROM feed_state WHERE url = ?', (url,)).fetchone()
+            state = json.loads(row[0]) if row else {}
+            state.update({key: _millis(value) if isinstance(value, datetime) else value
+                          for key, value in fields.items()})
+            conn.execute('INSERT INTO feed_state (url, state) VALUES (?, ?) '
+                         'ON CONFLICT (url) DO UPDATE SET state = excluded.state',
+                         (url, json.dumps(state)))
+    
+    def leader_lock(self, name):
+        return SQLiteLeaderLock(self, name)
+    
+    def compact(self, days=RETENTION_DAYS, max_articles=RETENTION_MAX_ARTICLES, batch_size=500):
+        """
+        Flytta artiklar till articles_archive med samma regler som retention.retention_query:
+        äldre än days dagar och/eller utöver de max_articles senaste. En omgång flyttas
+        i en transaktion. Returnerar antal flyttade artiklar.
+        """
+        conn = self._connection()
+        conditions = []
+        params = []
+        if days:
+            conditions.append('published_date < ?')
+            params.append(_millis(datetime.now(timezone.utc) - timedelta(days=days)))
+        if max_articles:
+            # Den första artikeln som inte längre ryms bland de N senaste
+            boundary = conn.execute(
+                'SELECT published_date, id FROM articles ORDER BY published_date DESC, id DESC LIMIT 1 OFFSET ?',
+                (max_articles,)
+            ).fetchone()
+            if boundary is not None:
+                conditions.append('(published_date, id) <= (?, ?)')
+                params += list(boundary)
+        if not conditions:
+            return 0
+        
+        moved = 0
+        while True:
+            with self._write() as conn:
+                batch = conn.execute(
+                    f"SELECT id, published_date, minhash FROM articles WHERE {' OR '.join(conditions)} "
+                    'ORDER BY published_date LIMIT ?',
+                    params + [batch_size]
+                ).fetchall()
+                if not batch:
+                    break
+                ids = json.dumps([row[0] for row in batch])
+                conn.execute(
+                    f'INSERT OR IGNORE INTO articles_archive ({ARTICLE_COLUMNS}) '
+                    f'SELECT {ARTICLE_COLUMNS} FROM articles WHERE id IN (SELECT value FROM json_each(?))',
+                    (ids,)
+                )
+                # Banden behövs bara för klustring av nya artiklar; nycklarna räknas fram ur
+                # signaturen så att raderna kan tas bort via primärnyckeln
+                conn.executemany(
+                    'DELETE FROM article_bands WHERE band = ? AND published_date = ? AND article = ?',
+                    [(band, published, _id) for _id, published, minhash in batch
+                     for band in _stored_bands(minhash)]
+                )
+                conn.execute('DELETE FROM articles WHERE id IN (SELECT value FROM json_each(?))', (ids,))
+            moved += len(batch)
+        
+        if moved:
+            # Fönstret och cachade svar ska inte längre visa de flyttade artiklarna
+            with self._write() as conn:
+                conn.execute("INSERT INTO meta (key, value) VALUES ('version', 1) "
+                             "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+        return moved
+
+
+class SQLiteLeaderLock:
+    """Samma lås som LeaderLock (leader_lock.py), i SQLite-filen"""
+    
+    def __init__(self, storage, name, lease_seconds=LEADER_LEASE_SECONDS, owner=None):
+        self.storage = storage
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    
+    def acquire(self):
+        """Ta eller förnya lånet. Returnerar True om vi är ledare."""
+        now = datetime.now(timezone.utc).timestamp()
+        with self.storage._write() as conn:
+            conn.execute(
+                'INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                'WHERE locks.expires_at < ? OR locks.owner = excluded.owner',
+                (self.name, self.owner, now + self.lease_seconds, now)
+            )
+            row = conn.execute('SELECT owner FROM locks WHERE name = ?', (self.name,)).fetchone()
+        return row is not None and row[0] == self.owner
+    
+    def release(self):
+        with self.storage._write() as conn:
+            conn.execute('DELETE FROM locks WHERE name = ? AND owner = ?', (self.name, self.owner))
+    
+    def holder(self):
+        row = self.storage._connection().execute(
+            'SELECT owner, expires_at FROM locks WHERE name = ?', (self.name,)
+        ).fetchone()
+        if row is None or row[1] <= datetime.now(timezone.utc).timestamp():
+            return None
+        return row[0]
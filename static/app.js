@@ -4,6 +4,13 @@ let currentCategory = 'alla';
 let currentSource = '';
 let searchQuery = '';
 let totalPages = 1;
+// Cursors för äldre sidor bortom de senaste artiklarna (nyckelbaserad paginering)
+let cursorStack = [];
+let nextCursor = null;
+let lastUpdateDate = null;
+
+// Fälten ett artikelkort behöver (servern skickar inget annat)
+const CARD_FIELDS = 'article_id,title,link,excerpt,published_date,source,category,image_url,cluster_id,related';
 
 // Ladda kategorier och källor
 async function loadFilters() {
@@ -12,60 +19,77 @@ async function loadFilters() {
             fetch('/api/categories').then(r => r.json()),
             fetch('/api/sources').then(r => r.json())
         ]);
-
-        const categorySelect = document.getElementById('categoryFilter');
-        categories.categories.forEach(cat => {
-            const option = document.createElement('option');
-            option.value = cat;
-            option.textContent = cat.charAt(0).toUpperCase() + cat.slice(1);
-            categorySelect.appendChild(option);
-        });
-
-        const sourceSelect = document.getElementById('sourceFilter');
-        sources.sources.forEach(source => {
-            const option = document.createElement('option');
-            option.value = source;
-            option.textContent = source;
-            sourceSelect.appendChild(option);
-        });
+        renderFilters(categories.categories, sources.sources);
     } catch (error) {
         console.error('Fel vid laddning av filter:', error);
     }
 }
 
+// Fyll i filterlistorna
+function renderFilters(categories, sources) {
+    const categorySelect = document.getElementById('categoryFilter');
+    categories.forEach(cat => {
+        const option = document.createElement('option');
+        option.value = cat;
+        option.textContent = cat.charAt(0).toUpperCase() + cat.slice(1);
+        categorySelect.appendChild(option);
+    });
+
+    const sourceSelect = document.getElementById('sourceFilter');
+    sources.forEach(source => {
+        const option = document.createElement('option');
+        option.value = source;
+        option.textContent = source;
+        sourceSelect.appendChild(option);
+    });
+}
+
 // Ladda statistik
 async function loadStats() {
     try {
         const stats = await fetch('/api/stats').then(r => r.json());
-        document.getElementById('totalArticles').textContent = stats.total_articles;
-        
-        if (stats.last_update) {
-            const date = new Date(stats.last_update);
-            const now = new Date();
-            const diffMinutes = Math.floor((now - date) / (1000 * 60));
-            
-            let updateText;
-            if (diffMinutes < 1) {
-                updateText = 'Just nu';
-            } else if (diffMinutes < 60) {
-                updateText = `${diffMinutes} min sedan`;
-            } else if (diffMinutes < 1440) {
-                const hours = Math.floor(diffMinutes / 60);
-                updateText = `${hours}h sedan`;
-            } else {
-                updateText = date.toLocaleDateString('sv-SE', { 
-                    month: 'short', 
-                    day: 'numeric' 
-                });
-            }
-            
-            document.getElementById('lastUpdate').textContent = updateText;
-        }
+        renderStats(stats);
     } catch (error) {
         console.error('Fel vid laddning av statistik:', error);
     }
 }
 
+// Visa statistik i sidhuvudet
+function renderStats(stats) {
+    document.getElementById('totalArticles').textContent = stats.total_articles;
+    
+    if (stats.last_update) {
+        lastUpdateDate = new Date(stats.last_update);
+        renderLastUpdate();
+    }
+}
+
+// Visa hur länge sedan senaste uppdateringen var (räknas om lokalt, utan anrop)
+function renderLastUpdate() {
+    if (!lastUpdateDate) return;
+
+    const date = lastUpdateDate;
+    const now = new Date();
+    const diffMinutes = Math.floor((now - date) / (1000 * 60));
+    
+    let updateText;
+    if (diffMinutes < 1) {
+        updateText = 'Just nu';
+    } else if (diffMinutes < 60) {
+        updateText = `${diffMinutes} min sedan`;
+    } else if (diffMinutes < 1440) {
+        const hours = Math.floor(diffMinutes / 60);
+        updateText = `${hours}h sedan`;
+    } else {
+        updateText = date.toLocaleDateString('sv-SE', { 
+            month: 'short', 
+            day: 'numeric' 
+        });
+    }
+    
+    document.getElementById('lastUpdate').textContent = updateText;
+}
+
 // Ladda artiklar
 async function loadArticles() {
     const loading = document.getElementById('loading');
@@ -75,11 +99,15 @@ async function loadArticles() {
     grid.innerHTML = '';
 
     try {
-        let url = `/api/articles?page=${currentPage}&per_page=20`;
+        // Samma händelse från flera källor visas som ett kort
+        let url = `/api/articles?page=${currentPage}&per_page=20&collapse=1&fields=${CARD_FIELDS}`;
         
         if (searchQuery) {
-            url = `/api/search?q=${encodeURIComponent(searchQuery)}&page=${currentPage}&per_page=20`;
+            url = `/api/search?q=${encodeURIComponent(searchQuery)}&page=${currentPage}&per_page=20&fields=${CARD_FIELDS}`;
         } else {
+            if (cursorStack.length > 0) {
+                url = `/api/articles?cursor=${encodeURIComponent(cursorStack[cursorStack.length - 1])}&per_page=20&collapse=1&fields=${CARD_FIELDS}`;
+            }
             if (currentCategory !== 'alla') {
                 url += `&category=${currentCategory}`;
             }
@@ -89,20 +117,7 @@ async function loadArticles() {
         }
 
         const response = await fetch(url);
-        const data = await response.json();
-        
-        totalPages = data.total_pages;
-        
-        if (data.articles.length === 0) {
-            grid.innerHTML = '<div style="grid-column: 1/-1; text-align: center; padding: 60px 20px; color: var(--text-muted);"><p style="font-size: 16px; margin-bottom: 8px;">Inga artiklar hittades</p><p style="font-size: 14px;">Prova att ändra filter eller sökning</p></div>';
-        } else {
-            data.articles.forEach(article => {
-                const card = createArticleCard(article);
-                grid.appendChild(card);
-            });
-        }
-
-        renderPagination();
+        renderArticles(await response.json());
     } catch (error) {
         console.error('Fel vid laddning av artiklar:', error);
         grid.innerHTML = '<div style="grid-column: 1/-1; text-align: center; padding: 60px 20px; color: var(--text-muted);"><p>Ett fel uppstod vid laddning av artiklar.</p></div>';
@@ -111,10 +126,57 @@ async function loadArticles() {
     }
 }
 
+// Visa en sida med artiklar
+function renderArticles(data) {
+    const grid = document.getElementById('articlesGrid');
+    grid.innerHTML = '';
+
+    totalPages = data.total_pages;
+    nextCursor = data.next_cursor || null;
+    
+    if (data.articles.length === 0) {
+        grid.innerHTML = '<div style="grid-column: 1/-1; text-align: center; padding: 60px 20px; color: var(--text-muted);"><p style="font-size: 16px; margin-bottom: 8px;">Inga artiklar hittades</p><p style="font-size: 14px;">Prova att ändra filter eller sökning</p></div>';
+    } else {
+        data.articles.forEach(article => {
+            const card = createArticleCard(article);
+            grid.appendChild(card);
+        });
+    }
+
+    renderPagination();
+}
+
+// Första laddningen: filter, statistik och första sidan i ett enda anrop
+async function bootstrap() {
+    const loading = document.getElementById('loading');
+    loading.style.display = 'block';
+
+    try {
+        const data = await fetch(`/api/bootstrap?per_page=20&collapse=1&fields=${CARD_FIELDS}`).then(r => {
+            if (!r.ok) throw new Error(`HTTP ${r.status}`);
+            return r.json();
+        });
+        renderFilters(data.categories, data.sources);
+        renderStats(data.stats);
+        renderArticles(data.first_page);
+    } catch (error) {
+        // Fall tillbaka på de separata anropen
+        console.error('Fel vid uppstart:', error);
+        loadFilters();
+        loadStats();
+        loadArticles();
+    } finally {
+        loading.style.display = 'none';
+    }
+}
+
 // Skapa artikelkort
 function createArticleCard(article) {
     const card = document.createElement('div');
     card.className = 'article-card';
+    card.dataset.articleId = article.article_id;
+    card.dataset.published = article.published_date.$date;
+    card.dataset.clusterId = article.cluster_id || article.article_id;
     card.onclick = () => window.open(article.link, '_blank');
 
     const publishedDate = new Date(article.published_date.$date);
@@ -122,7 +184,7 @@ function createArticleCard(article) {
 
     card.innerHTML = `
         ${article.image_url 
-            ? `<img class="article-image" src="${article.image_url}" alt="${article.title}" onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';" loading="lazy">`
+            ? `<img class="article-image" src="${imageUrl(article, 640)}" srcset="${imageSrcset(article)}" sizes="(max-width: 768px) 100vw, 400px" alt="${article.title}" onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';" loading="lazy">`
             : ''}
         <div class="no-image" style="${article.image_url ? 'display:none' : ''}">N</div>
         <div class="article-content">
@@ -131,7 +193,8 @@ function createArticleCard(article) {
                 <span class="category-badge">${article.category}</span>
             </div>
             <h2 class="article-title">${article.title}</h2>
-            <p class="article-description">${stripHtml(article.description)}</p>
+            <p class="article-description">${articleExcerpt(article)}</p>
+            ${relatedSources(article)}
             <div class="article-date">${timeAgo}</div>
         </div>
     `;
@@ -139,6 +202,103 @@ function createArticleCard(article) {
     return card;
 }
 
+// Lägg in nya artiklar från servern överst i listan (utan att ladda om)
+function prependArticles(articles) {
+    // Bara på första sidan utan sökning - annars skulle sidindelningen förskjutas
+    if (searchQuery || currentPage !== 1 || cursorStack.length > 0) return;
+
+    const grid = document.getElementById('articlesGrid');
+    const matching = articles.filter(article =>
+        (currentCategory === 'alla' || article.category === currentCategory) &&
+        (!currentSource || article.source === currentSource) &&
+        !grid.querySelector(`[data-article-id="${article.article_id}"]`) &&
+        // Händelsen visas redan (från en annan källa)
+        !(article.cluster_id && grid.querySelector(`[data-cluster-id="${article.cluster_id}"]`))
+    );
+    if (matching.length === 0) return;
+
+    // Ta bort "Inga artiklar hittades" om det visas
+    if (!grid.querySelector('.article-card')) {
+        grid.innerHTML = '';
+    }
+
+    matching.forEach(article => {
+        const card = createArticleCard(article);
+        const published = new Date(article.published_date.$date);
+        const older = Array.from(grid.children).find(
+            existing => new Date(existing.dataset.published) < published
+        );
+        grid.insertBefore(card, older || null);
+    });
+
+    // Behåll samma antal kort som en sida (20)
+    while (grid.children.length > 20) {
+        grid.lastElementChild.remove();
+    }
+}
+
+// Sekunder innan vi försöker igen när servern inte tar emot fler strömmar (503)
+const STREAM_RETRY_SECONDS = 60;
+
+// Ta emot nya artiklar från servern via server-sent events
+function listenForNewArticles() {
+    if (!window.EventSource) {
+        // Äldre webbläsare: uppdatera statistiken med polling
+        setInterval(loadStats, 60000);
+        return;
+    }
+
+    const stream = new EventSource('/api/stream');
+    stream.addEventListener('articles', (event) => {
+        prependArticles(JSON.parse(event.data));
+        loadStats();
+    });
+    stream.addEventListener('error', () => {
+        // Vanliga avbrott återansluter webbläsaren själv; ett felsvar (t.ex. 503 när
+        // servern är full) stänger strömmen - polla och försök igen senare (med spridning)
+        if (stream.readyState !== EventSource.CLOSED) return;
+        const poll = setInterval(loadStats, 60000);
+        const delay = STREAM_RETRY_SECONDS * (1 + Math.random());
+        setTimeout(() => {
+            clearInterval(poll);
+            listenForNewArticles();
+        }, delay * 1000);
+    });
+}
+
+// Textutdrag för kortet (äldre artiklar utan excerpt tvättas i klienten)
+function articleExcerpt(article) {
+    if (article.excerpt !== undefined) return escapeHtml(article.excerpt);
+    return escapeHtml(stripHtml(article.description || ''));
+}
+
+// Nedskalade bilder via servern (/img/<id>) i stället för originalet
+const IMAGE_WIDTHS = [320, 640, 960];
+
+function imageUrl(article, width) {
+    return `/img/${article.article_id}?w=${width}`;
+}
+
+function imageSrcset(article) {
+    return IMAGE_WIDTHS.map(width => `${imageUrl(article, width)} ${width}w`).join(', ');
+}
+
+// Andra källor som skrivit om samma händelse
+function relatedSources(article) {
+    if (!article.related || article.related.length === 0) return '';
+    const links = article.related.map(related =>
+        `<a href="${escapeHtml(related.link)}" target="_blank" rel="noopener" onclick="event.stopPropagation()">${escapeHtml(related.source)}</a>`
+    );
+    return `<div class="related-sources">Även hos ${links.join(', ')}</div>`;
+}
+
+// Gör text säker att lägga in i HTML
+function escapeHtml(text) {
+    const tmp = document.createElement('div');
+    tmp.textContent = text;
+    return tmp.innerHTML;
+}
+
 // Ta bort HTML-taggar från text
 function stripHtml(html) {
     const tmp = document.createElement('div');
@@ -167,7 +327,13 @@ function renderPagination() {
     const pagination = document.getElementById('pagination');
     pagination.innerHTML = '';
 
-    if (totalPages <= 1) return;
+    if (cursorStack.length > 0) {
+        renderCursorPagination(pagination);
+        return;
+    }
+
+    const canGoOlder = !searchQuery && nextCursor;
+    if (totalPages <= 1 && !canGoOlder) return;
 
     const prevBtn = document.createElement('button');
     prevBtn.textContent = '← Föregående';
@@ -189,10 +355,45 @@ function renderPagination() {
 
     const nextBtn = document.createElement('button');
     nextBtn.textContent = 'Nästa →';
-    nextBtn.disabled = currentPage === totalPages;
+    nextBtn.disabled = currentPage >= totalPages && !canGoOlder;
     nextBtn.onclick = () => {
         if (currentPage < totalPages) {
             currentPage++;
+        } else if (canGoOlder) {
+            // Fortsätt bakåt i arkivet efter sista sidan
+            cursorStack.push(nextCursor);
+        } else {
+            return;
+        }
+        loadArticles();
+        window.scrollTo({ top: 0, behavior: 'smooth' });
+    };
+    pagination.appendChild(nextBtn);
+}
+
+// Paginering bakåt i arkivet med cursor
+function renderCursorPagination(pagination) {
+    const prevBtn = document.createElement('button');
+    prevBtn.textContent = '← Nyare';
+    prevBtn.onclick = () => {
+        cursorStack.pop();
+        loadArticles();
+        window.scrollTo({ top: 0, behavior: 'smooth' });
+    };
+    pagination.appendChild(prevBtn);
+
+    const pageInfo = document.createElement('button');
+    pageInfo.textContent = 'Äldre nyheter';
+    pageInfo.className = 'current-page';
+    pageInfo.disabled = true;
+    pagination.appendChild(pageInfo);
+
+    const nextBtn = document.createElement('button');
+    nextBtn.textContent = 'Äldre →';
+    nextBtn.disabled = !nextCursor;
+    nextBtn.onclick = () => {
+        if (nextCursor) {
+            cursorStack.push(nextCursor);
             loadArticles();
             window.scrollTo({ top: 0, behavior: 'smooth' });
         }
@@ -204,6 +405,7 @@ function renderPagination() {
 document.getElementById('categoryFilter').addEventListener('change', (e) => {
     currentCategory = e.target.value;
     currentPage = 1;
+    cursorStack = [];
     searchQuery = '';
     document.getElementById('searchInput').value = '';
     loadArticles();
@@ -212,6 +414,7 @@ document.getElementById('categoryFilter').addEventListener('change', (e) => {
 document.getElementById('sourceFilter').addEventListener('change', (e) => {
     currentSource = e.target.value;
     currentPage = 1;
+    cursorStack = [];
     searchQuery = '';
     document.getElementById('searchInput').value = '';
     loadArticles();
@@ -223,6 +426,7 @@ document.getElementById('searchInput').addEventListener('input', (e) => {
     searchTimeout = setTimeout(() => {
         searchQuery = e.target.value.trim();
         currentPage = 1;
+        cursorStack = [];
         if (searchQuery) {
             currentCategory = 'alla';
             currentSource = '';
@@ -234,9 +438,10 @@ document.getElementById('searchInput').addEventListener('input', (e) => {
 });
 
 // Initiera applikationen
-loadFilters();
-loadStats();
-loadArticles();
+bootstrap();
+
+// Nya artiklar och statistik skickas från servern när de finns
+listenForNewArticles();
 
-// Uppdatera statistik varje minut
-setInterval(loadStats, 60000);
+// Uppdatera "senast uppdaterad"-texten varje minut
+setInterval(renderLastUpdate, 60000);
@@ -0,0 +1,59 @@
+import hashlib
+import os
+import re
+
+# Filer med innehållshash i namnet ändras aldrig och kan cachas i ett år
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASHED_NAME_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{10})(?P<ext>\.[^./]+)$')
+
+
+class StaticAssets:
+    """
+    Innehållshashade namn för filerna i static/, t.ex. app.js -> app.1a2b3c4d5e.js.
+    index.html skrivs om en gång vid start så att den pekar på de hashade namnen.
+    """
+    
+    def __init__(self, folder):
+        self.folder = folder
+        self.hashes = {}
+        self.index_html = None
+        self.reload()
+    
+    def reload(self):
+        """Beräkna hashar och skriv om index.html (vid start)"""
+        hashes = {}
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, self.folder).replace(os.sep, '/')
+                if relative == 'index.html':
+                    continue
+                with open(path, 'rb') as f:
+                    hashes[relative] = hashlib.sha256(f.read()).hexdigest()[:10]
+        self.hashes = hashes
+        
+        with open(os.path.join(self.folder, 'index.html'), encoding='utf-8') as f:
+            index_html = f.read()
+        for relative in hashes:
+            index_html = index_html.replace(f'"/static/{relative}"', f'"/static/{self.hashed_name(relative)}"')
+        self.index_html = index_html
+    
+    def hashed_name(self, filename):
+        """Hashat namn för en fil (oförändrat om filen inte finns)"""
+        file_hash = self.hashes.get(filename)
+        if file_hash is None:
+            return filename
+        stem, ext = os.path.splitext(filename)
+        return f"{stem}.{file_hash}{ext}"
+    
+    def resolve(self, filename):
+        """
+        Översätt ett efterfrågat namn till (riktigt filnamn, oföränderlig).
+        Ett hashat namn vars hash inte stämmer behandlas som ett vanligt namn.
+        """
+        match = HASHED_NAME_RE.match(filename)
+        if match:
+            original = match.group('stem') + match.group('ext')
+            if self.hashes.get(original) == match.group('hash'):
+                return original, True
+        return filename, False
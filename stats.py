@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+
+# Sammanfattningen och dygnsdokumenten ligger i meta-collectionen
+SUMMARY_ID = 'stats'
+DAY_PREFIX = 'stats:day:'
+
+
+def _key(value):
+    """Gör om ett värde till en giltig fältnyckel i MongoDB"""
+    return str(value).replace('$', '＄').replace('.', '．')
+
+
+def _unkey(key):
+    return key.replace('＄', '$').replace('．', '.')
+
+
+def _aware(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def day_id(dt):
+    return DAY_PREFIX + _aware(dt).strftime('%Y-%m-%d')
+
+
+def _stats_updates(articles):
+    """Bygg $inc-uppdateringar för sammanfattningen och varje berört dygn"""
+    summary = {'total': 0}
+    days = {}
+    last_update = None
+    
+    for article in articles:
+        published = _aware(article['published_date'])
+        day = days.setdefault(day_id(published), {'total': 0})
+        
+        for counts in (summary, day):
+            counts['total'] += 1
+            for field, group in (('source', 'sources'), ('category', 'categories')):
+                name = f"{group}.{_key(article.get(field))}"
+                counts[name] = counts.get(name, 0) + 1
+        
+        hour = f"hours.{published.strftime('%H')}"
+        day[hour] = day.get(hour, 0) + 1
+        
+        fetched_at = article.get('fetched_at')
+        if fetched_at and (last_update is None or fetched_at > last_update):
+            last_update = fetched_at
+    
+    updates = [UpdateOne(
+        {'_id': SUMMARY_ID},
+        {'$inc': summary, '$max': {'last_update': last_update}},
+        upsert=True
+    )]
+    for _id, counts in days.items():
+        updates.append(UpdateOne({'_id': _id}, {'$inc': counts}, upsert=True))
+    return updates
+
+
+def record_articles(meta_collection, articles):
+    """Räkna upp statistiken för nyss sparade artiklar (ett skrivanrop)"""
+    if articles:
+        meta_collection.bulk_write(_stats_updates(articles), ordered=False)
+
+
+def rebuild(collection, meta_collection, batch_size=1000):
+    """Bygg om statistiken från alla artiklar (t.ex. efter uppgradering)"""
+    meta_collection.delete_many({'_id': {'$regex': f'^{SUMMARY_ID}'}})
+    batch = []
+    fields = {'source': 1, 'category': 1, 'published_date': 1, 'fetched_at': 1}
+    for article in collection.find({}, fields):
+        batch.append(article)
+        if len(batch) >= batch_size:
+            record_articles(meta_collection, batch)
+            batch = []
+    record_articles(meta_collection, batch)
+
+
+def _sorted_counts(counts):
+    """Samma form som en $group-aggregering: [{'_id': namn, 'count': antal}], störst först"""
+    return [{'_id': _unkey(name), 'count': count}
+            for name, count in sorted((counts or {}).items(), key=lambda item: -item[1])]
+
+
+def stats_day_ids(days, now):
+    """Dygnen som statistiken för de senaste days dygnen behöver, nyaste först"""
+    # Minst två dygn behövs för att täcka de senaste 24 timmarna
+    return [day_id(now - timedelta(days=i)) for i in range(max(days, 2))]
+
+
+def read_stats(meta_collection, days=7, now=None):
+    """
+    Läs sammanfattningen och de senaste dygnens räknare i ett anrop.
+    Returnerar totaler, senaste uppdatering samt antal per dygn och per timme.
+    """
+    now = now or datetime.now(timezone.utc)
+    day_ids = stats_day_ids(days, now)
+    
+    docs = {doc['_id']: doc for doc in meta_collection.find({'_id': {'$in': [SUMMARY_ID] + day_ids}})}
+    return summarize(docs.get(SUMMARY_ID, {}), docs, days, now)
+
+
+def summarize(summary, day_docs, days, now):
+    """
+    Svarets form för statistiken, oavsett lagring.
+    summary: {'total', 'sources', 'categories', 'last_update'};
+    day_docs: {dygns-id: {'total', 'hours': {'HH': antal}}}.
+    """
+    day_ids = stats_day_ids(days, now)
+    last_update = summary.get('last_update')
+    if last_update is not None:
+        last_update = _aware(last_update)
+    
+    per_day = []
+    per_hour = []
+    for _id in reversed(day_ids):
+        doc = day_docs.get(_id, {})
+        date = _id[len(DAY_PREFIX):]
+        per_day.append({'date': date, 'count': doc.get('total', 0)})
+        hours = doc.get('hours', {})
+        per_hour.extend({'hour': f"{date}T{hour:02d}:00Z", 'count': hours.get(f"{hour:02d}", 0)}
+                        for hour in range(24))
+    
+    # Dygn utöver de efterfrågade används bara för timmarna
+    per_day = per_day[-days:] if days else []
+    
+    # Antal per timme de senaste 24 timmarna
+    current_hour = _aware(now).strftime('%Y-%m-%dT%H:00Z')
+    per_hour = [bucket for bucket in per_hour if bucket['hour'] <= current_hour][-24:]
+    
+    return {
+        'total': summary.get('total', 0),
+        'sources': _sorted_counts(summary.get('sources')),
+        'categories': _sorted_counts(summary.get('categories')),
+        'last_update': last_update,
+        'per_day': per_day,
+        'per_hour': per_hour
+    }
+
+
+if __name__ == '__main__':
+    # Bygg om statistiken från befintliga artiklar: python stats.py
+    from pymongo import MongoClient
+    from config import MONGODB_URI, DATABASE_NAME, COLLECTION_NAME, META_COLLECTION_NAME
+    
+    db = MongoClient(MONGODB_URI)[DATABASE_NAME]
+    rebuild(db[COLLECTION_NAME], db[META_COLLECTION_NAME])
+    print("Statistiken är ombyggd")
@@ -0,0 +1,313 @@
+from pymongo.errors import BulkWriteError, PyMongoError
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from article_window import bump_articles_version, ARTICLES_VERSION_ID
+from search import build_search_pipeline, HIDE_SEARCH_FIELDS
+from serialization import mongo_projection
+from pagination import KEYSET_SORT, keyset_query
+from cluster import assign_clusters
+from leader_lock import LeaderLock
+from database import get_client, close_client
+from config import (
+    STORAGE_BACKEND, DATABASE_NAME, COLLECTION_NAME, ARCHIVE_COLLECTION_NAME,
+    META_COLLECTION_NAME, FEED_STATE_COLLECTION_NAME, LOCK_COLLECTION_NAME,
+    RETENTION_DAYS, RETENTION_MAX_ARTICLES
+)
+import os
+import sqlite3
+import threading
+import retention
+import stats
+
+# MongoDB-felkod för dubblett av unikt index
+DUPLICATE_KEY_ERROR = 11000
+
+# Fel från lagringen (inte från flödet) - ska inte räknas mot ett flöde
+STORAGE_ERRORS = (PyMongoError, sqlite3.Error)
+
+
+class Storage(ABC):
+    """
+    Gränssnittet som inläsningen (rss_fetcher.py) och webbservern (server.py)
+    använder för artiklar, statistik, sökning och flödenas tillstånd.
+    Artiklar är dictar med samma fält som RSSFetcher.build_article bygger, plus
+    _id (lagringens id, används för keyset-paginering).
+    En lagring som saknar någon av metoderna kan inte skapas.
+    """
+    
+    @abstractmethod
+    def ensure_indexes(self):
+        """Skapa index/tabeller (görs av den process som hämtar nyheter)"""
+    
+    @abstractmethod
+    def ping(self):
+        """Kontrollera att lagringen svarar (kastar fel annars)"""
+    
+    @abstractmethod
+    def close(self):
+        """Stäng anslutningarna"""
+    
+    @abstractmethod
+    def version(self):
+        """Versionsräknaren som ökar varje gång nya artiklar sparats"""
+    
+    @abstractmethod
+    def insert_articles(self, articles):
+        """
+        Spara nya artiklar (unika article_id). Redan kända artiklar hoppas över,
+        nya utan cluster_id klustras, statistiken räknas upp och versionen ökas.
+        Returnerar ({'new', 'duplicates', 'errors'}, sparade artiklar).
+        """
+    
+    @abstractmethod
+    def latest(self, limit, category=None, source=None, cursor=None, fields=None, archive=False):
+        """
+        De senaste artiklarna (nyaste först, i KEYSET_SORT-ordning), eventuellt filtrerade.
+        cursor: fortsätt efter den artikel cursorn pekar på (kastar InvalidCursor).
+        fields: bara dessa publika fält (None = alla utom sök- och signaturfälten).
+        archive: fortsätt i arkivet när artiklarna tar slut.
+        """
+    
+    @abstractmethod
+    def distinct(self, field):
+        """Alla värden på 'source' eller 'category'"""
+    
+    @abstractmethod
+    def find_article(self, article_id, fields=None):
+        """En artikel (även arkiverad), eller None"""
+    
+    @abstractmethod
+    def stats(self, days=7):
+        """Förberäknad statistik, samma form som stats.read_stats"""
+    
+    @abstractmethod
+    def search(self, query_text, skip, limit, fields=None):
+        """
+        Sök bland alla artiklar, rangordnade efter relevans.
+        Returnerar (totalt antal träffar, artiklar), eller None om frågan saknar sökbara ord.
+        """
+    
+    @abstractmethod
+    def load_feed_state(self, url):
+        """Sparat tillstånd (ETag, Last-Modified, hash, lästa id:n) för ett flöde"""
+    
+    @abstractmethod
+    def save_feed_state(self, url, fields):
+        """Uppdatera fälten i flödets sparade tillstånd"""
+    
+    @abstractmethod
+    def leader_lock(self, name):
+        """Lås med lånetid så att bara en scheduler åt gången hämtar (se leader_lock.py)"""
+    
+    @abstractmethod
+    def compact(self, days=RETENTION_DAYS, max_articles=RETENTION_MAX_ARTICLES):
+        """
+        Flytta artiklar äldre än days dagar och/eller utöver de max_articles senaste
+        till arkivet (se retention.retention_query). Returnerar antal.
+        """
+
+
+class MongoStorage(Storage):
+    """Artiklar i MongoDB (articles, articles_archive, meta, feed_state, locks)"""
+    
+    def __init__(self, client=None):
+        # Som standard används processens delade klient (se database.py)
+        self._shared_client = client is None
+        self.client = client if client is not None else get_client()
+        self.db = self.client[DATABASE_NAME]
+        self.collection = self.db[COLLECTION_NAME]
+        # Äldre artiklar som flyttats ut ur collection (se retention.py)
+        self.archive = self.db[ARCHIVE_COLLECTION_NAME]
+        self.meta = self.db[META_COLLECTION_NAME]
+        # Senaste ETag/Last-Modified/hash per flöde, nyckel = flödets URL
+        self.feed_state = self.db[FEED_STATE_COLLECTION_NAME]
+    
+    def ensure_indexes(self):
+        self.collection.create_index('article_id', unique=True)
+        self.collection.create_index('published_date')
+        self.collection.create_index('source')
+        self.collection.create_index('category')
+        # Senaste artiklarna totalt/per kategori/källa, med _id för keyset-paginering
+        self.collection.create_index([('published_date', -1), ('_id', -1)])
+        self.collection.create_index([('category', 1), ('published_date', -1), ('_id', -1)])
+        self.collection.create_index([('source', 1), ('published_date', -1), ('_id', -1)])
+        # Sökindex (ordstammar från rubrik och beskrivning)
+        self.collection.create_index('search_terms')
+        # Kandidater för klustring: delade LSH-band bland de senaste artiklarna
+        self.collection.create_index([('lsh_bands', 1), ('published_date', -1)])
+        retention.ensure_archive_indexes(self.archive)
+    
+    def ping(self):
+        self.client.admin.command('ping')
+    
+    def close(self):
+        if self._shared_client:
+            close_client()
+        else:
+            self.client.close()
+    
+    def version(self):
+        doc = self.meta.find_one({'_id': ARTICLES_VERSION_ID}, {'version': 1})
+        return doc.get('version', 0) if doc else 0
+    
+    def _known_ids(self, article_ids):
+        """article_id:n som redan finns, i articles eller i arkivet"""
+        known = {
+            doc['article_id'] for doc in self.collection.find(
+                {'article_id': {'$in': article_ids}},
+                {'_id': 0, 'article_id': 1}
+            )
+        }
+        # Artiklar som fortfarande finns i flödet kan redan ha arkiverats
+        remaining = [article_id for article_id in article_ids if article_id not in known]
+        if remaining:
+            known |= {
+                doc['article_id'] for doc in self.archive.find(
+                    {'article_id': {'$in': remaining}},
+                    {'_id': 0, 'article_id': 1}
+                )
+            }
+        return known
+    
+    def insert_articles(self, articles):
+        result = {'new': 0, 'duplicates': 0, 'errors': 0}
+        if not articles:
+            return result, []
+        
+        known = self._known_ids([article['article_id'] for article in articles])
+        result['duplicates'] = len(known)
+        new_articles = [article for article in articles if article['article_id'] not in known]
+        if not new_articles:
+            return result, []
+        
+        # Nya artiklar om samma händelse som en nyligen sparad får dess cluster_id
+        unclustered = [article for article in new_articles if not article.get('cluster_id')]
+        if unclustered:
+            assign_clusters(self.collection, unclustered)
+        
+        inserted = new_articles
+        try:
+            self.collection.insert_many(new_articles, ordered=False)
+        except BulkWriteError as e:
+            # En annan process kan ha hunnit spara samma artikel efter uppslagningen
+            failed = set()
+            for error in e.details.get('writeErrors', []):
+                failed.add(error['index'])
+                if error.get('code') == DUPLICATE_KEY_ERROR:
+                    result['duplicates'] += 1
+                else:
+                    result['errors'] += 1
+            inserted = [a for i, a in enumerate(new_articles) if i not in failed]
+        result['new'] = len(inserted)
+        
+        if inserted:
+            # Räkna upp statistiken och låt läsarna (t.ex. fönstret i server.py)
+            # veta att det finns nya artiklar
+            stats.record_articles(self.meta, inserted)
+            bump_articles_version(self.meta, datetime.now(timezone.utc))
+        return result, inserted
+    
+    def latest(self, limit, category=None, source=None, cursor=None, fields=None, archive=False):
+        query = {}
+        if category:
+            query['category'] = category
+        if source:
+            query['source'] = source
+        query = keyset_query(query, cursor)
+        
+        # Sorteringsnycklarna behövs alltid för nästa cursor
+        projection = mongo_projection(
+            fields and tuple(set(fields) | {'published_date', '_id'}),
+            default=HIDE_SEARCH_FIELDS
+        )
+        articles = list(self.collection.find(query, projection).sort(KEYSET_SORT).limit(limit))
+        
+        # Arkivet innehåller äldre artiklar, så listan fortsätter där
+        if archive and len(articles) < limit:
+            articles += list(self.archive.find(query, projection)
+                             .sort(KEYSET_SORT)
+                             .limit(limit - len(articles)))
+        return articles
+    
+    def distinct(self, field):
+        return self.collection.distinct(field)
+    
+    def find_article(self, article_id, fields=None):
+        projection = mongo_projection(fields, default=HIDE_SEARCH_FIELDS)
+        for source in (self.collection, self.archive):
+            article = source.find_one({'article_id': article_id}, projection)
+            if article is not None:
+                return article
+        return None
+    
+    def stats(self, days=7):
+        return stats.read_stats(self.meta, days=days)
+    
+    def search(self, query_text, skip, limit, fields=None):
+        pipeline = build_search_pipeline(query_text, skip, limit,
+                                         projection=mongo_projection(fields),
+                                         union_with=ARCHIVE_COLLECTION_NAME)
+        if pipeline is None:
+            return None
+        
+        # Ordstammar och prefix matchas mot search_terms-indexet (inget $regex på fritext)
+        result = next(self.collection.aggregate(pipeline), {})
+        total = result['total'][0]['count'] if result.get('total') else 0
+        return total, result.get('articles', [])
+    
+    def load_feed_state(self, url):
+        return self.feed_state.find_one({'_id': url}) or {}
+    
+    def save_feed_state(self, url, fields):
+        self.feed_state.update_one({'_id': url}, {'$set': fields}, upsert=True)
+    
+    def leader_lock(self, name):
+        return LeaderLock(self.db[LOCK_COLLECTION_NAME], name)
+    
+    def compact(self, days=RETENTION_DAYS, max_articles=RETENTION_MAX_ARTICLES):
+        return retention.compact(self.collection, self.archive, self.meta,
+                                 days=days, max_articles=max_articles)
+
+
+_storage = None
+_storage_pid = None
+_lock = threading.Lock()
+
+
+def create_storage(backend=STORAGE_BACKEND):
+    """Skapa lagringen som valts i config.py (STORAGE_BACKEND)"""
+    if backend == 'sqlite':
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage()
+    if backend == 'mongodb':
+        return MongoStorage()
+    raise ValueError(f"Okänd STORAGE_BACKEND: {backend}")
+
+
+def get_storage():
+    """
+    Processens delade lagring.
+    Skapas vid första användningen och på nytt efter fork (som get_client).
+    """
+    global _storage, _storage_pid
+    
+    pid = os.getpid()
+    if _storage is not None and _storage_pid == pid:
+        return _storage
+    
+    with _lock:
+        if _storage is None or _storage_pid != pid:
+            _storage = create_storage()
+            _storage_pid = pid
+    return _storage
+
+
+def close_storage():
+    """Stäng processens lagring (vid avslut)"""
+    global _storage, _storage_pid
+    
+    with _lock:
+        if _storage is not None and _storage_pid == os.getpid():
+            _storage.close()
+        _storage = None
+        _storage_pid = None
@@ -0,0 +1,59 @@
+import os
+import sys
+import mongomock
+import pytest
+from pymongo import MongoClient
+
+# Modulerna ligger i projektets rot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+from storage import MongoStorage  # noqa: E402
+from sqlite_storage import SQLiteStorage  # noqa: E402
+
+# Sätt TEST_MONGODB_URI för att köra mot en riktig MongoDB i stället för mongomock
+# (databasen TEST_DATABASE_NAME töms efter varje test)
+TEST_MONGODB_URI = os.environ.get('TEST_MONGODB_URI')
+TEST_DATABASE_NAME = 'svenska_nyheter_test'
+
+
+def aggregate_with_union(collection):
+    """
+    collection.aggregate med $unionWith, som mongomock saknar: stegen före körs på
+    collection, underaggregeringen på den andra collectionen, och resten av stegen
+    på de sammanslagna dokumenten (samma ordning som MongoDB ger dem).
+    """
+    aggregate = collection.aggregate
+    
+    def run(pipeline, *args, **kwargs):
+        for i, stage in enumerate(pipeline):
+            if '$unionWith' in stage:
+                union = stage['$unionWith']
+                documents = (list(aggregate(pipeline[:i]))
+                             + list(collection.database[union['coll']].aggregate(union['pipeline'])))
+                merged = mongomock.MongoClient()['union']['documents']
+                if documents:
+                    merged.insert_many(documents)
+                return merged.aggregate(pipeline[i + 1:])
+        return aggregate(pipeline, *args, **kwargs)
+    
+    return run
+
+
+@pytest.fixture(params=['mongodb', 'sqlite'])
+def store(request, tmp_path, monkeypatch):
+    if request.param == 'sqlite':
+        backend = SQLiteStorage(str(tmp_path / 'news.db'))
+    elif TEST_MONGODB_URI:
+        monkeypatch.setattr(storage, 'DATABASE_NAME', TEST_DATABASE_NAME)
+        backend = MongoStorage(MongoClient(TEST_MONGODB_URI))
+        backend.client.drop_database(TEST_DATABASE_NAME)
+    else:
+        backend = MongoStorage(mongomock.MongoClient())
+        # Sökningen läser även arkivet med $unionWith
+        monkeypatch.setattr(backend.collection, 'aggregate', aggregate_with_union(backend.collection))
+    backend.ensure_indexes()
+    yield backend
+    if isinstance(backend, MongoStorage) and TEST_MONGODB_URI:
+        backend.client.drop_database(TEST_DATABASE_NAME)
+    backend.close()
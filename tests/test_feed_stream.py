@@ -0,0 +1,123 @@
+"""feed_stream.iter_entries ska ge samma poster som feedparser"""
+import feedparser
+import pytest
+from feed_stream import iter_entries
+
+RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"
+     xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel><title>Flöde</title><link>https://example.se/</link>
+<item>
+  <title>Regeringen presenterar budgeten</title>
+  <link>https://example.se/a/1</link>
+  <guid isPermaLink="false">id-1</guid>
+  <description>&lt;p&gt;Text om &lt;b&gt;budgeten&lt;/b&gt;&lt;script&gt;x()&lt;/script&gt;&lt;/p&gt;</description>
+  <pubDate>Sat, 10 Oct 2026 08:30:00 +0200</pubDate>
+  <media:content url="https://img.example.se/1.jpg" medium="image"/>
+</item>
+<item>
+  <title>Ny mediagrupp</title>
+  <guid>https://example.se/a/2</guid>
+  <content:encoded>&lt;p&gt;Innehåll&lt;/p&gt;</content:encoded>
+  <dc:date>2026-10-09T12:00:00Z</dc:date>
+  <media:group>
+    <media:content url="https://img.example.se/2.jpg" medium="image">
+      <media:thumbnail url="https://img.example.se/2-small.jpg"/>
+    </media:content>
+  </media:group>
+</item>
+<item>
+  <title>Med bilaga</title>
+  <link>https://example.se/a/3</link>
+  <enclosure url="https://img.example.se/3.jpg" type="image/jpeg" length="100"/>
+</item>
+</channel></rss>""".encode()
+
+ATOM = """<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>Atom-flöde</title><id>urn:feed</id><updated>2026-10-10T10:00:00Z</updated>
+<entry>
+  <title>Real title</title>
+  <link rel="alternate" href="https://example.se/b/1"/>
+  <id>urn:entry:1</id>
+  <updated>2026-10-10T10:00:00Z</updated>
+  <summary>Sammanfattning</summary>
+  <source>
+    <title>Origin feed</title>
+    <link rel="alternate" href="https://origin.example.com/"/>
+    <id>urn:origin</id>
+    <updated>2020-01-01T00:00:00Z</updated>
+  </source>
+</entry>
+<entry>
+  <title>Andra posten</title>
+  <link href="https://example.se/b/2"/>
+  <id>urn:entry:2</id>
+  <published>2026-10-09T09:00:00+02:00</published>
+  <updated>2026-10-09T11:00:00+02:00</updated>
+  <content type="html">&lt;p&gt;Innehåll&lt;/p&gt;</content>
+</entry>
+</feed>""".encode()
+
+RSS1 = """<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/"
+         xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel rdf:about="https://example.se/"><title>RDF</title><link>https://example.se/</link></channel>
+<item rdf:about="https://example.se/c/1">
+  <title>RDF-post</title><link>https://example.se/c/1</link>
+  <description>Beskrivning</description><dc:date>2026-10-08T07:00:00Z</dc:date>
+</item>
+</rdf:RDF>""".encode()
+
+# Fälten som RSSFetcher.build_article läser
+FIELDS = ('title', 'link', 'summary')
+
+
+def _field(entry, name):
+    # Som rss_fetcher läser posten (FeedParserDict mappar t.ex. updated_parsed -> published_parsed)
+    try:
+        return entry[name]
+    except KeyError:
+        return None
+
+
+def _date(entry):
+    # Som RSSFetcher.parse_date: published, annars updated
+    return _field(entry, 'published_parsed') or _field(entry, 'updated_parsed')
+
+
+def _image_urls(entry, key):
+    return [item.get('url') for item in entry.get(key, [])]
+
+
+@pytest.mark.parametrize('content', [RSS, ATOM, RSS1], ids=['rss', 'atom', 'rss1'])
+def test_same_entries_as_feedparser(content):
+    expected = feedparser.parse(content).entries
+    entries = list(iter_entries(content))
+    
+    assert len(entries) == len(expected)
+    for entry, reference in zip(entries, expected):
+        for field in FIELDS:
+            assert _field(entry, field) == _field(reference, field), field
+        assert _date(entry) == _date(reference)
+        for key in ('media_content', 'media_thumbnail'):
+            assert _image_urls(entry, key) == _image_urls(reference, key), key
+        enclosures = [link['href'] for link in entry.get('links', []) if link.get('rel') == 'enclosure']
+        assert enclosures == [link['href'] for link in reference.get('enclosures', [])]
+
+
+def test_atom_source_does_not_override_entry():
+    # <source> (RFC 4287 4.2.11) beskriver ursprungsflödet och har egna title/link/id/updated
+    entry = next(iter_entries(ATOM))
+    reference = feedparser.parse(ATOM).entries[0]
+    
+    for field in ('title', 'link', 'id', 'updated_parsed'):
+        assert entry[field] == reference[field], field
+    assert entry['title'] == 'Real title'
+    assert entry['link'] == 'https://example.se/b/1'
+    assert entry['id'] == 'urn:entry:1'
+    assert entry['updated_parsed'][:3] == (2026, 10, 10)
+
+
+def test_small_chunks():
+    assert [e['title'] for e in iter_entries(ATOM, chunk_size=7)] == ['Real title', 'Andra posten']
@@ -0,0 +1,59 @@
+"""Mätvärden som delas mellan gunicorn-workers (metrics.Registry.share)"""
+import metrics
+
+
+def make_registry():
+    registry = metrics.Registry()
+    counter = registry.counter('test_requests_total', 'Anrop', ('route',))
+    histogram = registry.histogram('test_request_seconds', 'Svarstid', ('route',), (0.1, 1))
+    return registry, counter, histogram
+
+
+def test_shared_values_are_summed_over_workers(tmp_path):
+    metrics.reset_shared(str(tmp_path))
+    # Två workers med var sin registry och fil i samma katalog
+    first, first_counter, first_histogram = make_registry()
+    second, second_counter, second_histogram = make_registry()
+    first.share(str(tmp_path), interval=3600)
+    second.share(str(tmp_path), interval=3600)
+
+    first_counter.inc(route='/api/articles')
+    first_histogram.observe(0.05, route='/api/articles')
+    second_counter.inc(2, route='/api/articles')
+    second_counter.inc(route='/api/stats')
+    second_histogram.observe(0.5, route='/api/articles')
+    second.flush()
+
+    # Samma svar oavsett vilken worker som svarar
+    rendered = first.render()
+    assert rendered == second.render()
+    assert 'test_requests_total{route="/api/articles"} 3' in rendered
+    assert 'test_requests_total{route="/api/stats"} 1' in rendered
+    assert 'test_request_seconds_bucket{route="/api/articles",le="0.1"} 1' in rendered
+    assert 'test_request_seconds_bucket{route="/api/articles",le="1"} 2' in rendered
+    assert 'test_request_seconds_count{route="/api/articles"} 2' in rendered
+    assert 'test_request_seconds_sum{route="/api/articles"} 0.55' in rendered
+
+
+def test_values_from_exited_workers_are_kept(tmp_path):
+    exited, exited_counter, _ = make_registry()
+    running, running_counter, _ = make_registry()
+    exited.share(str(tmp_path), interval=3600)
+    exited_counter.inc(5, route='/')
+    exited.flush()
+    del exited
+
+    running.share(str(tmp_path), interval=3600)
+    running_counter.inc(route='/')
+    assert 'test_requests_total{route="/"} 6' in running.render()
+
+    # En ny start av gunicorn börjar om från noll
+    metrics.reset_shared(str(tmp_path))
+    assert 'test_requests_total{route="/"} 1' in running.render()
+
+
+def test_unshared_registry_renders_own_values(tmp_path):
+    registry, counter, _ = make_registry()
+    counter.inc(route='/')
+    assert 'test_requests_total{route="/"} 1' in registry.render()
+    assert not list(tmp_path.iterdir())
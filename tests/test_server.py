@@ -0,0 +1,107 @@
+"""API-svar från server.py mot båda lagringarna"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import os
+import pytest
+
+os.environ.setdefault('TESTING', '1')
+
+import server  # noqa: E402
+from article_window import LatestWindow  # noqa: E402
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    def setup(articles, window_size):
+        store.insert_articles(articles)
+        monkeypatch.setattr(server, 'storage', store)
+        monkeypatch.setattr(server, 'latest_window', LatestWindow(store, size=window_size))
+        server.response_cache.clear()
+        return server.app.test_client()
+    yield setup
+    server.response_cache.clear()
+
+
+def make_article(article_id, minutes_ago, cluster_id=None):
+    return {
+        'article_id': article_id,
+        'title': f'Rubrik {article_id}',
+        'link': f'https://example.se/{article_id}',
+        'description': '',
+        'excerpt': '',
+        'published_date': NOW - timedelta(minutes=minutes_ago),
+        'source': 'SVT',
+        'category': 'Inrikes',
+        'image_url': None,
+        'fetched_at': NOW,
+        'cluster_id': cluster_id or article_id
+    }
+
+
+def shown(articles):
+    """article_id för korten och syskonen under 'related'"""
+    return [article_id for article in articles
+            for article_id in [article['article_id']] + [r['article_id'] for r in article.get('related', [])]]
+
+
+def follow_cursor(client, cursor, per_page):
+    seen = []
+    while cursor is not None:
+        response = client.get(f'/api/articles?collapse=1&per_page={per_page}&cursor={cursor}')
+        assert response.status_code == 200
+        data = response.get_json()
+        seen += shown(data['articles'])
+        cursor = data['next_cursor']
+    return seen
+
+
+def window_then_cursor(client, per_page):
+    """Som klienten: sidorna i fönstret, sedan vidare med next_cursor från sista sidan"""
+    seen = []
+    page = 1
+    while True:
+        data = client.get(f'/api/articles?collapse=1&per_page={per_page}&page={page}').get_json()
+        seen += shown(data['articles'])
+        if page >= data['total_pages']:
+            return seen + follow_cursor(client, data['next_cursor'], per_page)
+        page += 1
+
+
+def test_collapsed_cursor_pages_show_each_article_once(client):
+    # A och C hör till samma kluster; fönstret rymmer två artiklar
+    articles = [make_article('A', 1, 'k'), make_article('B', 2), make_article('C', 3, 'k'), make_article('D', 4)]
+    api = client(articles, window_size=2)
+    for seen in (follow_cursor(api, '', 1), window_then_cursor(api, 1)):
+        assert sorted(seen) == ['A', 'B', 'C', 'D']
+
+
+@pytest.mark.parametrize('window_size,per_page', [(4, 1), (4, 2), (10, 3), (40, 5)])
+def test_collapsed_paging_covers_archive(client, window_size, per_page):
+    # Var tredje artikel hör till klustret två steg tidigare, så syskonen hamnar på olika sidor
+    articles = [make_article(f'a{i:02d}', i, f'k{i - 2}' if i % 3 == 2 else f'k{i}') for i in range(30)]
+    api = client(articles, window_size=window_size)
+    expected = sorted(article['article_id'] for article in articles)
+    for seen in (follow_cursor(api, '', per_page), window_then_cursor(api, per_page)):
+        assert not [article_id for article_id, count in Counter(seen).items() if count > 1]
+        assert sorted(seen) == expected
+
+
+@pytest.mark.parametrize('collapse', ['0', '1'])
+def test_per_page_is_clamped(client, collapse):
+    api = client([make_article(f'a{i:03d}', i) for i in range(150)], window_size=20)
+    for per_page, expected in (('0', 1), ('-5', 1), ('10000', 100)):
+        data = api.get(f'/api/articles?cursor=&collapse={collapse}&per_page={per_page}').get_json()
+        assert data['per_page'] == expected
+        assert len(data['articles']) == expected
+        assert data['next_cursor']
+        # Sidnumrerade sidor kommer ur fönstret (20 artiklar)
+        data = api.get(f'/api/articles?collapse={collapse}&per_page={per_page}').get_json()
+        assert data['per_page'] == expected
+        assert len(data['articles']) == min(expected, 20)
+
+    assert api.get('/api/articles?per_page=tjugo').status_code == 400
+    assert api.get('/api/articles?cursor=&per_page=tjugo').status_code == 400
+    assert api.get('/api/bootstrap?per_page=tjugo').status_code == 400
+    assert api.get('/api/search?q=rubrik&per_page=tjugo').status_code == 400
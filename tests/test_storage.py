@@ -0,0 +1,250 @@
+"""Båda lagringarna (MongoDB och SQLite) ska bete sig likadant mot Storage-gränssnittet"""
+from datetime import datetime, timedelta, timezone
+import pytest
+from search import search_fields
+from cluster import signature_fields
+from pagination import InvalidCursor, encode_cursor
+from storage import Storage
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def make_article(article_id, title, description='', minutes_ago=0, source='SVT', category='Inrikes'):
+    """En artikel med samma fält som RSSFetcher.build_article"""
+    return {
+        'article_id': article_id,
+        'title': title,
+        'link': f'https://example.se/{article_id}',
+        'description': description,
+        'excerpt': description,
+        'published_date': NOW - timedelta(minutes=minutes_ago),
+        'source': source,
+        'category': category,
+        'image_url': None,
+        'fetched_at': NOW,
+        **search_fields(title, description),
+        **signature_fields(title, description)
+    }
+
+
+def corpus():
+    """Sex artiklar med olika ämnen, nyaste först (a0 är nyast)"""
+    return [
+        make_article('a0', 'Regeringen presenterar budgeten', 'Satsningar på skolan', 10),
+        make_article('a1', 'Storm drar in över Norrland', 'Regeringen följer läget', 20, source='SR'),
+        make_article('a2', 'Ny tränare för landslaget', 'Förbundet meddelade beslutet', 30, category='Sport'),
+        make_article('a3', 'Räntan lämnas oförändrad', 'Riksbanken väntar med sänkning', 40,
+                     source='SR', category='Ekonomi'),
+        make_article('a4', 'Tåg stoppade efter elfel', 'Pendlare fick vänta i timmar', 50),
+        make_article('a5', 'Rekordpublik på derbyt', 'Arenan var fullsatt', 60, category='Sport'),
+    ]
+
+
+def ids(articles):
+    return [article['article_id'] for article in articles]
+
+
+def test_insert_counts_duplicates(store):
+    counts, inserted = store.insert_articles(corpus())
+    assert counts == {'new': 6, 'duplicates': 0, 'errors': 0}
+    assert sorted(ids(inserted)) == ['a0', 'a1', 'a2', 'a3', 'a4', 'a5']
+    assert all('_id' in article for article in inserted)
+
+    # Kända artiklar hoppas över, bara den nya sparas
+    counts, inserted = store.insert_articles(corpus()[:2] + [make_article('a6', 'Val i kommunen')])
+    assert counts == {'new': 1, 'duplicates': 2, 'errors': 0}
+    assert ids(inserted) == ['a6']
+
+    assert store.insert_articles([]) == ({'new': 0, 'duplicates': 0, 'errors': 0}, [])
+
+
+def test_version_increases_on_new_articles(store):
+    assert store.version() == 0
+    store.insert_articles(corpus())
+    assert store.version() == 1
+    store.insert_articles(corpus())
+    assert store.version() == 1
+
+
+def test_latest_with_filters(store):
+    store.insert_articles(corpus())
+    assert ids(store.latest(3)) == ['a0', 'a1', 'a2']
+    assert ids(store.latest(10, category='Sport')) == ['a2', 'a5']
+    assert ids(store.latest(10, source='SR')) == ['a1', 'a3']
+    assert ids(store.latest(10, category='Ekonomi', source='SVT')) == []
+
+    article = store.latest(1, fields=('title',))[0]
+    assert set(article) == {'_id', 'published_date', 'title'}
+    # Sök- och signaturfälten lämnas aldrig ut
+    assert 'search_terms' not in store.latest(1)[0]
+    assert 'minhash' not in store.latest(1)[0]
+
+
+def test_cursor_paging(store):
+    store.insert_articles(corpus())
+    seen = []
+    page = store.latest(2)
+    while page:
+        seen += ids(page)
+        page = store.latest(2, cursor=encode_cursor(page[-1]))
+    assert seen == ['a0', 'a1', 'a2', 'a3', 'a4', 'a5']
+
+    sport = store.latest(1, category='Sport')
+    assert ids(store.latest(10, category='Sport', cursor=encode_cursor(sport[0]))) == ['a5']
+
+    with pytest.raises(InvalidCursor):
+        store.latest(2, cursor='inte-en-cursor')
+
+
+def test_cursor_paging_same_published_date(store):
+    # Samma publiceringstid: _id avgör ordningen och ingen artikel hoppas över
+    store.insert_articles([make_article(f'b{i}', f'Händelse nummer {i}', minutes_ago=5) for i in range(5)])
+    seen = []
+    page = store.latest(2)
+    while page:
+        seen += ids(page)
+        page = store.latest(2, cursor=encode_cursor(page[-1]))
+    assert sorted(seen) == ['b0', 'b1', 'b2', 'b3', 'b4']
+    assert len(seen) == 5
+
+
+def test_distinct_and_find_article(store):
+    store.insert_articles(corpus())
+    assert sorted(store.distinct('source')) == ['SR', 'SVT']
+    assert sorted(store.distinct('category')) == ['Ekonomi', 'Inrikes', 'Sport']
+
+    article = store.find_article('a3')
+    assert article['title'] == 'Räntan lämnas oförändrad'
+    assert article['category'] == 'Ekonomi'
+    assert store.find_article('saknas') is None
+
+
+def test_stats(store):
+    store.insert_articles(corpus())
+    store.insert_articles(corpus())
+    result = store.stats(days=2)
+    assert result['total'] == 6
+    assert result['sources'] == [{'_id': 'SVT', 'count': 4}, {'_id': 'SR', 'count': 2}]
+    assert {c['_id']: c['count'] for c in result['categories']} == {'Inrikes': 3, 'Sport': 2, 'Ekonomi': 1}
+    assert result['last_update'].replace(tzinfo=timezone.utc) == NOW
+    assert len(result['per_day']) == 2
+    assert sum(day['count'] for day in result['per_day']) == 6
+    assert len(result['per_hour']) == 24
+    assert sum(hour['count'] for hour in result['per_hour']) == 6
+
+
+def test_search_ranks_title_hits_first(store):
+    store.insert_articles(corpus())
+    # c0 är nyast men nämner regeringen bara i beskrivningen, som a1
+    store.insert_articles([make_article('c0', 'Oväder i söder', 'Regeringen kallar till möte', 1)])
+    total, articles = store.search('regeringen', 0, 10)
+    assert total == 3
+    assert ids(articles)[0] == 'a0'
+    assert sorted(ids(articles)[1:]) == ['a1', 'c0']
+
+    total, articles = store.search('regeringen', 1, 10)
+    assert total == 3
+    assert len(articles) == 2
+
+
+def test_search_prefix(store):
+    store.insert_articles(corpus())
+    # Sista ordet matchas som prefix medan man skriver
+    total, articles = store.search('riksba', 0, 10)
+    assert ids(articles) == ['a3']
+    total, articles = store.search('tränar', 0, 10)
+    assert ids(articles) == ['a2']
+    # Korta ord matchas bara exakt
+    assert store.search('tr', 0, 10) == (0, [])
+    # Med avslutande mellanslag är ordet inte ett prefix
+    assert store.search('riksba ', 0, 10) == (0, [])
+
+
+def test_search_without_terms(store):
+    store.insert_articles(corpus())
+    assert store.search('', 0, 10) is None
+    assert store.search('!? -', 0, 10) is None
+
+
+def test_feed_state(store):
+    url = 'https://example.se/rss'
+    assert store.load_feed_state(url) == {}
+
+    store.save_feed_state(url, {'etag': '"abc"', 'checked_at': NOW})
+    store.save_feed_state(url, {'last_modified': 'Sat, 10 Oct 2026 08:30:00 GMT', 'seen_ids': ['x', 'y']})
+    state = store.load_feed_state(url)
+    assert state['etag'] == '"abc"'
+    assert state['last_modified'] == 'Sat, 10 Oct 2026 08:30:00 GMT'
+    assert state['seen_ids'] == ['x', 'y']
+    assert state['checked_at'].replace(tzinfo=timezone.utc) == NOW
+    assert store.load_feed_state('https://example.se/annat') == {}
+
+
+def test_leader_lock(store):
+    first = store.leader_lock('scheduler')
+    second = store.leader_lock('scheduler')
+    assert first.holder() is None
+
+    assert first.acquire()
+    assert not second.acquire()
+    # Ledaren kan förnya sitt lån
+    assert first.acquire()
+    assert first.holder() == first.owner
+
+    first.release()
+    assert first.holder() is None
+    assert second.acquire()
+    assert second.holder() == second.owner
+    # Ett annat namn är ett annat lås
+    assert store.leader_lock('annat').acquire()
+
+
+def test_incomplete_backend_cannot_be_created():
+    class Incomplete(Storage):
+        def ping(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_compact_moves_old_articles_to_archive(store):
+    store.insert_articles(corpus())
+    version = store.version()
+    assert store.compact(days=0, max_articles=0) == 0
+
+    # De tre äldsta ryms inte bland de tre senaste
+    assert store.compact(days=0, max_articles=3) == 3
+    assert store.version() > version
+    assert ids(store.latest(10)) == ['a0', 'a1', 'a2']
+    assert store.compact(days=0, max_articles=3) == 0
+
+    # Listan och cursorn fortsätter i arkivet
+    assert ids(store.latest(10, archive=True)) == ['a0', 'a1', 'a2', 'a3', 'a4', 'a5']
+    seen = []
+    page = store.latest(2, archive=True)
+    while page:
+        seen += ids(page)
+        page = store.latest(2, cursor=encode_cursor(page[-1]), archive=True)
+    assert seen == ['a0', 'a1', 'a2', 'a3', 'a4', 'a5']
+    assert ids(store.latest(10, category='Sport', archive=True)) == ['a2', 'a5']
+
+    # Arkiverade artiklar hittas och sparas inte igen
+    assert store.find_article('a4')['title'] == 'Tåg stoppade efter elfel'
+    counts, _ = store.insert_articles(corpus())
+    assert counts == {'new': 0, 'duplicates': 6, 'errors': 0}
+
+
+def test_compact_by_age(store):
+    store.insert_articles(corpus() + [make_article('old', 'Gammal nyhet', minutes_ago=3 * 24 * 60)])
+    assert store.compact(days=2, max_articles=0) == 1
+    assert 'old' not in ids(store.latest(10))
+    assert store.find_article('old') is not None
+
+
+def test_search_includes_archive(store):
+    store.insert_articles(corpus())
+    store.compact(days=0, max_articles=1)
+    total, articles = store.search('regeringen', 0, 10)
+    assert total == 2
+    assert sorted(ids(articles)) == ['a0', 'a1']
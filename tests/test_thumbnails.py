@@ -0,0 +1,51 @@
+"""Hämtning av originalbilder i thumbnails.py"""
+import pytest
+
+from thumbnails import DiskCache, ImageError, Thumbnailer
+
+
+class FakeResponse:
+    def __init__(self, content_type, data=b'data'):
+        self.headers = {'Content-Type': content_type}
+        self.data = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.data
+
+
+class FakeSession:
+    def __init__(self, content_type):
+        self.headers = {}
+        self.content_type = content_type
+
+    def get(self, url, **kwargs):
+        return FakeResponse(self.content_type)
+
+
+def make_thumbnailer(tmp_path, content_type):
+    return Thumbnailer(DiskCache(str(tmp_path), max_bytes=1 << 20), FakeSession(content_type))
+
+
+@pytest.mark.parametrize('content_type', ['image/svg+xml', 'image/svg+xml; charset=utf-8', 'text/html', ''])
+def test_non_raster_images_are_refused(tmp_path, content_type):
+    thumbnailer = make_thumbnailer(tmp_path, content_type)
+    with pytest.raises(ImageError):
+        thumbnailer._original('a' * 32, 'https://example.se/bild')
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize('content_type,ext', [('image/png', 'png'), ('image/jpg', 'jpg'), ('IMAGE/WEBP', 'webp')])
+def test_raster_images_are_cached_with_their_type(tmp_path, content_type, ext):
+    thumbnailer = make_thumbnailer(tmp_path, content_type)
+    path, mimetype = thumbnailer._original('a' * 32, 'https://example.se/bild')
+    assert path.endswith(f'.{ext}')
+    assert mimetype == content_type.lower().replace('jpg', 'jpeg')
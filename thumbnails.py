@@ -0,0 +1,273 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from config import (
+    IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, THUMBNAIL_WIDTHS, THUMBNAIL_QUALITY,
+    IMAGE_MAX_SOURCE_BYTES, IMAGE_FETCH_TIMEOUT_SECONDS
+)
+import logging
+import os
+import re
+import threading
+import requests
+
+# Pillow är valfritt - utan det serveras originalbilden (men fortfarande från cachen)
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'SvenskaNyheter/1.0 (+https://github.com/semaln/svenska-nyheter)'
+
+ARTICLE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+MIMETYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+# Filändelse -> mimetype för originalbilder (sparas med originalets typ).
+# Bara rasterformat: SVG kan innehålla skript och får inte serveras från vår domän
+ORIGINAL_TYPES = {
+    'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp',
+    'avif': 'image/avif'
+}
+# Vanliga felstavningar av JPEG i Content-Type
+MIMETYPE_ALIASES = {'image/jpg': 'image/jpeg', 'image/pjpeg': 'image/jpeg'}
+
+
+class ImageError(Exception):
+    """Bilden kunde inte hämtas eller skalas om"""
+
+
+def webp_supported():
+    return Image is not None and features.check('webp')
+
+
+def choose_width(requested):
+    """Minsta tillåtna bredd som är minst den efterfrågade (största om ingen räcker)"""
+    widths = sorted(THUMBNAIL_WIDTHS)
+    if not requested:
+        return widths[0]
+    return next((width for width in widths if width >= requested), widths[-1])
+
+
+def choose_format(accept):
+    """WebP om klienten klarar det, annars JPEG"""
+    if webp_supported() and 'image/webp' in (accept or ''):
+        return 'webp'
+    return 'jpeg'
+
+
+class DiskCache:
+    """
+    Filcache med maxstorlek. Filernas mtime sätts vid varje träff och de
+    äldst använda tas bort när den totala storleken överstiger max_bytes.
+    Flera processer kan dela katalogen; storleken räknas om vid städning.
+    """
+    
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+    
+    def path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+    
+    def get(self, name):
+        """Sökväg till en cachad fil (och markera den som använd), eller None"""
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+    
+    def put(self, name, data):
+        """Spara en fil atomiskt och städa vid behov. Returnerar sökvägen."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+    
+    def _scan(self):
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+                total += stat.st_size
+        return entries, total
+    
+    def _evict(self):
+        """Ta bort äldst använda filer tills cachen är nere på 90 % av maxstorleken"""
+        entries, total = self._scan()
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+
+class Thumbnailer:
+    """
+    Miniatyrer av artiklarnas bilder i några fasta bredder.
+    Originalbilden hämtas en gång och sparas i cachen; varje bredd och format
+    skapas första gången den efterfrågas (eller i förväg med prewarm).
+    """
+    
+    def __init__(self, cache=None, session=None):
+        self.cache = cache or DiskCache()
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'image/webp,image/avif,image/*;q=0.9,*/*;q=0.5'
+        })
+        # Ett lås per artikel så att samma bild inte hämtas av flera trådar samtidigt
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._executor = None
+    
+    def _lock_for(self, article_id):
+        with self._locks_lock:
+            lock = self._locks.get(article_id)
+            if lock is None:
+                lock = self._locks[article_id] = threading.Lock()
+            if len(self._locks) > 1000:
+                # Lås som ingen håller kan tas bort
+                for key in [k for k, l in self._locks.items() if not l.locked() and k != article_id]:
+                    del self._locks[key]
+        return lock
+    
+    def cached(self, article_id, width, fmt):
+        """Sökväg och mimetype för en redan skapad miniatyr, eller None"""
+        if Image is None:
+            return self._cached_original(article_id)
+        path = self.cache.get(f"{article_id}-{width}.{fmt}")
+        return (path, MIMETYPES[fmt]) if path else None
+    
+    def thumbnail(self, article_id, image_url, width, fmt):
+        """
+        Sökväg och mimetype för miniatyren (skapas vid behov).
+        Utan Pillow returneras originalbilden. Kastar ImageError.
+        """
+        with self._lock_for(article_id):
+            found = self.cached(article_id, width, fmt)
+            if found:
+                return found
+            
+            original = self._original(article_id, image_url)
+            if Image is None:
+                return original
+            
+            with open(original[0], 'rb') as f:
+                data = self._resize(f.read(), width, fmt)
+            return self.cache.put(f"{article_id}-{width}.{fmt}", data), MIMETYPES[fmt]
+    
+    def _cached_original(self, article_id):
+        for ext, mimetype in ORIGINAL_TYPES.items():
+            path = self.cache.get(f"{article_id}.{ext}")
+            if path:
+                return path, mimetype
+        return None
+    
+    def _original(self, article_id, image_url):
+        """Originalbilden från cachen, annars hämtad från källan"""
+        found = self._cached_original(article_id)
+        if found:
+            return found
+        
+        data, mimetype = self._download(image_url)
+        ext = next(ext for ext, known in ORIGINAL_TYPES.items() if known == mimetype)
+        return self.cache.put(f"{article_id}.{ext}", data), ORIGINAL_TYPES[ext]
+    
+    def _download(self, image_url):
+        """Hämta originalbilden med tidsgräns och maxstorlek"""
+        if not image_url or not image_url.startswith(('http://', 'https://')):
+            raise ImageError(f"ogiltig bildadress: {image_url!r}")
+        try:
+            with self.session.get(image_url, timeout=IMAGE_FETCH_TIMEOUT_SECONDS, stream=True) as response:
+                response.raise_for_status()
+                mimetype = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                mimetype = MIMETYPE_ALIASES.get(mimetype, mimetype)
+                if mimetype not in ORIGINAL_TYPES.values():
+                    raise ImageError(f"inte en rasterbild ({mimetype or 'okänd typ'})")
+                
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > IMAGE_MAX_SOURCE_BYTES:
+                        raise ImageError(f"bilden är större än {IMAGE_MAX_SOURCE_BYTES} bytes")
+                    chunks.append(chunk)
+        except requests.RequestException as e:
+            raise ImageError(str(e)) from e
+        return b''.join(chunks), mimetype
+    
+    def _resize(self, data, width, fmt):
+        """Skala ner till bredden (aldrig upp) och koda som WebP eller JPEG"""
+        try:
+            with Image.open(BytesIO(data)) as image:
+                # JPEG kan avkodas direkt i lägre upplösning - mycket snabbare för stora bilder
+                image.draft('RGB', (width, width * 4))
+                image = image.convert('RGBA' if fmt == 'webp' and image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                if image.width > width:
+                    height = max(1, round(image.height * width / image.width))
+                    image = image.resize((width, height), Image.LANCZOS)
+                
+                output = BytesIO()
+                if fmt == 'webp':
+                    image.save(output, 'WEBP', quality=THUMBNAIL_QUALITY, method=4)
+                else:
+                    image.save(output, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+                return output.getvalue()
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise ImageError(f"kunde inte skala om bilden: {e}") from e
+    
+    def prewarm(self, articles):
+        """
+        Skapa miniatyrer för nya artiklar i bakgrunden (alla bredder och format),
+        så att första besökaren inte behöver vänta på källan.
+        """
+        articles = [a for a in articles if a.get('image_url')]
+        if not articles:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='thumbnail')
+        formats = ['webp', 'jpeg'] if webp_supported() else ['jpeg']
+        for article in articles:
+            self._executor.submit(self._prewarm_article, article['article_id'], article['image_url'], formats)
+    
+    def _prewarm_article(self, article_id, image_url, formats):
+        try:
+            for width in THUMBNAIL_WIDTHS:
+                for fmt in formats:
+                    self.thumbnail(article_id, image_url, width, fmt)
+        except ImageError as e:
+            logger.info(f"Kunde inte förbereda bild för {article_id}: {e}")
+        except Exception as e:
+            logger.warning(f"Fel vid förberedelse av bild för {article_id}: {e}")
+
+
+thumbnailer = Thumbnailer()
@@ -0,0 +1,50 @@
+from scheduler import NewsScheduler
+from storage import get_storage, close_storage
+from config import METRICS_ENABLED, METRICS_PORT
+import metrics
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Namnet på låset som alla schedulers (workers och webbservrar) delar
+SCHEDULER_LOCK_NAME = 'news_scheduler'
+
+
+def create_scheduler(storage):
+    """Skapa en scheduler som bara hämtar nyheter när den håller ledarlåset"""
+    lock = storage.leader_lock(SCHEDULER_LOCK_NAME)
+    return NewsScheduler(storage=storage, leader_lock=lock)
+
+
+def main():
+    """Fristående ingest-worker: hämtar nyheter utan webbserver"""
+    storage = get_storage()
+    scheduler = create_scheduler(storage)
+    
+    stopped = threading.Event()
+    
+    def handle_signal(signum, frame):
+        logger.info(f"Fick signal {signum}, avslutar...")
+        stopped.set()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    scheduler.start()
+    logger.info("✅ Ingest-worker startad")
+    
+    if METRICS_ENABLED and METRICS_PORT:
+        # Hämtningens mätvärden - workern har ingen webbserver
+        metrics.serve(METRICS_PORT)
+        logger.info(f"Mätvärden på :{METRICS_PORT}/metrics")
+    
+    stopped.wait()
+    scheduler.stop()
+    close_storage()
+    logger.info("✋ Ingest-worker stoppad")
+
+
+if __name__ == '__main__':
+    main()